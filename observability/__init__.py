@@ -0,0 +1 @@
+"""Observability helpers for the LiteLLM + MLflow stack"""
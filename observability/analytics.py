@@ -0,0 +1,427 @@
+"""
+Vectorized analytics over exported traces.
+
+Loads the Parquet dataset written by observability.export into NumPy
+columns and computes latency percentiles, TTFT distributions, token
+throughput, error rates and cost per time bucket without per-trace Python
+loops, plus a regression check between two time windows.
+
+Example:
+    from observability.analytics import load_traces, group_percentiles
+
+    frame = load_traces("data/exports/traces", start="2026-10-12")
+    group_percentiles(frame, "latency_ms", by="model")
+"""
+
+import datetime
+
+import numpy as np
+
+from observability.export import TRACE_SCHEMA
+
+
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+STRING_COLUMNS = [name for name, kind in TRACE_SCHEMA if kind == "string"]
+
+
+def _to_epoch_ms(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+class TraceFrame:
+    """
+    Column-oriented view of a set of traces.
+
+    Numeric columns are float64 arrays with NaN for missing values; string
+    columns are object arrays with "unknown" for missing values.
+    """
+
+    def __init__(self, columns: dict):
+        self.columns = columns
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, name: str):
+        return self.columns[name]
+
+    def filter(self, mask):
+        """
+        Select rows by boolean mask.
+
+        Args:
+            mask: Boolean array of length len(self)
+
+        Returns:
+            TraceFrame: New frame with the selected rows
+        """
+        return TraceFrame({name: values[mask] for name, values in self.columns.items()})
+
+    def window(self, start=None, end=None):
+        """
+        Select traces with start <= timestamp < end.
+
+        Args:
+            start: datetime, ISO string or epoch ms (inclusive)
+            end: datetime, ISO string or epoch ms (exclusive)
+
+        Returns:
+            TraceFrame: Traces within the window
+        """
+        ts = self.columns["timestamp_ms"]
+        mask = np.ones(len(ts), dtype=bool)
+        if start is not None:
+            mask &= ts >= _to_epoch_ms(start)
+        if end is not None:
+            mask &= ts < _to_epoch_ms(end)
+        return self.filter(mask)
+
+
+def from_arrow(table) -> TraceFrame:
+    """
+    Convert a pyarrow Table into a TraceFrame.
+
+    Args:
+        table: pyarrow.Table with (a subset of) the export schema
+
+    Returns:
+        TraceFrame: Columnar frame
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = {}
+    for name in table.column_names:
+        column = table.column(name)
+        numeric = pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+        if name in STRING_COLUMNS or not numeric:
+            column = pc.fill_null(column.cast("string"), "unknown")
+            columns[name] = np.asarray(column.to_numpy(zero_copy_only=False), dtype=object)
+        else:
+            columns[name] = column.cast("float64").to_numpy(zero_copy_only=False)
+    return TraceFrame(columns)
+
+
+def load_traces(path: str, columns=None, start=None, end=None) -> TraceFrame:
+    """
+    Load exported traces from a Parquet dataset.
+
+    Date partitions outside the window are pruned before any file is read.
+
+    Args:
+        path: Root of the exported traces dataset
+        columns: Optional list of columns to load
+        start: Optional window start (datetime, ISO string or epoch ms)
+        end: Optional window end (exclusive)
+
+    Returns:
+        TraceFrame: Loaded traces
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    # Only date= is read from the directories, for pruning; model= holds a
+    # sanitized name and must not shadow the model column in the files
+    partitioning = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+    dataset = ds.dataset(path, format="parquet", partitioning=partitioning)
+    expression = None
+    for bound, op in ((start, "ge"), (end, "lt")):
+        ms = _to_epoch_ms(bound)
+        if ms is None:
+            continue
+        day = datetime.datetime.fromtimestamp(ms / 1000, tz=datetime.timezone.utc).strftime("%Y-%m-%d")
+        ts_field, date_field = ds.field("timestamp_ms"), ds.field("date")
+        if op == "ge":
+            clause = (date_field >= day) & (ts_field >= ms)
+        else:
+            clause = (date_field <= day) & (ts_field < ms)
+        expression = clause if expression is None else expression & clause
+
+    if columns is not None and "timestamp_ms" not in columns:
+        columns = list(columns) + ["timestamp_ms"]
+    return from_arrow(dataset.to_table(columns=columns, filter=expression))
+
+
+def factorize(frame: TraceFrame, by):
+    """
+    Map each trace to a dense group index.
+
+    Args:
+        frame: TraceFrame
+        by: Column name or tuple of column names
+
+    Returns:
+        tuple: (list of group labels, int array of group index per trace)
+    """
+    if isinstance(by, str):
+        labels, inverse = np.unique(frame[by], return_inverse=True)
+        return list(labels), inverse
+
+    codes = np.zeros(len(frame), dtype=np.int64)
+    uniques = []
+    for name in by:
+        values, inverse = np.unique(frame[name], return_inverse=True)
+        codes = codes * len(values) + inverse
+        uniques.append(values)
+    combined, inverse = np.unique(codes, return_inverse=True)
+
+    labels = []
+    for code in combined:
+        parts = []
+        for values in reversed(uniques):
+            code, index = divmod(int(code), len(values))
+            parts.append(values[index])
+        labels.append(tuple(reversed(parts)))
+    return labels, inverse
+
+
+def _sorted_groups(values, inverse, n_groups):
+    # Drop missing values, then sort by (group, value) in one pass
+    valid = ~np.isnan(values)
+    values, inverse = values[valid], inverse[valid]
+    order = np.lexsort((values, inverse))
+    counts = np.bincount(inverse, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return values[order], counts, starts
+
+
+def _grouped_quantiles(sorted_values, counts, starts, percentiles):
+    # Linear interpolation between closest ranks, as numpy.percentile does
+    result = {}
+    nonempty = counts > 0
+    for q in percentiles:
+        position = starts + (counts - 1).clip(min=0) * (q / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        if len(sorted_values):
+            lower = lower.clip(max=len(sorted_values) - 1)
+            upper = upper.clip(max=len(sorted_values) - 1)
+            low_values = sorted_values[lower]
+            high_values = sorted_values[upper]
+            estimate = low_values + (high_values - low_values) * (position - lower)
+        else:
+            estimate = np.full(len(counts), np.nan)
+        result[f"p{q:g}"] = np.where(nonempty, estimate, np.nan)
+    return result
+
+
+def group_percentiles(frame: TraceFrame, value: str, by="model", percentiles=DEFAULT_PERCENTILES):
+    """
+    Compute percentiles of a column per group.
+
+    Args:
+        frame: TraceFrame
+        value: Numeric column, e.g. "latency_ms" or "ttft_ms"
+        by: Column name or tuple of names, e.g. ("model", "user_id")
+        percentiles: Percentiles to compute
+
+    Returns:
+        dict: group label -> {"count": n, "p50": ..., ...}
+    """
+    labels, inverse = factorize(frame, by)
+    sorted_values, counts, starts = _sorted_groups(frame[value], inverse, len(labels))
+    quantiles = _grouped_quantiles(sorted_values, counts, starts, percentiles)
+
+    return {
+        label: {"count": int(counts[i]), **{name: float(q[i]) for name, q in quantiles.items()}}
+        for i, label in enumerate(labels)
+    }
+
+
+def ttft_distribution(frame: TraceFrame, bins=None):
+    """
+    Histogram and percentiles of time to first token.
+
+    Args:
+        frame: TraceFrame with a "ttft_ms" column
+        bins: Histogram bin edges in ms (log-spaced 10ms..60s by default)
+
+    Returns:
+        dict: {"count", "edges", "counts", "p50", "p90", "p95", "p99"}
+    """
+    ttft = frame["ttft_ms"]
+    ttft = ttft[~np.isnan(ttft)]
+    if bins is None:
+        bins = np.geomspace(10, 60000, 32)
+    counts, edges = np.histogram(ttft, bins=bins)
+    summary = {"count": int(len(ttft)), "edges": edges.tolist(), "counts": counts.tolist()}
+    for q in (50, 90, 95, 99):
+        summary[f"p{q}"] = float(np.percentile(ttft, q)) if len(ttft) else float("nan")
+    return summary
+
+
+def token_throughput(frame: TraceFrame, by="model"):
+    """
+    Output tokens per second of generation time, per group.
+
+    Generation time is latency minus TTFT when TTFT is known.
+
+    Args:
+        frame: TraceFrame
+        by: Grouping column(s)
+
+    Returns:
+        dict: group label -> {"count", "mean_tps", "p50_tps", "total_tokens_per_s"}
+    """
+    latency = frame["latency_ms"]
+    ttft = np.nan_to_num(frame["ttft_ms"], nan=0.0)
+    generation_s = (latency - ttft) / 1000.0
+    tokens = frame["completion_tokens"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tps = np.where(generation_s > 0, tokens / generation_s, np.nan)
+
+    labels, inverse = factorize(frame, by)
+    valid = ~np.isnan(tps)
+    n = len(labels)
+    count = np.bincount(inverse[valid], minlength=n)
+    tps_sum = np.bincount(inverse[valid], weights=tps[valid], minlength=n)
+    token_sum = np.bincount(inverse[valid], weights=tokens[valid], minlength=n)
+    time_sum = np.bincount(inverse[valid], weights=generation_s[valid], minlength=n)
+    sorted_values, counts, starts = _sorted_groups(tps, inverse, n)
+    median = _grouped_quantiles(sorted_values, counts, starts, (50,))["p50"]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = tps_sum / count
+        aggregate = token_sum / time_sum
+    return {
+        label: {
+            "count": int(count[i]),
+            "mean_tps": float(mean[i]),
+            "p50_tps": float(median[i]),
+            "total_tokens_per_s": float(aggregate[i]),
+        }
+        for i, label in enumerate(labels)
+    }
+
+
+def time_buckets(frame: TraceFrame, bucket_ms: int = 3600 * 1000):
+    """
+    Request count, error rate, tokens and cost per time bucket.
+
+    Args:
+        frame: TraceFrame
+        bucket_ms: Bucket width in milliseconds (hourly by default)
+
+    Returns:
+        dict: Arrays keyed by "bucket_start_ms", "requests", "errors",
+            "error_rate", "total_tokens", "cost", "p95_latency_ms"
+    """
+    ts = frame["timestamp_ms"]
+    if not len(ts):
+        return {key: np.array([]) for key in
+                ("bucket_start_ms", "requests", "errors", "error_rate", "total_tokens", "cost", "p95_latency_ms")}
+
+    bucket = ((ts - ts.min()) // bucket_ms).astype(np.int64)
+    n = int(bucket.max()) + 1
+    errors = (frame["status"] != "OK").astype(np.float64)
+
+    requests = np.bincount(bucket, minlength=n)
+    error_count = np.bincount(bucket, weights=errors, minlength=n)
+    tokens = np.bincount(bucket, weights=np.nan_to_num(frame["total_tokens"]), minlength=n)
+    cost = np.bincount(bucket, weights=np.nan_to_num(frame["cost"]), minlength=n)
+    sorted_values, counts, starts = _sorted_groups(frame["latency_ms"], bucket, n)
+    p95 = _grouped_quantiles(sorted_values, counts, starts, (95,))["p95"]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        error_rate = np.where(requests > 0, error_count / requests, np.nan)
+    return {
+        "bucket_start_ms": ts.min() + np.arange(n) * bucket_ms,
+        "requests": requests,
+        "errors": error_count.astype(np.int64),
+        "error_rate": error_rate,
+        "total_tokens": tokens,
+        "cost": cost,
+        "p95_latency_ms": p95,
+    }
+
+
+def error_rates(frame: TraceFrame, by="model"):
+    """
+    Fraction of non-OK traces per group.
+
+    Args:
+        frame: TraceFrame
+        by: Grouping column(s)
+
+    Returns:
+        dict: group label -> {"count", "errors", "error_rate"}
+    """
+    labels, inverse = factorize(frame, by)
+    errors = (frame["status"] != "OK").astype(np.float64)
+    count = np.bincount(inverse, minlength=len(labels))
+    error_count = np.bincount(inverse, weights=errors, minlength=len(labels))
+    return {
+        label: {
+            "count": int(count[i]),
+            "errors": int(error_count[i]),
+            "error_rate": float(error_count[i] / count[i]) if count[i] else float("nan"),
+        }
+        for i, label in enumerate(labels)
+    }
+
+
+def detect_regressions(baseline: TraceFrame, candidate: TraceFrame, value: str = "latency_ms",
+                       by="model", percentile: float = 95, threshold: float = 0.10,
+                       error_rate_threshold: float = 0.02, min_count: int = 30,
+                       absolute_floor: float = 1.0):
+    """
+    Compare two time windows and report groups that got worse.
+
+    A group regresses when its percentile grows by more than ``threshold``
+    (relative) or its error rate grows by more than ``error_rate_threshold``
+    (absolute). A group whose baseline percentile is 0 has no relative
+    change; it regresses only when the candidate percentile exceeds
+    ``absolute_floor`` (0 -> 0 is no change). Groups with fewer than
+    ``min_count`` traces in either window are skipped.
+
+    Args:
+        baseline: Traces from the reference window
+        candidate: Traces from the window under test
+        value: Numeric column to compare
+        by: Grouping column(s)
+        percentile: Percentile to compare
+        threshold: Allowed relative increase of the percentile
+        error_rate_threshold: Allowed absolute increase of the error rate
+        min_count: Minimum traces per group and window
+        absolute_floor: Candidate percentile, in units of ``value``, above
+            which a zero baseline counts as a regression
+
+    Returns:
+        list: One dict per regressed group, worst first
+    """
+    key = f"p{percentile:g}"
+    base_q = group_percentiles(baseline, value, by, (percentile,))
+    cand_q = group_percentiles(candidate, value, by, (percentile,))
+    base_err = error_rates(baseline, by)
+    cand_err = error_rates(candidate, by)
+
+    regressions = []
+    for group in sorted(set(base_q) & set(cand_q), key=str):
+        before, after = base_q[group], cand_q[group]
+        if before["count"] < min_count or after["count"] < min_count:
+            continue
+        if before[key]:
+            change = (after[key] - before[key]) / before[key]
+        else:
+            change = float("inf") if after[key] > absolute_floor else 0.0
+        error_delta = cand_err[group]["error_rate"] - base_err[group]["error_rate"]
+        if change > threshold or error_delta > error_rate_threshold:
+            regressions.append({
+                "group": group,
+                "metric": f"{value}.{key}",
+                "baseline": before[key],
+                "candidate": after[key],
+                "relative_change": change,
+                "error_rate_delta": error_delta,
+            })
+    return sorted(regressions, key=lambda r: r["relative_change"], reverse=True)
@@ -0,0 +1,419 @@
+"""
+Asyncio-native trace logging for AsyncOpenAI callers.
+
+``mlflow.openai.autolog()`` exports each trace with blocking HTTP calls
+from the calling thread, which stalls the event loop and serializes
+concurrent tasks. Here spans are plain in-memory objects; when a root
+span ends the finished trace is handed to AsyncTraceExporter with a
+non-blocking ``put_nowait`` and exported by a background task over an
+``httpx.AsyncClient``. The request path never waits on MLflow.
+
+The active span is tracked in a ContextVar, so spans opened inside tasks
+created by ``asyncio.gather``/``create_task`` are parented to the span
+that was active when the task was created.
+
+Usage:
+    exporter = AsyncTraceExporter()
+    exporter.start()
+    client = instrument_async_openai(AsyncOpenAI(...), exporter)
+
+    async with async_span("conversation", exporter=exporter):
+        await asyncio.gather(*(client.chat.completions.create(...) for ...))
+
+    await exporter.aclose()
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import time
+import uuid
+
+from observability.retention import resolve_local_payload
+from observability.settings import MLFLOW_TRACKING_URI, TRACE_EXPERIMENT_NAME
+
+
+log = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar("observability_current_span", default=None)
+
+
+class AsyncTrace:
+    """
+    Spans of one trace, collected until the root span ends.
+    """
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.tags = {}
+
+    @property
+    def root(self):
+        return self.spans[0]
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "tags": dict(self.tags),
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+class AsyncSpan:
+    """
+    One span; created through async_span() or start_span().
+    """
+
+    def __init__(self, name: str, trace: AsyncTrace, parent=None, span_type: str = "UNKNOWN",
+                 inputs=None, attributes: dict = None):
+        self.name = name
+        self.trace = trace
+        self.parent_id = parent.span_id if parent is not None else None
+        self.span_id = uuid.uuid4().hex[:16]
+        self.span_type = span_type
+        self.inputs = inputs
+        self.outputs = None
+        self.attributes = dict(attributes or {})
+        self.status = "OK"
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        trace.spans.append(self)
+
+    def set_outputs(self, outputs):
+        self.outputs = outputs
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException):
+        self.status = "ERROR"
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> dict:
+        attributes = {
+            "mlflow.spanType": self.span_type,
+            "mlflow.spanInputs": self.inputs,
+            "mlflow.spanOutputs": self.outputs,
+        }
+        attributes.update(self.attributes)
+        return {
+            "name": self.name,
+            "context": {"trace_id": f"0x{self.trace.trace_id}", "span_id": f"0x{self.span_id}"},
+            "parent_id": f"0x{self.parent_id}" if self.parent_id else None,
+            "start_time": self.start_ns,
+            "end_time": self.end_ns,
+            "status_code": self.status,
+            "status_message": self.status_message,
+            # MLflow stores span attribute values JSON-encoded
+            "attributes": {k: json.dumps(v, default=str) for k, v in attributes.items()},
+            "events": [],
+        }
+
+
+def current_span():
+    """
+    Return the span active in the current task, or None.
+    """
+    return _current_span.get()
+
+
+def start_span(name: str, span_type: str = "UNKNOWN", inputs=None, attributes: dict = None):
+    """
+    Open a span under the current span (or as the root of a new trace).
+
+    Returns:
+        tuple: (AsyncSpan, context token) for end_span()
+    """
+    parent = _current_span.get()
+    trace = parent.trace if parent is not None else AsyncTrace()
+    span = AsyncSpan(name, trace, parent, span_type=span_type, inputs=inputs, attributes=attributes)
+    return span, _current_span.set(span)
+
+
+def end_span(span: AsyncSpan, token=None, exporter=None):
+    """
+    Close a span; closing a root span submits its trace to the exporter.
+
+    Args:
+        span: Span returned by start_span()
+        token: Context token from start_span(), restored if given
+        exporter: AsyncTraceExporter receiving finished traces
+    """
+    span.end_ns = time.time_ns()
+    if token is not None:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Ended from a different context (e.g. a stream consumed in
+            # another task); the span itself is still complete
+            pass
+    if span.parent_id is None and exporter is not None:
+        exporter.submit(span.trace)
+
+
+@contextlib.asynccontextmanager
+async def async_span(name: str, span_type: str = "CHAIN", inputs=None, attributes: dict = None,
+                     exporter=None):
+    """
+    Async context manager around start_span()/end_span().
+
+    Exceptions are recorded on the span and re-raised.
+    """
+    span, token = start_span(name, span_type=span_type, inputs=inputs, attributes=attributes)
+    try:
+        yield span
+    except BaseException as e:
+        span.set_error(e)
+        raise
+    finally:
+        end_span(span, token, exporter)
+
+
+class MlflowRestSink:
+    """
+    Writes finished traces to an MLflow tracking server over its REST API.
+
+    One trace is three calls: StartTrace, an upload of the span data to the
+    trace's artifact location, and EndTrace. Span data goes through the
+    artifact proxy for ``mlflow-artifacts:/`` locations and is written
+    directly for local and ``file://`` ones (start.sh's
+    ``--default-artifact-root``); traces whose spans cannot be stored
+    either way are logged as a warning.
+
+    Args:
+        tracking_uri: MLflow server URL
+        experiment_name: Experiment receiving the traces (created if missing)
+        client: httpx.AsyncClient to use (created on first export)
+    """
+
+    def __init__(self, tracking_uri: str = MLFLOW_TRACKING_URI,
+                 experiment_name: str = TRACE_EXPERIMENT_NAME, client=None):
+        self.tracking_uri = tracking_uri.rstrip("/")
+        self.experiment_name = experiment_name
+        self.client = client
+        self._experiment_id = None
+
+    def _client(self):
+        if self.client is None:
+            import httpx
+
+            self.client = httpx.AsyncClient(
+                base_url=self.tracking_uri,
+                timeout=10.0,
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=16)
+            )
+        return self.client
+
+    async def _resolve_experiment(self) -> str:
+        if self._experiment_id is None:
+            client = self._client()
+            response = await client.get("/api/2.0/mlflow/experiments/get-by-name",
+                                        params={"experiment_name": self.experiment_name})
+            if response.status_code == 200:
+                self._experiment_id = response.json()["experiment"]["experiment_id"]
+            else:
+                response = await client.post("/api/2.0/mlflow/experiments/create",
+                                             json={"name": self.experiment_name})
+                response.raise_for_status()
+                self._experiment_id = response.json()["experiment_id"]
+        return self._experiment_id
+
+    async def export(self, trace: AsyncTrace):
+        client = self._client()
+        experiment_id = await self._resolve_experiment()
+        root = trace.root
+        preview = {
+            "mlflow.traceInputs": json.dumps(root.inputs, default=str)[:250],
+            "mlflow.traceOutputs": json.dumps(root.outputs, default=str)[:250],
+        }
+        tags = {"mlflow.traceName": root.name}
+        tags.update(trace.tags)
+
+        response = await client.post("/api/2.0/mlflow/traces", json={
+            "experiment_id": experiment_id,
+            "timestamp_ms": root.start_ns // 1_000_000,
+            "request_metadata": [{"key": k, "value": v} for k, v in preview.items()],
+            "tags": [{"key": k, "value": str(v)} for k, v in tags.items()],
+        })
+        response.raise_for_status()
+        trace_info = response.json()["trace_info"]
+        request_id = trace_info["request_id"]
+        info_tags = {t["key"]: t["value"] for t in trace_info.get("tags", [])}
+
+        location = info_tags.get("mlflow.artifactLocation", "")
+        # Serialize off the loop; span payloads can be large
+        body = await asyncio.to_thread(json.dumps, {"spans": trace.to_dict()["spans"]}, default=str)
+        if location.startswith("mlflow-artifacts:/"):
+            path = location[len("mlflow-artifacts:/"):].strip("/")
+            response = await client.put(f"/api/2.0/mlflow-artifacts/artifacts/{path}/traces.json",
+                                        content=body.encode("utf-8"))
+            response.raise_for_status()
+        else:
+            directory = resolve_local_payload(location)
+            if directory is None:
+                log.warning("Spans of trace %s not stored: unsupported artifact location %r",
+                            request_id, location)
+            else:
+                await asyncio.to_thread(_write_payload, directory, body)
+
+        response = await client.patch(f"/api/2.0/mlflow/traces/{request_id}", json={
+            "timestamp_ms": (root.end_ns or time.time_ns()) // 1_000_000,
+            "status": root.status,
+            "request_metadata": [{"key": k, "value": v} for k, v in preview.items()],
+            "tags": [],
+        })
+        response.raise_for_status()
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+
+def _write_payload(directory: str, body: str):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "traces.json"), "w") as f:
+        f.write(body)
+
+
+class AsyncTraceExporter:
+    """
+    Background exporter fed through a bounded asyncio queue.
+
+    ``submit`` never blocks or awaits: when the queue is full the trace is
+    dropped and counted, so a slow MLflow server degrades tracing rather
+    than request latency.
+
+    Args:
+        sink: Object with ``async export(trace)`` (default MlflowRestSink)
+        max_queue: Maximum traces waiting for export
+        concurrency: Traces exported in parallel
+    """
+
+    def __init__(self, sink=None, max_queue: int = 10000, concurrency: int = 8):
+        self.sink = sink if sink is not None else MlflowRestSink()
+        self.concurrency = concurrency
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._workers = []
+
+    def start(self):
+        """
+        Start the export tasks on the running loop.
+        """
+        if not self._workers:
+            self._workers = [asyncio.get_running_loop().create_task(self._run())
+                             for _ in range(self.concurrency)]
+        return self
+
+    def submit(self, trace: AsyncTrace):
+        try:
+            self._queue.put_nowait(trace)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self):
+        while True:
+            trace = await self._queue.get()
+            try:
+                await self.sink.export(trace)
+                self.exported += 1
+            except Exception as e:
+                self.failed += 1
+                log.warning("Error exporting trace: %s", e)
+            finally:
+                self._queue.task_done()
+
+    async def flush(self):
+        """
+        Wait until every submitted trace has been exported or failed.
+        """
+        await self._queue.join()
+
+    async def aclose(self):
+        """
+        Flush, stop the export tasks and close the sink.
+        """
+        if self._workers:
+            await self.flush()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if hasattr(self.sink, "aclose"):
+            await self.sink.aclose()
+
+
+def _usage_attributes(response) -> dict:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "total_tokens": getattr(usage, "total_tokens", None),
+    }
+
+
+async def _traced_stream(stream, span, token, exporter):
+    content = []
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                content.append(chunk.choices[0].delta.content)
+            yield chunk
+        span.set_outputs({"content": "".join(content)})
+    except BaseException as e:
+        span.set_error(e)
+        raise
+    finally:
+        end_span(span, token, exporter)
+
+
+def instrument_async_openai(client, exporter: AsyncTraceExporter):
+    """
+    Trace ``client.chat.completions.create`` without blocking the loop.
+
+    Each call becomes an LLM span (a root span if no span is active).
+    Streaming calls end their span when the stream is exhausted.
+
+    Args:
+        client: openai.AsyncOpenAI instance (modified in place)
+        exporter: AsyncTraceExporter receiving finished traces
+
+    Returns:
+        The same client
+    """
+    create = client.chat.completions.create
+
+    async def traced_create(*args, **kwargs):
+        span, token = start_span(
+            "chat.completions.create",
+            span_type="LLM",
+            inputs={k: v for k, v in kwargs.items() if k not in ("extra_headers", "timeout")},
+            attributes={"model": kwargs.get("model")}
+        )
+        try:
+            response = await create(*args, **kwargs)
+        except BaseException as e:
+            span.set_error(e)
+            end_span(span, token, exporter)
+            raise
+        if kwargs.get("stream"):
+            # The span stays open until the caller drains the stream; the
+            # caller's context must not keep it as the active span
+            _current_span.reset(token)
+            return _traced_stream(response, span, None, exporter)
+        span.attributes.update(_usage_attributes(response))
+        span.set_outputs(response.model_dump() if hasattr(response, "model_dump") else response)
+        end_span(span, token, exporter)
+        return response
+
+    client.chat.completions.create = traced_create
+    return client
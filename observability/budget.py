@@ -0,0 +1,390 @@
+"""
+In-memory virtual-key and budget cache over the LiteLLM Postgres tables.
+
+With ``store_model_in_db`` every request reads key and budget state from
+Postgres. KeyBudgetCache keeps key state in memory (TTL-bounded,
+invalidated through LISTEN/NOTIFY when a key row changes) so auth is a dict
+lookup.
+
+Spend for budget enforcement is the key's ``spend`` column as of the last
+load plus spend recorded locally since then. With several proxy workers
+(observability.workers) "locally" means by any worker: spend and cache
+statistics go to shared-memory counters, and per-key ``rpm_limit`` is
+enforced with token buckets shared by all workers. Nothing is written back:
+LiteLLM persists spend to ``LiteLLM_VerificationToken`` itself, batched by
+``proxy_batch_write_at`` in config.yaml.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from observability.settings import LITELLM_DATABASE_URL
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 30
+INVALIDATION_CHANNEL = "litellm_key_changed"
+
+LOAD_KEY_SQL = """
+SELECT token, spend, max_budget, expires, blocked, models, rpm_limit, tpm_limit,
+       key_alias, team_id, user_id
+FROM "LiteLLM_VerificationToken"
+WHERE token = %s
+"""
+
+# Serializes the trigger DDL between proxy workers (pg_advisory_xact_lock key)
+INVALIDATION_TRIGGER_LOCK = 7301001
+
+INVALIDATION_TRIGGER_SQL = f"""
+SELECT pg_advisory_xact_lock({INVALIDATION_TRIGGER_LOCK});
+
+CREATE OR REPLACE FUNCTION obs_notify_key_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{INVALIDATION_CHANNEL}', COALESCE(NEW.token, OLD.token));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS obs_key_changed ON "LiteLLM_VerificationToken";
+CREATE TRIGGER obs_key_changed
+AFTER UPDATE OF max_budget, expires, blocked, models, rpm_limit, tpm_limit,
+    key_alias, team_id, user_id OR DELETE
+ON "LiteLLM_VerificationToken"
+FOR EACH ROW EXECUTE FUNCTION obs_notify_key_changed();
+"""
+
+
+class InvalidKeyError(Exception):
+    """Raised when a virtual key is unknown, blocked or expired."""
+
+
+class BudgetExceededError(Exception):
+    """Raised when a virtual key has spent its max_budget."""
+
+    def __init__(self, spend: float, max_budget: float):
+        super().__init__(f"Budget exceeded: spend {spend:.4f} >= max_budget {max_budget:.4f}")
+        self.spend = spend
+        self.max_budget = max_budget
+
+
+class RateLimitExceededError(Exception):
+    """Raised when a virtual key exceeds its rpm_limit."""
+
+    def __init__(self, rpm_limit: int):
+        super().__init__(f"Rate limit exceeded: rpm_limit {rpm_limit}")
+        self.rpm_limit = rpm_limit
+        # Seconds until the key's bucket has a token again
+        self.retry_after = max(1, math.ceil(60.0 / rpm_limit))
+
+
+def hash_key(api_key: str) -> str:
+    """
+    Hash a virtual key the way LiteLLM stores it.
+
+    Args:
+        api_key: Raw key ("sk-...")
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    if not api_key.startswith("sk-"):
+        # Already hashed
+        return api_key
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+class KeyState:
+    """
+    Cached state of one virtual key.
+    """
+
+    def __init__(self, token: str, spend: float = 0.0, max_budget: float = None,
+                 expires: float = None, blocked: bool = False, models=None, loaded_at: float = 0.0,
+                 rpm_limit: int = None, tpm_limit: int = None, key_alias: str = None,
+                 team_id: str = None, user_id: str = None):
+        self.token = token
+        self.spend = float(spend or 0.0)
+        self.max_budget = max_budget
+        self.expires = expires
+        self.blocked = bool(blocked)
+        self.models = list(models or [])
+        self.loaded_at = loaded_at
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.key_alias = key_alias
+        self.team_id = team_id
+        self.user_id = user_id
+        # Shared spend counter at load time (see KeyBudgetCache.spend)
+        self.shared_base = 0.0
+
+
+class KeyBudgetCache:
+    """
+    Hot cache of key state with in-memory spend since the last load.
+
+    Args:
+        loader: Callable(token_hash) -> KeyState or None (e.g. PostgresKeyStore.load)
+        ttl_seconds: Maximum age of a cached key before it is reloaded
+        clock: Time source, overridable in tests
+        counters: Shared counters (observability.workers.SharedCounters)
+            for spend and cache statistics across worker processes
+        limiter: Shared token buckets (observability.workers.SharedBuckets)
+            enforcing each key's rpm_limit; None disables rpm checks
+    """
+
+    def __init__(self, loader, ttl_seconds: float = DEFAULT_TTL_SECONDS, clock=time.time,
+                 counters=None, limiter=None):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.counters = counters
+        self.limiter = limiter
+        self.loads = 0
+        self.hits = 0
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str) -> KeyState:
+        """
+        Return the key's state, loading it on miss or after the TTL.
+
+        Args:
+            api_key: Raw or hashed virtual key
+
+        Returns:
+            KeyState: Cached state, or None for unknown keys
+        """
+        token = hash_key(api_key)
+        state = self._cached(token)
+        if state is not None:
+            return state
+        return self._load(token)
+
+    async def aget(self, api_key: str) -> KeyState:
+        """
+        Like get(), but runs the loader in a worker thread so a miss does not
+        block the event loop.
+        """
+        token = hash_key(api_key)
+        state = self._cached(token)
+        if state is not None:
+            return state
+        return await asyncio.to_thread(self._load, token)
+
+    def _cached(self, token: str) -> KeyState:
+        state = self._keys.get(token)
+        if state is None or self.clock() - state.loaded_at >= self.ttl_seconds:
+            return None
+        self.hits += 1
+        if self.counters is not None:
+            self.counters.add("key_cache.hits")
+        return state
+
+    def _load(self, token: str) -> KeyState:
+        now = self.clock()
+        # Load outside the lock; a concurrent duplicate load is harmless
+        state = self.loader(token)
+        self.loads += 1
+        if self.counters is not None:
+            self.counters.add("key_cache.loads")
+        if state is None:
+            return None
+        state.loaded_at = now
+        if self.counters is not None:
+            state.shared_base = self.counters.total(f"spend:{token}")
+        with self._lock:
+            self._keys[token] = state
+        return state
+
+    def check(self, api_key: str, model: str = None) -> KeyState:
+        """
+        Authorize a request against the cached key state.
+
+        Args:
+            api_key: Raw or hashed virtual key
+            model: Requested model, checked against the key's allowed models
+
+        Returns:
+            KeyState: State of the authorized key
+
+        Raises:
+            InvalidKeyError: Unknown, blocked, expired or model not allowed
+            BudgetExceededError: Spend has reached max_budget
+            RateLimitExceededError: Requests per minute above rpm_limit
+        """
+        return self._authorize(self.get(api_key), model)
+
+    async def acheck(self, api_key: str, model: str = None) -> KeyState:
+        """
+        Like check(), but loads missing or expired keys off the event loop.
+        """
+        return self._authorize(await self.aget(api_key), model)
+
+    def _authorize(self, state: KeyState, model: str = None) -> KeyState:
+        if state is None:
+            raise InvalidKeyError("Unknown virtual key")
+        if state.blocked:
+            raise InvalidKeyError("Virtual key is blocked")
+        if state.expires is not None and state.expires <= self.clock():
+            raise InvalidKeyError("Virtual key has expired")
+        if model and state.models and model not in state.models and "all-proxy-models" not in state.models:
+            raise InvalidKeyError(f"Virtual key is not allowed to use model {model}")
+        spend = self.spend(state)
+        if state.max_budget is not None and spend >= state.max_budget:
+            raise BudgetExceededError(spend, state.max_budget)
+        if state.rpm_limit and self.limiter is not None:
+            if not self.limiter.allow(f"rpm:{state.token}", state.rpm_limit / 60.0, state.rpm_limit):
+                raise RateLimitExceededError(state.rpm_limit)
+        return state
+
+    def spend(self, state: KeyState) -> float:
+        """
+        Spend of a key for budget checks.
+
+        Returns:
+            float: Loaded spend plus spend recorded since, by any worker
+                sharing ``counters``
+        """
+        if self.counters is None:
+            return state.spend
+        return state.spend + self.counters.total(f"spend:{state.token}") - state.shared_base
+
+    def record_spend(self, api_key: str, cost: float):
+        """
+        Add a request's cost to the key's in-memory spend.
+
+        Args:
+            api_key: Raw or hashed virtual key
+            cost: Request cost in USD
+        """
+        token = hash_key(api_key)
+        if self.counters is not None:
+            self.counters.add(f"spend:{token}", cost)
+            return
+        with self._lock:
+            state = self._keys.get(token)
+            if state is not None:
+                state.spend += cost
+
+    def invalidate(self, api_key: str = None):
+        """
+        Drop a cached key (or all keys) so the next request reloads it.
+
+        Args:
+            api_key: Raw or hashed key; None clears the whole cache
+        """
+        with self._lock:
+            if api_key is None:
+                self._keys.clear()
+            else:
+                self._keys.pop(hash_key(api_key), None)
+
+
+class PostgresKeyStore:
+    """
+    Key loading and invalidation over the LiteLLM database.
+    """
+
+    def __init__(self, database_url: str = LITELLM_DATABASE_URL):
+        from psycopg2.pool import ThreadedConnectionPool
+
+        self.database_url = database_url
+        self.pool = ThreadedConnectionPool(1, 8, database_url)
+
+    @contextlib.contextmanager
+    def _connection(self):
+        conn = self.pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def load(self, token: str) -> KeyState:
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(LOAD_KEY_SQL, (token,))
+            row = cur.fetchone()
+        if row is None:
+            return None
+        token, spend, max_budget, expires, blocked, models, rpm_limit, tpm_limit, key_alias, team_id, user_id = row
+        return KeyState(
+            token,
+            spend=spend,
+            max_budget=max_budget,
+            expires=expires.timestamp() if expires else None,
+            blocked=blocked,
+            models=models,
+            rpm_limit=rpm_limit,
+            tpm_limit=tpm_limit,
+            key_alias=key_alias,
+            team_id=team_id,
+            user_id=user_id
+        )
+
+    def install_invalidation_trigger(self):
+        """
+        Create the NOTIFY trigger on LiteLLM_VerificationToken.
+
+        Runs under a transaction-scoped advisory lock, so workers starting
+        together install it one after the other instead of failing on
+        concurrent DDL.
+        """
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(INVALIDATION_TRIGGER_SQL)
+
+    def listen_for_invalidations(self, cache: KeyBudgetCache):
+        """
+        Start a thread that invalidates cached keys on NOTIFY.
+
+        The thread installs the trigger first (see
+        install_invalidation_trigger), off the request path. If that fails,
+        e.g. before LiteLLM has created its tables, cached keys still expire
+        after their TTL and the install is retried on reconnect.
+
+        Args:
+            cache: KeyBudgetCache to invalidate
+
+        Returns:
+            threading.Thread: The listener thread
+        """
+        import select
+
+        import psycopg2
+
+        def listen():
+            installed = False
+            while True:
+                if not installed:
+                    try:
+                        self.install_invalidation_trigger()
+                        installed = True
+                    except Exception as e:
+                        log.warning("Error installing the key invalidation trigger: %s", e)
+                try:
+                    conn = psycopg2.connect(self.database_url)
+                    conn.autocommit = True
+                    conn.cursor().execute(f"LISTEN {INVALIDATION_CHANNEL}")
+                    # Anything may have changed while we were not listening
+                    cache.invalidate()
+                    while True:
+                        if select.select([conn], [], [], 5.0) == ([], [], []):
+                            continue
+                        conn.poll()
+                        while conn.notifies:
+                            cache.invalidate(conn.notifies.pop(0).payload)
+                except Exception as e:
+                    log.warning("Error listening for key changes: %s", e)
+                    time.sleep(1.0)
+
+        thread = threading.Thread(target=listen, name="key-invalidation", daemon=True)
+        thread.start()
+        return thread
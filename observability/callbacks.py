@@ -0,0 +1,482 @@
+"""
+LiteLLM proxy callbacks.
+
+Referenced from config.yaml:
+
+- ``dispatch_handler`` builds one record per request and fans it out
+  concurrently to the log sinks (see observability.dispatch):
+  ``spool_sink`` appends to the local trace spool, shipped to MLflow out
+  of band by ``python -m observability.spool ship``, and ``budget_sink``
+  records spend against the key's budget. ``spool_handler`` and
+  ``budget_handler`` run the same sinks as separate callbacks.
+- ``user_api_key_auth`` (custom_auth) enforces virtual keys and budgets
+  from an in-memory cache (see observability.budget).
+- ``profiler_handler`` samples event-loop lag and thread-pool depth,
+  times the other callbacks and serves /debug/metrics and /debug/profile
+  (see observability.profiler).
+- ``relay_handler`` (optional) reads streaming responses through a
+  fan-out relay so dashboards can tail them at /relay/{litellm_call_id}
+  (see observability.relay).
+- Under ``python -m observability.workers`` (several proxy processes),
+  spend, key cache statistics and rpm buckets are shared between the
+  workers, and trace records are forwarded to the one spool collector
+  (see observability.workers).
+- ``reload_handler`` watches config.yaml and applies changes to the model
+  list and callbacks without a restart, draining requests still running
+  on the previous configuration (see observability.reload).
+
+The handlers that serve routes (profiler, relay, reload) are created when
+the proxy first resolves them from config.yaml, so their routes exist only
+when they are configured.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import uuid
+
+from litellm.integrations.custom_logger import CustomLogger
+
+from observability import workers
+from observability.budget import BudgetExceededError, KeyBudgetCache, PostgresKeyStore, RateLimitExceededError
+from observability.cost import get_cost_engine
+from observability.dispatch import Dispatcher
+from observability.logs import bind, configure_from_env
+from observability.profiler import LoopLagSampler, ProfileTraceEmitter, install_routes, instrument_callbacks
+from observability.relay import hub as relay_hub
+from observability.relay import install_routes as install_relay_routes
+from observability.reload import (
+    ConfigReloader,
+    apply_litellm_state,
+    build_litellm_state,
+    close_litellm_state,
+    current_litellm_state,
+)
+from observability.reload import install_routes as install_reload_routes
+from observability.settings import LITELLM_CONFIG_PATH
+from observability.spool import SpoolForwarder, SpoolWriter
+
+
+log = logging.getLogger(__name__)
+# JSON lines for the observability loggers when started by start.sh
+configure_from_env("litellm-proxy", logger="observability")
+
+
+def build_trace_record(kwargs, start_time, end_time, status: str) -> dict:
+    """
+    Flatten a LiteLLM callback invocation into a spool record.
+
+    Args:
+        kwargs: Callback kwargs passed by LiteLLM
+        start_time: Request start (datetime)
+        end_time: Request end (datetime)
+        status: "success" or "failure"
+
+    Returns:
+        dict: JSON-serializable trace record
+    """
+    payload = kwargs.get("standard_logging_object") or {}
+    litellm_params = kwargs.get("litellm_params") or {}
+    metadata = dict(litellm_params.get("metadata") or {})
+    metadata.update(payload.get("metadata") or {})
+
+    return {
+        "trace_id": payload.get("id") or kwargs.get("litellm_call_id") or uuid.uuid4().hex,
+        "call_type": payload.get("call_type") or kwargs.get("call_type"),
+        "model": payload.get("model") or kwargs.get("model"),
+        "messages": payload.get("messages") or kwargs.get("messages"),
+        # Sampling parameters (temperature, max_tokens, ...), for replay
+        "model_parameters": payload.get("model_parameters") or {},
+        "response": payload.get("response"),
+        "prompt_tokens": payload.get("prompt_tokens"),
+        "completion_tokens": payload.get("completion_tokens"),
+        "total_tokens": payload.get("total_tokens"),
+        "response_cost": payload.get("response_cost"),
+        "start_time": start_time.timestamp(),
+        "end_time": end_time.timestamp(),
+        "completion_start_time": payload.get("completionStartTime"),
+        "metadata": metadata,
+        "status": status,
+        "error": payload.get("error_str") or (str(kwargs["exception"]) if kwargs.get("exception") else None),
+    }
+
+
+_spool_writer = None
+
+
+def open_spool():
+    """
+    The spool writer for this process: the local spool, or the collector
+    when running as one of several workers (``OBS_SPOOL_SOCKET``).
+    """
+    socket_path = os.environ.get("OBS_SPOOL_SOCKET")
+    if socket_path:
+        return SpoolForwarder(socket_path)
+    return SpoolWriter()
+
+
+def spool_sink(record):
+    """
+    Dispatcher sink appending the record to the trace spool.
+    """
+    global _spool_writer
+    # Opened lazily so importing the config does not touch the disk
+    if _spool_writer is None:
+        _spool_writer = open_spool()
+    _spool_writer.append(dict(record))
+
+
+class SpoolCallback(CustomLogger):
+    """
+    Writes every completed or failed proxy request to the trace spool.
+    """
+
+    def __init__(self, writer=None):
+        super().__init__()
+        self._writer = writer
+
+    @property
+    def writer(self) -> SpoolWriter:
+        # Opened lazily so importing the config does not touch the disk
+        if self._writer is None:
+            self._writer = open_spool()
+        return self._writer
+
+    def _spool(self, kwargs, start_time, end_time, status):
+        try:
+            self.writer.append(build_trace_record(kwargs, start_time, end_time, status))
+        except Exception as e:
+            log.warning("Error spooling trace: %s", e)
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        self._spool(kwargs, start_time, end_time, "success")
+
+    def log_failure_event(self, kwargs, response_obj, start_time, end_time):
+        self._spool(kwargs, start_time, end_time, "failure")
+
+    async def async_log_success_event(self, kwargs, response_obj, start_time, end_time):
+        self._spool(kwargs, start_time, end_time, "success")
+
+    async def async_log_failure_event(self, kwargs, response_obj, start_time, end_time):
+        self._spool(kwargs, start_time, end_time, "failure")
+
+
+spool_handler = SpoolCallback()
+
+
+_budget_cache = None
+_budget_lock = threading.Lock()
+
+
+def get_budget_cache() -> KeyBudgetCache:
+    """
+    Process-wide key/budget cache backed by the LiteLLM database.
+
+    Started on first use: loads keys through PostgresKeyStore and listens
+    for key changes (the listener thread also installs the trigger).
+    Spend, cache statistics and rpm buckets live in the worker's shared
+    memory (observability.workers).
+    """
+    global _budget_cache
+    with _budget_lock:
+        if _budget_cache is None:
+            store = PostgresKeyStore()
+            state = workers.shared()
+            cache = KeyBudgetCache(store.load, counters=state.counters, limiter=state.buckets)
+            store.listen_for_invalidations(cache)
+            _budget_cache = cache
+    return _budget_cache
+
+
+async def _request_model(request) -> str:
+    """
+    The ``model`` of a request's JSON body, if any.
+    """
+    from litellm.proxy.common_utils.http_parsing_utils import _read_request_body
+
+    try:
+        body = await _read_request_body(request=request)
+    except Exception:
+        return None
+    return body.get("model") if isinstance(body, dict) else None
+
+
+async def user_api_key_auth(request, api_key: str):
+    """
+    LiteLLM ``custom_auth`` hook answering from the in-memory key cache.
+
+    Key loads (first use, misses and TTL expiry) run in a worker thread so
+    Postgres round trips do not block the event loop.
+
+    Raises:
+        InvalidKeyError: Unknown, blocked or expired key, or model not
+            allowed (LiteLLM answers 401)
+        litellm.BudgetExceededError: Key has spent its budget (LiteLLM's
+            budget_exceeded error, 400)
+        fastapi.HTTPException: 429 with Retry-After when the key is over
+            its rpm_limit, so clients back off and retry
+    """
+    from litellm.proxy._types import UserAPIKeyAuth
+
+    if api_key and api_key.startswith("Bearer "):
+        api_key = api_key[len("Bearer "):]
+    if api_key == os.environ.get("LITELLM_MASTER_KEY"):
+        return UserAPIKeyAuth(api_key=api_key, user_role="proxy_admin")
+
+    cache = _budget_cache or await asyncio.to_thread(get_budget_cache)
+    try:
+        state = await cache.acheck(api_key, await _request_model(request))
+    except BudgetExceededError as e:
+        import litellm
+
+        raise litellm.BudgetExceededError(current_cost=e.spend, max_budget=e.max_budget, message=str(e))
+    except RateLimitExceededError as e:
+        from fastapi import HTTPException
+
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return UserAPIKeyAuth(
+        api_key=state.token,
+        token=state.token,
+        key_alias=state.key_alias,
+        models=state.models,
+        team_id=state.team_id,
+        user_id=state.user_id,
+        rpm_limit=state.rpm_limit,
+        tpm_limit=state.tpm_limit,
+        max_budget=state.max_budget,
+        spend=cache.spend(state),
+    )
+
+
+def budget_sink(record):
+    """
+    Dispatcher sink recording a successful request's cost against its key.
+    """
+    key_hash = (record.get("metadata") or {}).get("user_api_key_hash")
+    if not key_hash or record.get("status") != "success":
+        return
+    get_budget_cache().record_spend(key_hash, record.get("response_cost") or 0.0)
+
+
+class BudgetCallback(CustomLogger):
+    """
+    Records request cost against the key's cached budget.
+    """
+
+    async def async_log_success_event(self, kwargs, response_obj, start_time, end_time):
+        try:
+            budget_sink(build_trace_record(kwargs, start_time, end_time, "success"))
+        except Exception as e:
+            log.warning("Error recording spend: %s", e)
+
+
+budget_handler = BudgetCallback()
+
+
+class ProfilerCallback(CustomLogger):
+    """
+    Starts the proxy profiler on the first request.
+
+    Callbacks are instrumented then rather than at import time, so every
+    callback from config.yaml is registered by the time we wrap them.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sampler = LoopLagSampler()
+        self._started = False
+
+    def install_routes(self, app):
+        install_routes(app)
+        if workers.current() is not None:
+            workers.install_routes(app, workers.current())
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        self._started = True
+        try:
+            self.sampler.start()
+            instrument_callbacks(exclude=(self,))
+            if os.environ.get("OBS_PROFILER_TRACES") == "1":
+                ProfileTraceEmitter().start()
+        except Exception as e:
+            log.warning("Error starting profiler: %s", e)
+
+    async def async_pre_call_hook(self, user_api_key_dict, cache, data, call_type):
+        self._ensure_started()
+        return data
+
+    async def async_log_success_event(self, kwargs, response_obj, start_time, end_time):
+        self._ensure_started()
+
+
+class DispatchCallback(CustomLogger):
+    """
+    One LiteLLM callback fanning each request out to all log sinks.
+
+    The record is built and priced (observability.cost) once per request
+    and shared read-only by the sinks, which run concurrently with
+    per-sink timeouts (see observability.dispatch).
+    """
+
+    def __init__(self, dispatcher: Dispatcher):
+        super().__init__()
+        self.dispatcher = dispatcher
+
+    def _record(self, kwargs, start_time, end_time, status) -> dict:
+        record = build_trace_record(kwargs, start_time, end_time, status)
+        try:
+            get_cost_engine().account(record)
+        except Exception as e:
+            log.warning("Error pricing request: %s", e)
+        return record
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        record = self._record(kwargs, start_time, end_time, "success")
+        with bind(trace_id=record["trace_id"]):
+            self.dispatcher.dispatch(record)
+
+    def log_failure_event(self, kwargs, response_obj, start_time, end_time):
+        record = self._record(kwargs, start_time, end_time, "failure")
+        with bind(trace_id=record["trace_id"]):
+            self.dispatcher.dispatch(record)
+
+    async def async_log_success_event(self, kwargs, response_obj, start_time, end_time):
+        record = self._record(kwargs, start_time, end_time, "success")
+        with bind(trace_id=record["trace_id"]):
+            await self.dispatcher.dispatch_async(record)
+
+    async def async_log_failure_event(self, kwargs, response_obj, start_time, end_time):
+        record = self._record(kwargs, start_time, end_time, "failure")
+        with bind(trace_id=record["trace_id"]):
+            await self.dispatcher.dispatch_async(record)
+
+
+def _build_dispatcher() -> Dispatcher:
+    dispatcher = Dispatcher(timeout=float(os.environ.get("OBS_SINK_TIMEOUT", "2.0")))
+    dispatcher.register("spool", spool_sink)
+    if not os.environ.get("LITELLM_NO_DB"):
+        dispatcher.register("budget", budget_sink)
+    return dispatcher
+
+
+dispatch_handler = DispatchCallback(_build_dispatcher())
+
+
+class RelayCallback(CustomLogger):
+    """
+    Relays proxy streams so other consumers can tail them.
+
+    Every streaming response is read through a StreamRelay registered in
+    ``observability.relay.hub`` under the request's ``litellm_call_id``;
+    the requesting client is its critical subscriber, and /relay/{id}
+    serves the same chunks to dashboards. Relay stats are added to the
+    request metadata, so they reach the spooled trace.
+    """
+
+    def __init__(self, capacity: int = int(os.environ.get("OBS_RELAY_CAPACITY", "256"))):
+        super().__init__()
+        self.capacity = capacity
+
+    def install_routes(self, app):
+        install_relay_routes(app, capacity=self.capacity)
+
+    async def async_post_call_streaming_iterator_hook(self, user_api_key_dict, response, request_data: dict):
+        metadata = request_data.setdefault("metadata", {})
+        stream_id = request_data.get("litellm_call_id") or uuid.uuid4().hex
+        relay = relay_hub.open(stream_id, response, on_close=lambda r: metadata.update(r.trace_attributes()))
+        primary = relay.subscribe(capacity=self.capacity, critical=True, name="client")
+        relay.start()
+        try:
+            async for chunk in primary:
+                yield chunk.data
+        finally:
+            primary.close()
+
+
+class ReloadCallback(CustomLogger):
+    """
+    Reloads config.yaml in place and tracks requests per config generation.
+
+    The reloader adopts the running configuration on the first request,
+    when the proxy has finished loading it, and then watches the file.
+    Every request is counted against the generation it started on until
+    it is logged, so a reload can wait for the old generation to drain.
+    The generation number is added to the request metadata and reaches
+    the spooled trace as ``config_generation``.
+    """
+
+    def __init__(self, reloader: ConfigReloader = None):
+        super().__init__()
+        self.reloader = reloader or ConfigReloader(LITELLM_CONFIG_PATH, build_litellm_state,
+                                                   apply_litellm_state, close_litellm_state)
+        self._started = False
+
+    def install_routes(self, app):
+        install_reload_routes(app, self.reloader)
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        self._started = True
+        try:
+            if self.reloader.current is None:
+                generation = self.reloader.adopt()
+                generation.state = current_litellm_state(generation.config)
+            self.reloader.start()
+        except Exception as e:
+            log.warning("Error starting config reloader: %s", e)
+
+    async def async_pre_call_hook(self, user_api_key_dict, cache, data, call_type):
+        self._ensure_started()
+        request_id = data.setdefault("litellm_call_id", str(uuid.uuid4()))
+        generation = self.reloader.acquire(request_id)
+        if generation is not None:
+            data.setdefault("metadata", {})["config_generation"] = generation.number
+        return data
+
+    def _release(self, kwargs):
+        metadata = (kwargs.get("litellm_params") or {}).get("metadata") or {}
+        request_id = kwargs.get("litellm_call_id")
+        if request_id:
+            self.reloader.release(request_id, metadata.get("config_generation"))
+
+    async def async_log_success_event(self, kwargs, response_obj, start_time, end_time):
+        self._release(kwargs)
+
+    async def async_log_failure_event(self, kwargs, response_obj, start_time, end_time):
+        self._release(kwargs)
+
+    async def async_post_call_failure_hook(self, request_data, original_exception, user_api_key_dict, *args, **kwargs):
+        # Rejected before reaching the model (auth, budget, other hooks):
+        # no log event follows
+        request_id = request_data.get("litellm_call_id")
+        if request_id:
+            self.reloader.release(request_id, (request_data.get("metadata") or {}).get("config_generation"))
+
+
+# Created on first access (config.yaml naming them), not at import
+_ROUTED_HANDLERS = {
+    "profiler_handler": ProfilerCallback,
+    "relay_handler": RelayCallback,
+    "reload_handler": ReloadCallback,
+}
+_handlers_lock = threading.Lock()
+
+
+def __getattr__(name):
+    factory = _ROUTED_HANDLERS.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _handlers_lock:
+        handler = globals().get(name)
+        if handler is None:
+            handler = factory()
+            proxy = sys.modules.get("litellm.proxy.proxy_server")
+            if proxy is not None and hasattr(proxy, "app"):
+                handler.install_routes(proxy.app)
+            globals()[name] = handler
+    return handler
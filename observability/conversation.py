@@ -0,0 +1,245 @@
+"""
+Token-budgeted conversation history for multi-turn sessions.
+
+Resending the whole history every turn makes request size grow linearly
+and total cost quadratically with the number of turns. ConversationManager
+keeps the messages sent to the model within a token budget: the most
+recent turns are kept verbatim and older turns are folded into a running
+summary that replaces them in memory.
+
+Example:
+    conversation = ConversationManager(max_tokens=1000, system_prompt="Be concise.")
+    conversation.add_user("What is MLflow?")
+    response = client.chat.completions.create(model=model, messages=conversation.messages())
+    conversation.add_assistant(response.choices[0].message.content)
+    conversation.record_on_trace()
+"""
+
+import functools
+import logging
+import re
+
+
+log = logging.getLogger(__name__)
+
+# Per-message framing overhead used by OpenAI-style chat formats
+MESSAGE_OVERHEAD_TOKENS = 4
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+@functools.lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """
+    Estimate the token count of a string without a tokenizer.
+
+    Words count as one token per four characters (rounded up) and each
+    punctuation mark as one token, which tracks BPE tokenizers closely
+    enough for budgeting. Results are cached per string, so each message
+    is only counted once however many turns it is resent.
+
+    Args:
+        text: Text to count
+
+    Returns:
+        int: Estimated number of tokens
+    """
+    if not text:
+        return 0
+    return sum((len(token) + 3) // 4 for token in TOKEN_PATTERN.findall(text))
+
+
+def message_tokens(message: dict) -> int:
+    """
+    Estimate the tokens a chat message occupies in a request.
+
+    Args:
+        message: Chat message dict with "role" and "content"
+
+    Returns:
+        int: Estimated number of tokens
+    """
+    content = message.get("content") or ""
+    if not isinstance(content, str):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return MESSAGE_OVERHEAD_TOKENS + count_tokens(content)
+
+
+def extractive_summarizer(previous_summary: str, messages, max_tokens: int) -> str:
+    """
+    Fold trimmed messages into the summary by keeping their first sentence.
+
+    Cheap and deterministic; use llm_summarizer for abstractive summaries.
+
+    Args:
+        previous_summary: Summary of earlier trimmed turns ("" if none)
+        messages: Messages being trimmed, oldest first
+        max_tokens: Token budget for the summary
+
+    Returns:
+        str: Updated summary
+    """
+    lines = [previous_summary] if previous_summary else []
+    for message in messages:
+        content = (message.get("content") or "").strip()
+        first_sentence = re.split(r"(?<=[.!?])\s", content, maxsplit=1)[0]
+        lines.append(f"{message['role']}: {first_sentence}")
+
+    # Drop the oldest lines until the summary fits its budget
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def llm_summarizer(client, model: str, max_output_tokens: int = 200):
+    """
+    Build a summarizer that asks the model to summarise trimmed turns.
+
+    Args:
+        client: OpenAI-compatible client (e.g. get_litellm_client())
+        model: Model name to use for summarisation
+        max_output_tokens: Cap on the summary length
+
+    Returns:
+        callable: Summarizer compatible with ConversationManager
+    """
+    def summarize(previous_summary, messages, max_tokens):
+        transcript = "\n".join(f"{m['role']}: {m.get('content') or ''}" for m in messages)
+        prompt = (
+            "Update the running summary of this conversation with the new turns. "
+            "Keep facts, names and decisions; be brief.\n\n"
+            f"Summary so far:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+        )
+        response = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.0,
+            max_tokens=min(max_output_tokens, max_tokens)
+        )
+        return response.choices[0].message.content or previous_summary
+
+    return summarize
+
+
+class ConversationManager:
+    """
+    Sliding-window conversation history bounded by a token budget.
+
+    Args:
+        max_tokens: Budget for the messages sent to the model
+        system_prompt: Optional system prompt, always kept
+        summary_tokens: Budget reserved for the summary of trimmed turns
+        min_recent_messages: Messages always kept verbatim, even over budget
+        summarizer: Callable(previous_summary, trimmed_messages, max_tokens)
+            returning the new summary; None disables summarisation
+    """
+
+    def __init__(self, max_tokens: int = 2000, system_prompt: str = None,
+                 summary_tokens: int = 256, min_recent_messages: int = 2,
+                 summarizer=extractive_summarizer):
+        self.max_tokens = max_tokens
+        self.system_prompt = system_prompt
+        self.summary_tokens = summary_tokens
+        self.min_recent_messages = min_recent_messages
+        self.summarizer = summarizer
+        self.history = []
+        self.summary = ""
+        self.trimmed_messages = 0
+        self.trimmed_tokens = 0
+        self._history_tokens = 0
+
+    def add(self, role: str, content: str):
+        message = {"role": role, "content": content}
+        self.history.append(message)
+        self._history_tokens += message_tokens(message)
+        self._trim()
+
+    def add_user(self, content: str):
+        self.add("user", content)
+
+    def add_assistant(self, content: str):
+        self.add("assistant", content)
+
+    def _fixed_tokens(self) -> int:
+        tokens = 0
+        if self.system_prompt:
+            tokens += MESSAGE_OVERHEAD_TOKENS + count_tokens(self.system_prompt)
+        if self.summary:
+            tokens += message_tokens(self._summary_message())
+        return tokens
+
+    def _summary_message(self) -> dict:
+        return {"role": "system", "content": SUMMARY_PREFIX + self.summary}
+
+    def _trim(self):
+        budget = self.max_tokens
+        if self.system_prompt:
+            budget -= MESSAGE_OVERHEAD_TOKENS + count_tokens(self.system_prompt)
+        if self.summarizer is not None and (self.summary or self._history_tokens > budget):
+            # Reserve the summary's full budget so it can grow without overflowing
+            budget -= MESSAGE_OVERHEAD_TOKENS + count_tokens(SUMMARY_PREFIX) + self.summary_tokens
+
+        cut = 0
+        remaining = self._history_tokens
+        while remaining > budget and len(self.history) - cut > self.min_recent_messages:
+            remaining -= message_tokens(self.history[cut])
+            cut += 1
+        # Never start the window with an assistant reply to a dropped question
+        while cut < len(self.history) - self.min_recent_messages and self.history[cut]["role"] == "assistant":
+            remaining -= message_tokens(self.history[cut])
+            cut += 1
+        if not cut:
+            return
+
+        trimmed = self.history[:cut]
+        del self.history[:cut]
+        self._history_tokens = remaining
+        self.trimmed_messages += len(trimmed)
+        self.trimmed_tokens += sum(message_tokens(m) for m in trimmed)
+        if self.summarizer is not None:
+            self.summary = self.summarizer(self.summary, trimmed, self.summary_tokens)
+
+    def messages(self):
+        """
+        Messages to send for the next request.
+
+        Returns:
+            list: System prompt, summary of trimmed turns, recent turns
+        """
+        messages = []
+        if self.system_prompt:
+            messages.append({"role": "system", "content": self.system_prompt})
+        if self.summary:
+            messages.append(self._summary_message())
+        messages.extend(self.history)
+        return messages
+
+    def stats(self) -> dict:
+        """
+        Token accounting for the current window.
+
+        Returns:
+            dict: kept/trimmed/summary token and message counts
+        """
+        return {
+            "kept_tokens": self._fixed_tokens() + self._history_tokens,
+            "kept_messages": len(self.history),
+            "trimmed_tokens": self.trimmed_tokens,
+            "trimmed_messages": self.trimmed_messages,
+            "summary_tokens": count_tokens(self.summary),
+        }
+
+    def record_on_trace(self):
+        """
+        Attach the token accounting to the active MLflow trace.
+
+        Must be called inside a traced function (e.g. under @mlflow.trace).
+        """
+        import mlflow
+
+        try:
+            mlflow.update_current_trace(
+                metadata={f"conversation.{key}": str(value) for key, value in self.stats().items()}
+            )
+        except Exception as e:
+            log.warning("Error recording conversation stats: %s", e)
@@ -0,0 +1,388 @@
+"""
+Token usage and cost accounting with precomputed price tables.
+
+PriceTable is built once at startup: built-in prices for the models in
+config.yaml, overlaid with LiteLLM's ``model_cost`` map when available,
+an optional JSON override file (``OBS_PRICE_FILE``) and per-deployment
+``model_info`` prices from config.yaml. It is indexed by deployment
+(``gemini/gemini-2.0-flash``), by proxy model name (``gemini-2.0-flash``)
+and by bare model name, so pricing a request is one dict lookup and three
+multiplications.
+
+UsageCounters accumulates per-key, per-user and per-session totals in
+per-thread shards: the request path only touches its own thread's dicts
+and takes no lock; readers sum the shards.
+
+Usage:
+    engine = get_cost_engine()
+    engine.account(record)          # adds input_cost/output_cost to a trace record
+    engine.counters.totals("user")  # user -> [cost, prompt, completion, requests]
+
+    python -m observability.cost bench --requests 200000
+"""
+
+import argparse
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+from observability.settings import LITELLM_CONFIG_PATH
+
+
+log = logging.getLogger(__name__)
+
+
+PRICE_FILE = os.environ.get("OBS_PRICE_FILE")
+
+# USD per 1M tokens: (input, output, cached input)
+DEFAULT_PRICES_PER_MILLION = {
+    "gemini/gemini-2.0-flash": (0.10, 0.40, 0.025),
+    "groq/llama-3.1-8b-instant": (0.05, 0.08, 0.05),
+}
+
+DIMENSIONS = ("key", "user", "session")
+
+ModelPrice = collections.namedtuple("ModelPrice", ("input", "output", "cached_input"))
+
+ZERO_PRICE = ModelPrice(0.0, 0.0, 0.0)
+
+
+class PriceTable:
+    """
+    Per-token prices indexed by deployment, alias and bare model name.
+
+    Args:
+        prices: model -> ModelPrice (USD per token)
+    """
+
+    def __init__(self, prices: dict = None):
+        self.prices = {}
+        self.unknown_models = collections.Counter()
+        self._bare_owner = {}
+        for model, price in (prices or {}).items():
+            self.add(model, price)
+
+    def add(self, model: str, price: ModelPrice, alias: str = None):
+        self.prices[model] = price
+        if alias:
+            self.prices[alias] = price
+        if "/" in model:
+            # Bare name, unless another provider already claimed it
+            bare = model.split("/", 1)[1]
+            if self._bare_owner.setdefault(bare, model) == model:
+                self.prices[bare] = price
+
+    def get(self, model: str) -> ModelPrice:
+        price = self.prices.get(model)
+        if price is None:
+            self.unknown_models[model] += 1
+            return ZERO_PRICE
+        return price
+
+    @classmethod
+    def load(cls, config_path: str = LITELLM_CONFIG_PATH, price_file: str = PRICE_FILE) -> "PriceTable":
+        """
+        Build the table from all price sources (later sources win).
+
+        Returns:
+            PriceTable
+        """
+        table = cls({
+            model: ModelPrice(i / 1e6, o / 1e6, c / 1e6)
+            for model, (i, o, c) in DEFAULT_PRICES_PER_MILLION.items()
+        })
+        try:
+            import litellm
+
+            for model in list(table.prices):
+                info = litellm.model_cost.get(model)
+                if info and info.get("input_cost_per_token") is not None:
+                    table.add(model, _price_from_info(info))
+        except ImportError:
+            pass
+
+        if price_file and os.path.exists(price_file):
+            with open(price_file) as f:
+                for model, info in json.load(f).items():
+                    table.add(model, _price_from_info(info))
+
+        for alias, model, info in _config_deployments(config_path):
+            price = _price_from_info(info) if info.get("input_cost_per_token") is not None else None
+            if price is None:
+                price = table.prices.get(model)
+            if price is not None:
+                table.add(model, price, alias=alias)
+        return table
+
+
+def _price_from_info(info: dict) -> ModelPrice:
+    input_cost = float(info.get("input_cost_per_token") or 0.0)
+    return ModelPrice(
+        input_cost,
+        float(info.get("output_cost_per_token") or 0.0),
+        float(info.get("cache_read_input_token_cost") or input_cost),
+    )
+
+
+def _config_deployments(config_path: str):
+    """
+    Yield (model_name, litellm model, model_info) from a proxy config file.
+    """
+    if not config_path or not os.path.exists(config_path):
+        return
+    try:
+        import yaml
+    except ImportError:
+        return
+    with open(config_path) as f:
+        config = yaml.safe_load(f) or {}
+    for entry in config.get("model_list") or []:
+        model = (entry.get("litellm_params") or {}).get("model")
+        if model:
+            yield entry.get("model_name"), model, entry.get("model_info") or {}
+
+
+class UsageCounters:
+    """
+    Per-dimension usage totals in per-thread shards.
+
+    Writers only touch their own thread's shard (no lock on the request
+    path); the lock is taken once per thread to register the shard and by
+    readers while summing.
+    """
+
+    def __init__(self, dimensions=DIMENSIONS):
+        self.dimensions = dimensions
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {dimension: {} for dimension in self.dimensions}
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def add(self, cost: float, prompt_tokens: int, completion_tokens: int, **ids):
+        """
+        Add one request's usage.
+
+        Args:
+            cost: Request cost in USD
+            prompt_tokens: Prompt tokens
+            completion_tokens: Completion tokens
+            **ids: Dimension values, e.g. key="...", user="...", session="..."
+        """
+        shard = self._shard()
+        for dimension, value in ids.items():
+            if value is None:
+                continue
+            totals = shard[dimension].get(value)
+            if totals is None:
+                totals = shard[dimension][value] = [0.0, 0, 0, 0]
+            totals[0] += cost
+            totals[1] += prompt_tokens
+            totals[2] += completion_tokens
+            totals[3] += 1
+
+    def totals(self, dimension: str) -> dict:
+        """
+        Sum a dimension over all shards.
+
+        Returns:
+            dict: id -> [cost, prompt_tokens, completion_tokens, requests]
+        """
+        result = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # Copy first: the owning thread may insert concurrently
+            for value, totals in list(shard[dimension].items()):
+                current = result.setdefault(value, [0.0, 0, 0, 0])
+                for i, amount in enumerate(list(totals)):
+                    current[i] += amount
+        return result
+
+
+class CostEngine:
+    """
+    Prices requests and accumulates usage totals.
+
+    Args:
+        table: PriceTable (loaded from all sources by default)
+        counters: UsageCounters
+    """
+
+    def __init__(self, table: PriceTable = None, counters: UsageCounters = None):
+        self.table = table if table is not None else PriceTable.load()
+        self.counters = counters if counters is not None else UsageCounters()
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0):
+        """
+        Price one request. Cached tokens are part of ``prompt_tokens``.
+
+        Returns:
+            tuple: (input_cost, output_cost) in USD
+        """
+        price = self.table.get(model)
+        input_cost = (prompt_tokens - cached_tokens) * price.input + cached_tokens * price.cached_input
+        return input_cost, completion_tokens * price.output
+
+    def account(self, record: dict) -> dict:
+        """
+        Price a trace record, add it to the counters and annotate it.
+
+        Sets ``cached_tokens``, ``input_cost`` and ``output_cost`` on the
+        record, and ``response_cost`` when LiteLLM did not provide one.
+
+        Args:
+            record: Record from observability.callbacks.build_trace_record
+
+        Returns:
+            dict: The same record
+        """
+        prompt_tokens = record.get("prompt_tokens") or 0
+        completion_tokens = record.get("completion_tokens") or 0
+        cached_tokens = record.get("cached_tokens")
+        if cached_tokens is None:
+            cached_tokens = record["cached_tokens"] = _cached_tokens(record.get("response"))
+
+        input_cost, output_cost = self.cost(record.get("model"), prompt_tokens, completion_tokens, cached_tokens)
+        record["input_cost"] = input_cost
+        record["output_cost"] = output_cost
+        if record.get("response_cost") is None:
+            record["response_cost"] = input_cost + output_cost
+
+        metadata = record.get("metadata") or {}
+        self.counters.add(
+            record["response_cost"], prompt_tokens, completion_tokens,
+            key=metadata.get("user_api_key_hash"),
+            user=metadata.get("mlflow.trace.user") or metadata.get("user_api_key_user_id"),
+            session=metadata.get("mlflow.trace.session")
+        )
+        return record
+
+    def record_on_trace(self, model: str, usage):
+        """
+        Attach a client-side response's cost to the active MLflow trace.
+
+        Must be called inside a traced function (e.g. under @mlflow.trace).
+
+        Args:
+            model: Model the request was sent to
+            usage: ``response.usage`` from the OpenAI client
+        """
+        import mlflow
+
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+        input_cost, output_cost = self.cost(model, prompt_tokens, completion_tokens, cached_tokens)
+        try:
+            mlflow.update_current_trace(tags={
+                "obs.model": model,
+                "obs.prompt_tokens": str(prompt_tokens),
+                "obs.completion_tokens": str(completion_tokens),
+                "obs.cached_tokens": str(cached_tokens),
+                "obs.input_cost": str(input_cost),
+                "obs.output_cost": str(output_cost),
+                "obs.response_cost": str(input_cost + output_cost),
+            })
+        except Exception as e:
+            log.warning("Error recording cost: %s", e)
+
+
+def _cached_tokens(response) -> int:
+    try:
+        return int(response["usage"]["prompt_tokens_details"]["cached_tokens"] or 0)
+    except (KeyError, TypeError, ValueError):
+        return 0
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_cost_engine() -> CostEngine:
+    """
+    Process-wide cost engine; the price table is loaded on first use.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = CostEngine()
+    return _engine
+
+
+def bench(requests: int = 200000, threads: int = 4) -> dict:
+    """
+    Measure per-request accounting overhead.
+
+    Returns:
+        dict: Mean cost per request and the CPU share it would take at 10k RPS
+    """
+    engine = CostEngine(PriceTable.load())
+    models = list(DEFAULT_PRICES_PER_MILLION)
+    per_thread = requests // threads
+    records = [
+        {
+            "model": models[i % len(models)],
+            "prompt_tokens": 120 + i % 50,
+            "completion_tokens": 40 + i % 30,
+            "cached_tokens": 0,
+            "response_cost": None,
+            "metadata": {"user_api_key_hash": f"key{i % 100}", "mlflow.trace.user": f"user_{i % 500}",
+                         "mlflow.trace.session": f"session_{i % 5000}"},
+        }
+        for i in range(1000)
+    ]
+
+    def work():
+        for i in range(per_thread):
+            record = dict(records[i % 1000])
+            engine.account(record)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    began = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+
+    per_request_us = elapsed / (per_thread * threads) * 1e6
+    return {
+        "requests": per_thread * threads,
+        "threads": threads,
+        "per_request_us": round(per_request_us, 2),
+        "cpu_share_at_10k_rps": round(per_request_us * 10000 / 1e6, 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Token cost accounting")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("prices", help="Show the loaded price table (USD per 1M tokens)")
+    bench_parser = subparsers.add_parser("bench", help="Measure per-request accounting overhead")
+    bench_parser.add_argument("--requests", type=int, default=200000)
+    bench_parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if args.command == "prices":
+        for model, price in sorted(PriceTable.load().prices.items()):
+            print(f"  {model}: in {price.input * 1e6:.4f} out {price.output * 1e6:.4f} "
+                  f"cached {price.cached_input * 1e6:.4f}")
+    else:
+        print(f"✓ {bench(args.requests, args.threads)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Single fan-out dispatcher for proxy logging sinks.
+
+Registering each sink as its own LiteLLM callback means every sink
+rebuilds the log payload from the callback kwargs, and LiteLLM invokes
+them one after another. Dispatcher builds the payload once, exposes it to
+sinks as a read-only mapping, and runs all sinks concurrently: coroutine
+sinks on the event loop, blocking sinks on a small thread pool. Each sink
+has its own timeout and a failing or slow sink does not affect the others.
+Per-sink execution time, errors and timeouts are recorded in the profiler
+metrics (``/debug/metrics``) under ``dispatch.<name>``.
+
+Sinks receive the payload as a ``types.MappingProxyType``. The top level
+cannot be modified; nested values (e.g. ``messages``) are shared between
+sinks and must be treated as read-only.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import time
+import types
+
+from observability.profiler import ProfilerMetrics, metrics as profiler_metrics
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT_SECONDS = 2.0
+
+
+class Dispatcher:
+    """
+    Runs registered sinks concurrently on one shared payload.
+
+    Args:
+        timeout: Default per-sink timeout in seconds
+        max_workers: Threads for blocking sinks
+        metrics: ProfilerMetrics receiving per-sink cost
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT_SECONDS, max_workers: int = 4,
+                 metrics: ProfilerMetrics = profiler_metrics):
+        self.timeout = timeout
+        self.metrics = metrics
+        self.sinks = {}
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="log-sink"
+        )
+
+    def register(self, name: str, sink, timeout: float = None):
+        """
+        Add a sink.
+
+        Args:
+            name: Metric label
+            sink: Callable(payload), plain or ``async def``
+            timeout: Seconds before the sink is abandoned (default self.timeout)
+        """
+        self.sinks[name] = (sink, timeout or self.timeout)
+        return self
+
+    def _run_sync(self, name: str, sink, payload):
+        began = time.perf_counter()
+        try:
+            sink(payload)
+        except Exception:
+            self.metrics.callback_errors[f"dispatch.{name}"] += 1
+            raise
+        finally:
+            self.metrics.callbacks[f"dispatch.{name}"].observe(time.perf_counter() - began)
+
+    async def _run_async(self, name: str, sink, payload):
+        began = time.perf_counter()
+        try:
+            await sink(payload)
+        except Exception:
+            self.metrics.callback_errors[f"dispatch.{name}"] += 1
+            raise
+        finally:
+            self.metrics.callbacks[f"dispatch.{name}"].observe(time.perf_counter() - began)
+
+    def _outcome(self, name: str, error) -> str:
+        if error is None:
+            return "ok"
+        if isinstance(error, (asyncio.TimeoutError, concurrent.futures.TimeoutError)):
+            self.metrics.callback_timeouts[f"dispatch.{name}"] += 1
+            return "timeout"
+        log.warning("Error in log sink %s: %s", name, error)
+        return "error"
+
+    def dispatch(self, record: dict) -> dict:
+        """
+        Fan a record out from a synchronous callback.
+
+        Coroutine sinks are skipped here; LiteLLM calls the async path for
+        async requests.
+
+        Returns:
+            dict: Sink name -> "ok", "error" or "timeout"
+        """
+        payload = types.MappingProxyType(record)
+        futures = {
+            name: self.executor.submit(self._run_sync, name, sink, payload)
+            for name, (sink, _) in self.sinks.items()
+            if not asyncio.iscoroutinefunction(sink)
+        }
+        started = time.monotonic()
+        results = {}
+        for name, future in futures.items():
+            timeout = max(0.0, started + self.sinks[name][1] - time.monotonic())
+            try:
+                future.result(timeout=timeout)
+                error = None
+            except Exception as e:
+                error = e
+            results[name] = self._outcome(name, error)
+        log.debug("Dispatched record", extra={"sinks": results})
+        return results
+
+    async def dispatch_async(self, record: dict) -> dict:
+        """
+        Fan a record out from an async callback without blocking the loop.
+
+        A blocking sink that times out keeps its worker thread until it
+        returns; the dispatcher just stops waiting for it.
+
+        Returns:
+            dict: Sink name -> "ok", "error" or "timeout"
+        """
+        payload = types.MappingProxyType(record)
+        loop = asyncio.get_running_loop()
+        names = []
+        waits = []
+        for name, (sink, timeout) in self.sinks.items():
+            if asyncio.iscoroutinefunction(sink):
+                run = self._run_async(name, sink, payload)
+            else:
+                run = loop.run_in_executor(self.executor, self._run_sync, name, sink, payload)
+            names.append(name)
+            waits.append(asyncio.wait_for(run, timeout))
+        outcomes = await asyncio.gather(*waits, return_exceptions=True)
+        results = {
+            name: self._outcome(name, outcome if isinstance(outcome, BaseException) else None)
+            for name, outcome in zip(names, outcomes)
+        }
+        log.debug("Dispatched record", extra={"sinks": results})
+        return results
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,419 @@
+"""
+Structured, non-blocking logging for the stack's processes.
+
+- JsonFormatter writes one JSON object per line with the service name and
+  the ``trace_id`` / ``request_id`` bound with ``bind()`` (or passed in
+  ``extra``). ``trace_id`` is the id the spool records as the
+  ``spool.trace_id`` tag, so a log line can be looked up in MLflow with
+  ``tags.`spool.trace_id` = '<trace_id>'``.
+- DroppingQueueHandler puts records on a bounded queue and returns; a
+  QueueListener thread formats and writes them. When the queue is full,
+  records are dropped and counted instead of blocking the request.
+- SamplingFilter keeps a fraction of DEBUG records, and RateLimitFilter
+  caps each call site to a token-bucket rate; the number of suppressed
+  records is reported on the next record let through.
+- RotatingCompressedFileHandler rotates by size and gzips the rotated
+  files (``<name>.log.1.gz`` ...). Rotation only renames the file;
+  compression runs on its own thread.
+
+``start.sh`` pipes the output of every service through
+``python -m observability.logs pipe --service <name>``. The pipe passes
+JSON lines through unchanged, wraps plain text lines (e.g. from MLflow
+and LiteLLM) as JSON, and writes ``logs/<name>.log`` with rotation. Like
+setup_logging(), it only queues lines on the reading thread and writes
+them from a listener thread, so the service's writes to a full pipe
+never wait on the disk.
+
+Usage:
+    from observability.logs import bind, setup_logging
+    setup_logging("spool-shipper")
+    with bind(trace_id=record["trace_id"]):
+        log.warning("Sink failed")
+"""
+
+import argparse
+import atexit
+import contextlib
+import contextvars
+import datetime
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+
+from observability.settings import REPO_DIR
+
+
+LOG_DIR = os.environ.get("OBS_LOG_DIR", os.path.join(REPO_DIR, "logs"))
+DEFAULT_MAX_BYTES = int(os.environ.get("OBS_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+DEFAULT_BACKUPS = int(os.environ.get("OBS_LOG_BACKUPS", "5"))
+DEFAULT_QUEUE_SIZE = 10000
+
+_context = contextvars.ContextVar("observability_log_context", default={})
+
+# LogRecord attributes that are not user-supplied extra fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_LEVEL_PATTERN = re.compile(r"\b(DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL)\b")
+
+
+@contextlib.contextmanager
+def bind(**ids):
+    """
+    Attach ids (e.g. trace_id, request_id) to every record logged inside
+    the block, including from tasks created inside it.
+    """
+    token = _context.set({**_context.get(), **{k: v for k, v in ids.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def _timestamp(created: float) -> str:
+    return datetime.datetime.fromtimestamp(created, datetime.timezone.utc).isoformat(timespec="milliseconds")
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as single-line JSON objects.
+
+    Args:
+        service: Value of the ``service`` field
+    """
+
+    def __init__(self, service: str = None):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": _timestamp(record.created),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if self.service:
+            entry["service"] = self.service
+        entry.update(getattr(record, "log_context", None) or {})
+        for key, value in vars(record).items():
+            if key not in _RESERVED and key != "log_context" and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks: records are dropped when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only the cheap parts run on the caller's thread: merge the args
+        # (they may be mutated later) and capture the bound ids. The
+        # listener does the JSON and traceback formatting.
+        record.msg = record.getMessage()
+        record.args = None
+        record.log_context = _context.get()
+        if record.stack_info:
+            record.stack_info = str(record.stack_info)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of records at or below ``level`` (DEBUG by default).
+    """
+
+    def __init__(self, rate: float, level: int = logging.DEBUG, rng: random.Random = None):
+        super().__init__()
+        self.rate = rate
+        self.level = level
+        self._random = (rng or random.Random()).random
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > self.level or self.rate >= 1 or self._random() < self.rate
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per call site (logger, file, line).
+
+    Args:
+        rate: Records per second allowed per call site
+        burst: Bucket size
+        level: Records above this level are never limited
+        clock: Time source (for tests)
+    """
+
+    def __init__(self, rate: float = 10.0, burst: int = 20, level: int = logging.ERROR, clock=time.monotonic):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.level = level
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = self.clock()
+        with self._lock:
+            tokens, updated, suppressed = self._buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                return False
+            self._buckets[key] = (tokens - 1, now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb", compresslevel=6) as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class RotatingCompressedFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Size-rotated log file whose rotated copies are gzip-compressed.
+
+    The rotated file is renamed and compressed on a separate thread, so
+    writes continue while a large file is gzipped.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS):
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._rotate
+        self._compressor = None
+
+    def _rotate(self, source: str, dest: str):
+        pending = dest[:-len(".gz")]
+        os.replace(source, pending)
+        self._compressor = threading.Thread(target=_gzip_rotator, args=(pending, dest),
+                                            name="log-compress", daemon=True)
+        self._compressor.start()
+
+    def _wait_for_compression(self):
+        if self._compressor is not None:
+            self._compressor.join()
+            self._compressor = None
+
+    def doRollover(self):
+        # The previous backup must be complete before backups are shifted
+        self._wait_for_compression()
+        super().doRollover()
+
+    def close(self):
+        self._wait_for_compression()
+        super().close()
+
+
+class LogPipeline:
+    """
+    A logger's queue handler plus the listener thread that drains it.
+    """
+
+    def __init__(self, logger: logging.Logger, handler: DroppingQueueHandler,
+                 listener: logging.handlers.QueueListener):
+        self.logger = logger
+        self.handler = handler
+        self.listener = listener
+        self._stopped = False
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped
+
+    def stop(self):
+        """
+        Flush queued records and detach from the root logger.
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        self.logger.removeHandler(self.handler)
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+
+
+def setup_logging(service: str, path: str = None, stream=None, level: str = None,
+                  queue_size: int = DEFAULT_QUEUE_SIZE, debug_sample: float = None,
+                  rate: float = None, burst: int = 20, max_bytes: int = DEFAULT_MAX_BYTES,
+                  backups: int = DEFAULT_BACKUPS, logger: str = "") -> LogPipeline:
+    """
+    Route a logger (the root logger by default) through a bounded queue
+    to a JSON-lines sink.
+
+    Args:
+        service: Service name added to every line
+        path: Log file (rotated and compressed); default is stderr,
+            which start.sh pipes into ``observability.logs pipe``
+        stream: Stream to write to instead of a file
+        level: Root level (``OBS_LOG_LEVEL``, default INFO)
+        queue_size: Records buffered before dropping
+        debug_sample: Fraction of DEBUG records kept (``OBS_LOG_DEBUG_SAMPLE``, default 0.01)
+        rate: Per-call-site records/second up to ERROR (``OBS_LOG_RATE``, default 10)
+        burst: Per-call-site burst
+        max_bytes: Rotation size for ``path``
+        backups: Rotated files kept for ``path``
+        logger: Logger to attach to; a named logger stops propagating so
+            its records are not also written by the host's handlers
+
+    Returns:
+        LogPipeline (stopped automatically at exit)
+    """
+    if path:
+        sink = RotatingCompressedFileHandler(path, max_bytes, backups)
+    else:
+        sink = logging.StreamHandler(stream or sys.stderr)
+    sink.setFormatter(JsonFormatter(service))
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(
+        debug_sample if debug_sample is not None else float(os.environ.get("OBS_LOG_DEBUG_SAMPLE", "0.01"))
+    ))
+    handler.addFilter(RateLimitFilter(
+        rate if rate is not None else float(os.environ.get("OBS_LOG_RATE", "10")), burst
+    ))
+
+    target = logging.getLogger(logger)
+    for existing in [h for h in target.handlers if isinstance(h, DroppingQueueHandler)]:
+        target.removeHandler(existing)
+    target.addHandler(handler)
+    target.setLevel((level or os.environ.get("OBS_LOG_LEVEL", "INFO")).upper())
+    if logger:
+        target.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, sink, respect_handler_level=True)
+    listener.start()
+    pipeline = LogPipeline(target, handler, listener)
+    atexit.register(pipeline.stop)
+    return pipeline
+
+
+def configure_from_env(service: str, logger: str = ""):
+    """
+    setup_logging() if ``OBS_STRUCTURED_LOGS=1`` (start.sh sets it).
+
+    Returns:
+        LogPipeline or None
+    """
+    if os.environ.get("OBS_STRUCTURED_LOGS") != "1":
+        return None
+    return setup_logging(service, logger=logger)
+
+
+def wrap_line(line: str, service: str) -> str:
+    """
+    Convert one line of process output to a JSON log line.
+
+    JSON object lines pass through (with ``service`` added if missing);
+    anything else becomes ``{"ts", "service", "level", "msg"}``, with the
+    level guessed from the text.
+    """
+    line = line.rstrip("\r\n")
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            entry = None
+        if isinstance(entry, dict):
+            if "service" not in entry:
+                entry["service"] = service
+                return json.dumps(entry, ensure_ascii=False)
+            return line
+    match = _LEVEL_PATTERN.search(line[:120])
+    level = match.group(1) if match else "INFO"
+    return json.dumps({
+        "ts": _timestamp(time.time()),
+        "service": service,
+        "level": "WARNING" if level == "WARN" else level,
+        "msg": line,
+    }, ensure_ascii=False)
+
+
+def pipe(service: str, path: str, source=None, max_bytes: int = DEFAULT_MAX_BYTES,
+         backups: int = DEFAULT_BACKUPS, queue_size: int = DEFAULT_QUEUE_SIZE) -> int:
+    """
+    Copy process output from ``source`` (stdin) to a rotated JSON log.
+
+    Lines are queued for a listener thread that writes and rotates the
+    file; when the queue is full they are dropped and counted rather than
+    left in the pipe, where they would block the service.
+
+    Returns:
+        int: Lines written
+    """
+    source = source or sys.stdin
+    handler = RotatingCompressedFileHandler(path, max_bytes, backups)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    sink = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    listener = logging.handlers.QueueListener(sink.queue, handler)
+    listener.start()
+    lines = 0
+    try:
+        for line in source:
+            if not line.strip():
+                continue
+            sink.emit(logging.makeLogRecord({"msg": wrap_line(line, service), "levelno": logging.INFO}))
+            lines += 1
+    finally:
+        listener.stop()
+        if sink.dropped:
+            handler.emit(logging.makeLogRecord({
+                "msg": wrap_line(f"WARNING log pipe dropped {sink.dropped} lines", service),
+                "levelno": logging.WARNING,
+            }))
+        handler.close()
+    return lines - sink.dropped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Structured log pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pipe_parser = subparsers.add_parser("pipe", help="Write stdin as rotated JSON lines")
+    pipe_parser.add_argument("--service", required=True)
+    pipe_parser.add_argument("--file", help="Log file (default: $OBS_LOG_DIR/<service>.log)")
+    pipe_parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES)
+    pipe_parser.add_argument("--backups", type=int, default=DEFAULT_BACKUPS)
+    args = parser.parse_args(argv)
+
+    # Line-buffered text with undecodable bytes replaced, so one bad
+    # line cannot stop the pipe
+    source = open(sys.stdin.fileno(), "r", encoding="utf-8", errors="replace", buffering=1, closefd=False)
+    pipe(args.service, args.file or os.path.join(LOG_DIR, f"{args.service}.log"), source,
+         args.max_bytes, args.backups)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+"""
+Spend-log compaction and partitioning for the LiteLLM database.
+
+With ``store_prompts_in_spend_logs: true`` every request stores its full
+prompt and response in ``LiteLLM_SpendLogs``, which grows without bound.
+This job keeps that table to a short hot window:
+
+1. Rows older than ``hot_days`` are moved, in bounded batches, out of
+   ``LiteLLM_SpendLogs`` in one statement per batch:
+   - prompt/response bodies go to gzip JSONL files under the cold root
+     (written and fsynced before the batch commits), together with any
+     column ``obs_spend_logs`` does not have, so no source column is lost,
+   - the attribution columns (key, team, user, metadata, tags, model
+     deployment, provider, caller IP, cache key, ...) go to
+     ``obs_spend_logs``, range-partitioned by day on "startTime",
+   - per day/key/model/user/team aggregates are added to
+     ``obs_spend_daily``, which dashboards should query.
+2. ``obs_spend_logs`` partitions older than ``detail_days`` are dropped
+   (aggregates are kept forever).
+3. ``LiteLLM_SpendLogs`` is vacuumed and analyzed.
+
+Usage (e.g. from cron, hourly):
+    python -m observability.maintenance --hot-days 7 --detail-days 90
+"""
+
+import argparse
+import datetime
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+
+from observability.settings import LITELLM_DATABASE_URL, DATA_DIR
+
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_HOT_DAYS = 7
+DEFAULT_DETAIL_DAYS = 90
+DEFAULT_BATCH_SIZE = 5000
+COLD_ROOT = os.path.join(DATA_DIR, "cold", "spend_prompts")
+
+# Large payload columns moved to cold storage
+BODY_COLUMNS = ("messages", "response", "proxy_server_request")
+DETAIL_COLUMNS = (
+    "request_id", "call_type", "api_key", "spend", "total_tokens", "prompt_tokens",
+    "completion_tokens", "startTime", "endTime", "completionStartTime", "model",
+    "model_group", "api_base", "user", "team_id", "end_user", "cache_hit", "status",
+    "session_id", "metadata", "request_tags", "model_id", "custom_llm_provider",
+    "requester_ip_address", "cache_key",
+)
+
+CREATE_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS obs_spend_logs (
+    request_id TEXT NOT NULL,
+    call_type TEXT,
+    api_key TEXT,
+    spend DOUBLE PRECISION,
+    total_tokens INTEGER,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    "startTime" TIMESTAMP NOT NULL,
+    "endTime" TIMESTAMP,
+    "completionStartTime" TIMESTAMP,
+    model TEXT,
+    model_group TEXT,
+    api_base TEXT,
+    "user" TEXT,
+    team_id TEXT,
+    end_user TEXT,
+    cache_hit TEXT,
+    status TEXT,
+    session_id TEXT,
+    metadata JSONB,
+    request_tags JSONB,
+    model_id TEXT,
+    custom_llm_provider TEXT,
+    requester_ip_address TEXT,
+    cache_key TEXT,
+    PRIMARY KEY (request_id, "startTime")
+) PARTITION BY RANGE ("startTime");
+
+-- Tables created before the attribution columns were kept
+ALTER TABLE obs_spend_logs
+    ADD COLUMN IF NOT EXISTS metadata JSONB,
+    ADD COLUMN IF NOT EXISTS request_tags JSONB,
+    ADD COLUMN IF NOT EXISTS model_id TEXT,
+    ADD COLUMN IF NOT EXISTS custom_llm_provider TEXT,
+    ADD COLUMN IF NOT EXISTS requester_ip_address TEXT,
+    ADD COLUMN IF NOT EXISTS cache_key TEXT;
+
+CREATE TABLE IF NOT EXISTS obs_spend_daily (
+    day DATE NOT NULL,
+    api_key TEXT NOT NULL,
+    model TEXT NOT NULL,
+    "user" TEXT NOT NULL,
+    team_id TEXT NOT NULL,
+    requests BIGINT NOT NULL,
+    spend DOUBLE PRECISION NOT NULL,
+    prompt_tokens BIGINT NOT NULL,
+    completion_tokens BIGINT NOT NULL,
+    PRIMARY KEY (day, api_key, model, "user", team_id)
+);
+"""
+
+SELECT_BATCH_SQL = """
+SELECT *
+FROM "LiteLLM_SpendLogs"
+WHERE "startTime" < %(cutoff)s
+ORDER BY "startTime"
+LIMIT %(limit)s
+FOR UPDATE SKIP LOCKED
+"""
+
+_detail_list = ", ".join(f'"{column}"' for column in DETAIL_COLUMNS)
+
+MOVE_BATCH_SQL = f"""
+WITH moved AS (
+    DELETE FROM "LiteLLM_SpendLogs"
+    WHERE request_id = ANY(%(request_ids)s)
+    RETURNING {_detail_list}
+), detail AS (
+    INSERT INTO obs_spend_logs ({_detail_list})
+    SELECT {_detail_list} FROM moved
+    ON CONFLICT DO NOTHING
+)
+INSERT INTO obs_spend_daily AS d (day, api_key, model, "user", team_id, requests, spend,
+                                  prompt_tokens, completion_tokens)
+SELECT "startTime"::date, COALESCE(api_key, ''), COALESCE(model, ''), COALESCE("user", ''),
+       COALESCE(team_id, ''), COUNT(*), COALESCE(SUM(spend), 0),
+       COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0)
+FROM moved
+GROUP BY 1, 2, 3, 4, 5
+ON CONFLICT (day, api_key, model, "user", team_id) DO UPDATE SET
+    requests = d.requests + EXCLUDED.requests,
+    spend = d.spend + EXCLUDED.spend,
+    prompt_tokens = d.prompt_tokens + EXCLUDED.prompt_tokens,
+    completion_tokens = d.completion_tokens + EXCLUDED.completion_tokens
+"""
+
+LIST_PARTITIONS_SQL = """
+SELECT child.relname
+FROM pg_inherits
+JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+WHERE parent.relname = 'obs_spend_logs'
+"""
+
+
+def partition_name(day: datetime.date) -> str:
+    return f"obs_spend_logs_{day:%Y%m%d}"
+
+
+def partition_ddl(day: datetime.date) -> str:
+    """
+    DDL creating the daily partition of obs_spend_logs for ``day``.
+
+    Args:
+        day: Partition date
+
+    Returns:
+        str: CREATE TABLE IF NOT EXISTS ... PARTITION OF statement
+    """
+    next_day = day + datetime.timedelta(days=1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF obs_spend_logs "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{next_day.isoformat()}')"
+    )
+
+
+def expired_partitions(names, cutoff: datetime.date):
+    """
+    Select daily partitions entirely older than ``cutoff``.
+
+    Args:
+        names: Partition table names
+        cutoff: First day to keep
+
+    Returns:
+        list: Names of partitions to drop
+    """
+    expired = []
+    for name in names:
+        try:
+            day = datetime.datetime.strptime(name.rsplit("_", 1)[-1], "%Y%m%d").date()
+        except ValueError:
+            continue
+        if day < cutoff:
+            expired.append(name)
+    return sorted(expired)
+
+
+def cold_record(row: dict) -> dict:
+    """
+    Select the parts of a spend-log row archived in cold storage.
+
+    Args:
+        row: Full LiteLLM_SpendLogs row
+
+    Returns:
+        dict: request_id, startTime (ISO), BODY_COLUMNS and every column
+            not kept in obs_spend_logs
+    """
+    record = {"request_id": row["request_id"], "startTime": row["startTime"].isoformat()}
+    record.update({column: row.get(column) for column in BODY_COLUMNS})
+    record.update({column: value for column, value in row.items() if column not in DETAIL_COLUMNS})
+    return record
+
+
+def write_cold_batch(rows, cold_root: str = COLD_ROOT) -> list:
+    """
+    Write prompt/response bodies to compressed JSONL, one file per day.
+
+    Files are fsynced before returning so the database rows can be
+    deleted safely. A batch that is written but not committed is moved
+    again on the next run; readers should dedupe on request_id.
+
+    Args:
+        rows: Spend-log rows (at least request_id, startTime and BODY_COLUMNS)
+        cold_root: Cold storage root directory
+
+    Returns:
+        list: Paths of the files written
+    """
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(row["startTime"].date(), []).append(row)
+
+    paths = []
+    for day, day_rows in by_day.items():
+        directory = os.path.join(cold_root, day.isoformat())
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.jsonl.gz")
+        with open(path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+                for row in day_rows:
+                    f.write(json.dumps(cold_record(row), default=str).encode("utf-8") + b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+        paths.append(path)
+    return paths
+
+
+def read_cold_bodies(day: datetime.date, cold_root: str = COLD_ROOT):
+    """
+    Read archived prompt/response bodies for one day.
+
+    Args:
+        day: Day to read
+        cold_root: Cold storage root directory
+
+    Yields:
+        dict: One record per request (deduplicated by request_id)
+    """
+    directory = os.path.join(cold_root, day.isoformat())
+    if not os.path.isdir(directory):
+        return
+    seen = set()
+    for name in sorted(os.listdir(directory)):
+        with gzip.open(os.path.join(directory, name), "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["request_id"] not in seen:
+                    seen.add(record["request_id"])
+                    yield record
+
+
+class SpendLogCompactor:
+    """
+    Moves aged spend logs out of the hot LiteLLM table.
+    """
+
+    def __init__(self, database_url: str = LITELLM_DATABASE_URL, cold_root: str = COLD_ROOT,
+                 hot_days: int = DEFAULT_HOT_DAYS, detail_days: int = DEFAULT_DETAIL_DAYS,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        import psycopg2
+
+        self.conn = psycopg2.connect(database_url)
+        self.cold_root = cold_root
+        self.hot_days = hot_days
+        self.detail_days = detail_days
+        self.batch_size = batch_size
+        self._partitions = set()
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute(CREATE_TABLES_SQL)
+            cur.execute(LIST_PARTITIONS_SQL)
+            self._partitions = {row[0] for row in cur.fetchall()}
+
+    def _ensure_partitions(self, cur, days):
+        for day in sorted(days):
+            if partition_name(day) not in self._partitions:
+                cur.execute(partition_ddl(day))
+                self._partitions.add(partition_name(day))
+
+    def move_batch(self, cutoff: datetime.datetime) -> int:
+        """
+        Move one batch of rows older than ``cutoff``.
+
+        Args:
+            cutoff: Rows with "startTime" before this are moved
+
+        Returns:
+            int: Rows moved
+        """
+        from psycopg2.extras import RealDictCursor
+
+        with self.conn, self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(SELECT_BATCH_SQL, {"cutoff": cutoff, "limit": self.batch_size})
+            rows = cur.fetchall()
+            if not rows:
+                return 0
+            self._ensure_partitions(cur, {row["startTime"].date() for row in rows})
+            write_cold_batch(rows, self.cold_root)
+            cur.execute(MOVE_BATCH_SQL, {"request_ids": [row["request_id"] for row in rows]})
+        return len(rows)
+
+    def drop_expired_partitions(self) -> list:
+        cutoff = datetime.date.today() - datetime.timedelta(days=self.detail_days)
+        dropped = expired_partitions(self._partitions, cutoff)
+        with self.conn, self.conn.cursor() as cur:
+            for name in dropped:
+                cur.execute(f"DROP TABLE IF EXISTS {name}")
+                self._partitions.discard(name)
+        return dropped
+
+    def vacuum(self):
+        # VACUUM cannot run inside a transaction block
+        self.conn.autocommit = True
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute('VACUUM (ANALYZE) "LiteLLM_SpendLogs"')
+                cur.execute("ANALYZE obs_spend_daily")
+        finally:
+            self.conn.autocommit = False
+
+    def run(self, max_batches: int = None) -> dict:
+        """
+        Run one full maintenance pass.
+
+        Args:
+            max_batches: Optional cap on batches moved in this pass
+
+        Returns:
+            dict: Rows moved, batches, partitions dropped and elapsed seconds
+        """
+        start = time.time()
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=self.hot_days)
+        moved = batches = 0
+        while max_batches is None or batches < max_batches:
+            count = self.move_batch(cutoff)
+            if not count:
+                break
+            moved += count
+            batches += 1
+            log.info("Moved batch %d: %d rows", batches, count)
+
+        dropped = self.drop_expired_partitions()
+        if moved:
+            self.vacuum()
+        return {
+            "moved": moved,
+            "batches": batches,
+            "dropped_partitions": dropped,
+            "seconds": round(time.time() - start, 1),
+        }
+
+
+def main(argv=None):
+    from observability.logs import configure_from_env
+
+    parser = argparse.ArgumentParser(description="Compact LiteLLM spend logs")
+    parser.add_argument("--database-url", default=LITELLM_DATABASE_URL)
+    parser.add_argument("--cold-root", default=COLD_ROOT)
+    parser.add_argument("--hot-days", type=int, default=DEFAULT_HOT_DAYS)
+    parser.add_argument("--detail-days", type=int, default=DEFAULT_DETAIL_DAYS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--interval", type=int, default=0,
+                        help="Repeat every N seconds instead of running once")
+    args = parser.parse_args(argv)
+    if configure_from_env("spend-maintenance", logger="observability") is None:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    compactor = SpendLogCompactor(
+        args.database_url,
+        cold_root=args.cold_root,
+        hot_days=args.hot_days,
+        detail_days=args.detail_days,
+        batch_size=args.batch_size
+    )
+    while True:
+        try:
+            result = compactor.run(max_batches=args.max_batches)
+            log.info("✓ Spend log maintenance: %s", result)
+        except Exception as e:
+            log.error("Error during spend log maintenance: %s", e)
+            if not args.interval:
+                raise
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+"""
+End-to-end tracing-overhead regression gate.
+
+``requirements.txt`` pins only lower bounds, so a LiteLLM or MLflow
+upgrade can make tracing slower without anyone noticing. This harness
+runs a fixed workload against a local mock OpenAI-compatible server
+(MockOpenAIServer, no provider or proxy needed) in four configurations:
+
+- ``litellm`` / ``litellm+mlflow``: ``litellm.completion`` without and
+  with LiteLLM's ``mlflow`` callback
+- ``openai`` / ``openai+autolog``: the OpenAI client without and with
+  ``mlflow.openai.autolog()``
+
+Each configuration runs in a fresh interpreter (autolog patches cannot be
+fully undone, and memory is measured per process) with its own temporary
+SQLite tracking store. From each pair it derives:
+
+- ``added_ms``: mean per-request latency added by tracing
+- ``memory_per_trace_kb``: extra memory still allocated per request
+  after the run (tracemalloc, after gc), i.e. what traces keep alive
+- ``export_throughput``: traces per second until every trace is in the
+  tracking store
+
+Results are compared with a JSON baseline. A metric regresses if it is
+worse than the baseline by more than its relative threshold plus a small
+absolute allowance for noise (THRESHOLDS). The report lists every metric
+with the package versions of both runs, and the gate exits with status 1
+on a regression.
+
+Usage:
+    python -m observability.overhead run --update-baseline    # record a baseline
+    python -m observability.overhead run                      # gate against it
+"""
+
+import argparse
+import gc
+import http.server
+import importlib.metadata
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from observability.settings import REPO_DIR
+
+
+BASELINE_PATH = os.environ.get("OBS_OVERHEAD_BASELINE",
+                               os.path.join(REPO_DIR, "tests", "baselines", "tracing_overhead.json"))
+EXPERIMENT_NAME = "tracing-overhead"
+MOCK_MODEL = "mock-model"
+
+# name -> (client, traced)
+SCENARIOS = {
+    "litellm": ("litellm", False),
+    "litellm+mlflow": ("litellm", True),
+    "openai": ("openai", False),
+    "openai+autolog": ("openai", True),
+}
+# pair name -> (untraced scenario, traced scenario)
+PAIRS = {
+    "litellm": ("litellm", "litellm+mlflow"),
+    "openai": ("openai", "openai+autolog"),
+}
+# metric -> (relative threshold, absolute allowance, "max" if lower is better else "min")
+THRESHOLDS = {
+    "added_ms": (0.25, 0.5, "max"),
+    "memory_per_trace_kb": (0.25, 4.0, "max"),
+    "export_throughput": (0.20, 0.0, "min"),
+}
+VERSIONED_PACKAGES = ("litellm", "mlflow", "openai", "httpx")
+
+_COMPLETION = {
+    "id": "chatcmpl-mock",
+    "object": "chat.completion",
+    "created": 0,
+    "model": MOCK_MODEL,
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "MLflow is an open source platform for the ML lifecycle."},
+        "finish_reason": "stop",
+    }],
+    "usage": {"prompt_tokens": 24, "completion_tokens": 12, "total_tokens": 36},
+}
+
+
+class _MockHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, keep-alive
+    # requests wait ~40 ms for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.server.requests += 1
+        body = self.server.body
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockOpenAIServer:
+    """
+    Minimal OpenAI-compatible chat completions server on localhost.
+
+    Answers every POST with the same completion, after ``latency_ms``.
+
+    Usage:
+        with MockOpenAIServer() as server:
+            OpenAI(base_url=server.base_url, api_key="sk-mock")
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _MockHandler)
+        self._server.daemon_threads = True
+        self._server.latency = latency_ms / 1000.0
+        self._server.requests = 0
+        self._server.body = json.dumps(_COMPLETION).encode("utf-8")
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _messages(i: int) -> list:
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": f"Question {i}: what is MLflow tracing?"},
+    ]
+
+
+def _client(name: str, base_url: str, tracking_uri: str):
+    client, traced = SCENARIOS[name]
+    if traced:
+        import mlflow
+
+        mlflow.set_tracking_uri(tracking_uri)
+        mlflow.set_experiment(EXPERIMENT_NAME)
+
+    if client == "litellm":
+        import litellm
+
+        if traced:
+            litellm.callbacks = ["mlflow"]
+
+        def call(i):
+            litellm.completion(model=f"openai/{MOCK_MODEL}", api_base=base_url, api_key="sk-mock",
+                               messages=_messages(i))
+    else:
+        from openai import OpenAI
+
+        if traced:
+            import mlflow.openai
+
+            mlflow.openai.autolog()
+        openai_client = OpenAI(base_url=base_url, api_key="sk-mock")
+
+        def call(i):
+            openai_client.chat.completions.create(model=MOCK_MODEL, messages=_messages(i))
+    return call, traced
+
+
+def _exported_traces() -> int:
+    import mlflow
+
+    experiment = mlflow.get_experiment_by_name(EXPERIMENT_NAME)
+    client = mlflow.MlflowClient()
+    count, token = 0, None
+    while True:
+        page = client.search_traces(experiment_ids=[experiment.experiment_id], max_results=500, page_token=token)
+        count += len(page)
+        token = page.token
+        if not token:
+            return count
+
+
+def _wait_for_export(expected: int, timeout: float) -> int:
+    import mlflow
+
+    flush = getattr(mlflow, "flush_trace_async_logging", None)
+    if flush is not None:
+        flush()
+    deadline = time.monotonic() + timeout
+    exported = _exported_traces()
+    while exported < expected and time.monotonic() < deadline:
+        time.sleep(0.05)
+        exported = _exported_traces()
+    return exported
+
+
+def run_scenario(name: str, base_url: str, requests: int = 300, warmup: int = 30,
+                 memory_requests: int = 100, tracking_uri: str = None, export_timeout: float = 60.0) -> dict:
+    """
+    Run one configuration in this process.
+
+    Returns:
+        dict: Latency (mean/p50/p99 ms), retained bytes per request and,
+            for traced scenarios, exported traces and export throughput
+    """
+    call, traced = _client(name, base_url, tracking_uri)
+    for i in range(warmup):
+        call(i)
+    if traced:
+        _wait_for_export(warmup, export_timeout)
+
+    latencies = []
+    began = time.perf_counter()
+    for i in range(requests):
+        started = time.perf_counter()
+        call(i)
+        latencies.append((time.perf_counter() - started) * 1000)
+    result = {
+        "scenario": name,
+        "requests": requests,
+        "mean_ms": round(statistics.fmean(latencies), 4),
+        "p50_ms": round(statistics.median(latencies), 4),
+        "p99_ms": round(sorted(latencies)[int(0.99 * (len(latencies) - 1))], 4),
+    }
+    if traced:
+        exported = _wait_for_export(warmup + requests, export_timeout) - warmup
+        result["exported"] = exported
+        result["export_throughput"] = round(exported / (time.perf_counter() - began), 2)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(memory_requests):
+        call(requests + i)
+    if traced:
+        _wait_for_export(warmup + requests + memory_requests, export_timeout)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    result["bytes_per_request"] = round(max(0, retained) / memory_requests, 1)
+    return result
+
+
+def versions() -> dict:
+    found = {"python": platform.python_version()}
+    for package in VERSIONED_PACKAGES:
+        try:
+            found[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            found[package] = None
+    return found
+
+
+def _spawn(name: str, base_url: str, workload: dict, python: str) -> dict:
+    with tempfile.TemporaryDirectory(prefix="obs-overhead-") as tmp:
+        command = [python, "-m", "observability.overhead", "scenario", name, "--base-url", base_url,
+                   "--tracking-uri", f"sqlite:///{tmp}/mlflow.db"]
+        for key, value in workload.items():
+            command += [f"--{key.replace('_', '-')}", str(value)]
+        env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+        result = subprocess.run(command, capture_output=True, text=True, cwd=tmp, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"Scenario {name} failed: {result.stderr.strip().splitlines()[-1:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(requests: int = 300, warmup: int = 30, memory_requests: int = 100, repeats: int = 3,
+            scenarios=tuple(SCENARIOS), python: str = sys.executable, latency_ms: float = 0.0) -> dict:
+    """
+    Run the scenarios against a mock server and summarize each pair.
+
+    Each scenario runs ``repeats`` times; the run with the lowest mean
+    latency is kept, which filters out runs disturbed by other load.
+
+    Returns:
+        dict: versions, workload, raw scenario results and per-pair summary
+    """
+    workload = {"requests": requests, "warmup": warmup, "memory_requests": memory_requests}
+    results = {}
+    with MockOpenAIServer(latency_ms) as server:
+        for name in scenarios:
+            runs = [_spawn(name, server.base_url, workload, python) for _ in range(repeats)]
+            results[name] = min(runs, key=lambda run: run["mean_ms"])
+    return {
+        "versions": versions(),
+        "workload": dict(workload, latency_ms=latency_ms),
+        "scenarios": results,
+        "summary": summarize(results),
+    }
+
+
+def summarize(results: dict) -> dict:
+    """
+    Tracing cost of each pair whose two scenarios were both run.
+    """
+    summary = {}
+    for pair, (plain, traced) in PAIRS.items():
+        if plain not in results or traced not in results:
+            continue
+        base, run = results[plain], results[traced]
+        summary[pair] = {
+            "added_ms": round(run["mean_ms"] - base["mean_ms"], 4),
+            "memory_per_trace_kb": round((run["bytes_per_request"] - base["bytes_per_request"]) / 1024, 3),
+            "export_throughput": run.get("export_throughput"),
+        }
+        if run.get("exported", run["requests"]) < run["requests"]:
+            summary[pair]["lost_traces"] = run["requests"] - run["exported"]
+    return summary
+
+
+def compare(current: dict, baseline: dict, thresholds: dict = THRESHOLDS) -> list:
+    """
+    Compare two summaries metric by metric.
+
+    Returns:
+        list: dicts with pair, metric, baseline, current, limit and ok
+    """
+    rows = []
+    for pair, metrics in current.items():
+        if "lost_traces" in metrics:
+            rows.append({"pair": pair, "metric": "lost_traces", "baseline": 0,
+                         "current": metrics["lost_traces"], "limit": 0, "ok": False})
+        for metric, (relative, allowance, direction) in thresholds.items():
+            value = metrics.get(metric)
+            reference = (baseline.get(pair) or {}).get(metric)
+            if value is None or reference is None:
+                continue
+            if direction == "max":
+                limit = reference + abs(reference) * relative + allowance
+                ok = value <= limit
+            else:
+                limit = reference * (1 - relative) - allowance
+                ok = value >= limit
+            rows.append({"pair": pair, "metric": metric, "baseline": reference, "current": value,
+                         "limit": round(limit, 4), "ok": ok})
+    return rows
+
+
+def format_report(rows: list, current_versions: dict, baseline_versions: dict) -> str:
+    lines = []
+    changed = {package: (baseline_versions.get(package), version)
+               for package, version in current_versions.items() if baseline_versions.get(package) != version}
+    if changed:
+        lines.append("Versions changed since the baseline: " + ", ".join(
+            f"{package} {old} -> {new}" for package, (old, new) in sorted(changed.items())))
+    lines.append(f"{'':2}{'pair':<10}{'metric':<22}{'baseline':>12}{'current':>12}{'limit':>12}")
+    for row in rows:
+        lines.append(f"{'✓' if row['ok'] else '✗':<2}{row['pair']:<10}{row['metric']:<22}"
+                     f"{row['baseline']:>12}{row['current']:>12}{row['limit']:>12}")
+    failed = [f"{row['pair']} {row['metric']}" for row in rows if not row["ok"]]
+    lines.append(f"REGRESSION: {', '.join(failed)}" if failed else "No tracing-overhead regression")
+    return "\n".join(lines)
+
+
+def load_baseline(path: str = BASELINE_PATH) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(result: dict, path: str = BASELINE_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def gate(result: dict, baseline: dict):
+    """
+    Check a measurement against a baseline.
+
+    Returns:
+        tuple: (ok, report text)
+    """
+    if baseline["workload"] != result["workload"]:
+        return False, (f"Workload {result['workload']} differs from the baseline's {baseline['workload']}; "
+                       "rerun with the baseline's workload or record a new baseline")
+    rows = compare(result["summary"], baseline["summary"])
+    return all(row["ok"] for row in rows), format_report(rows, result["versions"], baseline["versions"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tracing-overhead regression gate")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run = subparsers.add_parser("run", help="Measure and compare against the baseline")
+    run.add_argument("--requests", type=int, default=300)
+    run.add_argument("--warmup", type=int, default=30)
+    run.add_argument("--memory-requests", type=int, default=100)
+    run.add_argument("--repeats", type=int, default=3)
+    run.add_argument("--latency-ms", type=float, default=0.0, help="Simulated backend latency")
+    run.add_argument("--baseline", default=BASELINE_PATH)
+    run.add_argument("--update-baseline", action="store_true", help="Record this run as the baseline")
+    run.add_argument("--output", help="Also write this run's results as JSON")
+    scenario = subparsers.add_parser("scenario", help="Run one scenario in this process (used by run)")
+    scenario.add_argument("name", choices=sorted(SCENARIOS))
+    scenario.add_argument("--base-url", required=True)
+    scenario.add_argument("--tracking-uri", required=True)
+    scenario.add_argument("--requests", type=int, default=300)
+    scenario.add_argument("--warmup", type=int, default=30)
+    scenario.add_argument("--memory-requests", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.command == "scenario":
+        print(json.dumps(run_scenario(args.name, args.base_url, args.requests, args.warmup,
+                                      args.memory_requests, args.tracking_uri)))
+        return 0
+
+    result = measure(args.requests, args.warmup, args.memory_requests, args.repeats, latency_ms=args.latency_ms)
+    if args.output:
+        save_baseline(result, args.output)
+    for pair, metrics in result["summary"].items():
+        print(f"  {pair}: {metrics}")
+    if args.update_baseline:
+        save_baseline(result, args.baseline)
+        print(f"✓ Baseline written to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"✗ No baseline at {args.baseline}; record one with --update-baseline")
+        return 2
+    ok, report = gate(result, baseline)
+    print(report)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
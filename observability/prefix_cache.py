@@ -0,0 +1,393 @@
+"""
+Prompt-prefix reuse through provider context caching.
+
+Multi-turn flows resend the same system prompt and earlier turns on every
+call. PrefixCacheManager detects that stable prefix (everything before the
+last user message), keeps a handle per prefix with a TTL and LRU eviction,
+and asks the backend to reuse the provider-side cache for it:
+
+- GeminiContextCacheBackend creates a Gemini cachedContent for a prefix
+  once it repeats (through the LiteLLM proxy's Gemini pass-through), sends
+  later requests against it with ``cached_content`` and deletes it when the
+  handle is evicted.
+- LocalContextCacheBackend simulates the provider for tests: a prefix seen
+  before within its TTL counts as cached.
+
+Cached-token counts and the observed latency saving are recorded on the
+active MLflow trace.
+
+Example:
+    manager = PrefixCacheManager(GeminiContextCacheBackend())
+    response = create_with_prefix_cache(client, manager, model=MODEL_NAME, messages=messages)
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from observability.conversation import message_tokens
+
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_ENTRIES = 256
+# Gemini rejects explicit caches below its minimum prefix size
+GEMINI_MIN_CACHE_TOKENS = 1024
+# Extend a cachedContent's TTL once less than this fraction of it remains
+GEMINI_RENEW_FRACTION = 0.5
+
+
+def split_stable_prefix(messages):
+    """
+    Split messages into the reusable prefix and the new suffix.
+
+    The prefix is every message before the last user message: system
+    prompts plus earlier turns, which are identical across calls of the
+    same conversation.
+
+    Args:
+        messages: Chat messages
+
+    Returns:
+        tuple: (prefix messages, suffix messages)
+    """
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index].get("role") == "user":
+            return messages[:index], messages[index:]
+    return [], list(messages)
+
+
+def prefix_key(model: str, prefix) -> str:
+    """
+    Content hash identifying a prefix for a given model.
+
+    Args:
+        model: Model name (caches are per model)
+        prefix: Prefix messages
+
+    Returns:
+        str: Hex digest
+    """
+    canonical = json.dumps([model, prefix], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CacheHandle:
+    """
+    A provider cache entry for one prefix.
+
+    ``cache_name`` and ``cache_expires_at`` describe the provider-side cache
+    once a backend has created one (Gemini), on the manager's clock. ``lock``
+    serializes the backend's calls for this prefix only.
+    """
+
+    def __init__(self, key: str, tokens: int, expires_at: float, ttl_seconds: float):
+        self.key = key
+        self.tokens = tokens
+        self.expires_at = expires_at
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.cache_name = None
+        self.cache_expires_at = 0.0
+        self.released = False
+        self.lock = threading.Lock()
+
+
+def _text(content) -> str:
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content or [] if isinstance(part, dict))
+
+
+def gemini_cache_body(model: str, key: str, prefix, ttl_seconds: float) -> dict:
+    """
+    Build a Gemini cachedContents request for prefix messages.
+
+    Args:
+        model: Proxy model name (``gemini/`` provider prefixes are dropped)
+        key: Prefix key, used as the cache's display name
+        prefix: Prefix messages (text content)
+        ttl_seconds: Cache lifetime
+
+    Returns:
+        dict: Request body for ``POST cachedContents``
+    """
+    system, contents = [], []
+    for message in prefix:
+        part = {"text": _text(message.get("content"))}
+        if message.get("role") == "system":
+            system.append(part)
+        else:
+            role = "model" if message.get("role") == "assistant" else "user"
+            contents.append({"role": role, "parts": [part]})
+    body = {
+        "model": f"models/{model.split('/')[-1]}",
+        "displayName": key,
+        "contents": contents,
+        "ttl": f"{int(ttl_seconds)}s",
+    }
+    if system:
+        body["systemInstruction"] = {"parts": system}
+    return body
+
+
+class GeminiContextCacheBackend:
+    """
+    Uses Gemini explicit context caching through the LiteLLM proxy.
+
+    A prefix is sent inline the first time it is seen. When it repeats
+    within the handle's TTL, a cachedContent holding it is created through
+    the proxy's Gemini pass-through (``/gemini/v1beta/cachedContents``) with
+    the same TTL, and the request carries only the suffix plus
+    ``cached_content``. The cache's TTL is extended while the handle keeps
+    being hit, and the cache is deleted when the handle is evicted. Cached
+    tokens are read from the response usage.
+
+    Args:
+        base_url: LiteLLM proxy URL
+        api_key: Key accepted by the proxy
+        http: httpx.Client to use (created on first use)
+    """
+
+    min_tokens = GEMINI_MIN_CACHE_TOKENS
+
+    def __init__(self, base_url: str = None, api_key: str = None, http=None):
+        self.base_url = (base_url or os.environ.get("LITELLM_PROXY_URL", "http://localhost:4000")).rstrip("/")
+        self.api_key = api_key or os.environ.get("LITELLM_MASTER_KEY", "sk-1234")
+        self.http = http
+
+    def _call(self, method: str, path: str, params=None, **kwargs):
+        if self.http is None:
+            import httpx
+
+            self.http = httpx.Client(timeout=30.0)
+        response = self.http.request(method, f"{self.base_url}/gemini/v1beta/{path}",
+                                     params=dict(params or {}, key=self.api_key), **kwargs)
+        response.raise_for_status()
+        return response.json() if response.content else {}
+
+    def _ensure_cache(self, model: str, prefix, handle: CacheHandle) -> bool:
+        # prepare() has just moved expires_at to now + ttl
+        now = handle.expires_at - handle.ttl_seconds
+        # Only requests for the same prefix wait on each other's round trip
+        with handle.lock:
+            remaining = handle.cache_expires_at - now
+            if handle.cache_name and remaining > handle.ttl_seconds * GEMINI_RENEW_FRACTION:
+                return True
+            if handle.released:
+                return False
+            ttl = f"{int(handle.ttl_seconds)}s"
+            try:
+                if handle.cache_name:
+                    try:
+                        self._call("PATCH", handle.cache_name, params={"updateMask": "ttl"}, json={"ttl": ttl})
+                        handle.cache_expires_at = handle.expires_at
+                        return True
+                    except Exception as e:
+                        log.warning("Error renewing Gemini cache %s, recreating: %s", handle.cache_name, e)
+                created = self._call("POST", "cachedContents",
+                                     json=gemini_cache_body(model, handle.key, prefix, handle.ttl_seconds))
+            except Exception as e:
+                log.warning("Error creating Gemini cache, sending the prefix inline: %s", e)
+                handle.cache_name = None
+                return False
+            handle.cache_name = created["name"]
+            handle.cache_expires_at = handle.expires_at
+            return True
+
+    def build_request(self, model: str, prefix, suffix, handle: CacheHandle, hit: bool) -> dict:
+        if hit and self._ensure_cache(model, prefix, handle):
+            return {"messages": list(suffix), "extra_body": {"cached_content": handle.cache_name}}
+        return {"messages": list(prefix) + list(suffix)}
+
+    def release(self, handle: CacheHandle):
+        with handle.lock:
+            name, handle.cache_name = handle.cache_name, None
+            handle.released = True
+        if name:
+            try:
+                self._call("DELETE", name)
+            except Exception as e:
+                log.warning("Error deleting Gemini cache %s: %s", name, e)
+
+    def cached_tokens(self, response, handle, hit: bool) -> int:
+        usage = getattr(response, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        return getattr(details, "cached_tokens", None) or 0
+
+
+class LocalContextCacheBackend:
+    """
+    In-process stand-in for provider context caching.
+
+    Messages are sent unchanged; a prefix whose handle is still live counts
+    as fully cached, which is what the provider would report.
+    """
+
+    def __init__(self, min_tokens: int = 0):
+        self.min_tokens = min_tokens
+
+    def build_request(self, model: str, prefix, suffix, handle: CacheHandle, hit: bool) -> dict:
+        return {"messages": list(prefix) + list(suffix)}
+
+    def release(self, handle: CacheHandle):
+        pass
+
+    def cached_tokens(self, response, handle, hit: bool) -> int:
+        return handle.tokens if hit else 0
+
+
+class PrefixCacheManager:
+    """
+    Tracks cache handles for stable prompt prefixes.
+
+    Args:
+        backend: GeminiContextCacheBackend or LocalContextCacheBackend
+        ttl_seconds: Lifetime of a cache handle after its last use
+        max_entries: Handles kept before least recently used are evicted
+    """
+
+    def __init__(self, backend, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.cached_tokens = 0
+        self._handles = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._latency = {True: [0, 0.0], False: [0, 0.0]}
+
+    def __len__(self):
+        return len(self._handles)
+
+    def prepare(self, model: str, messages):
+        """
+        Prepare a request, reusing the cache handle for its prefix.
+
+        Args:
+            model: Model name
+            messages: Full chat messages for the request
+
+        Returns:
+            dict: {"messages", "handle", "hit"} plus backend request
+                parameters such as "extra_body"; handle is None when the
+                prefix is too short to cache
+        """
+        prefix, suffix = split_stable_prefix(messages)
+        tokens = sum(message_tokens(m) for m in prefix)
+        if not prefix or tokens < self.backend.min_tokens:
+            return {"messages": list(messages), "handle": None, "hit": False}
+
+        key = prefix_key(model, prefix)
+        now = self.clock()
+        evicted = []
+        with self._lock:
+            handle = self._handles.get(key)
+            hit = handle is not None and handle.expires_at > now
+            if hit:
+                self._handles.move_to_end(key)
+                handle.hits += 1
+                self.hits += 1
+            else:
+                evicted.append(handle)
+                handle = CacheHandle(key, tokens, now + self.ttl_seconds, self.ttl_seconds)
+                self._handles[key] = handle
+                self._handles.move_to_end(key)
+                self.misses += 1
+                evicted.extend(self._evict(now))
+            handle.expires_at = now + self.ttl_seconds
+
+        for old in evicted:
+            if old is not None:
+                self.backend.release(old)
+        request = self.backend.build_request(model, prefix, suffix, handle, hit)
+        return dict(request, handle=handle, hit=hit)
+
+    def _evict(self, now: float):
+        evicted = [handle for handle in self._handles.values() if handle.expires_at <= now]
+        for handle in evicted:
+            del self._handles[handle.key]
+        while len(self._handles) > self.max_entries:
+            evicted.append(self._handles.popitem(last=False)[1])
+            self.evictions += 1
+        return evicted
+
+    def record(self, prepared: dict, response, latency_s: float) -> dict:
+        """
+        Record cache usage for a completed request.
+
+        Args:
+            prepared: Value returned by prepare()
+            response: Chat completion response
+            latency_s: Request latency in seconds
+
+        Returns:
+            dict: Cache metrics for this request
+        """
+        handle, hit = prepared["handle"], prepared["hit"]
+        cached = self.backend.cached_tokens(response, handle, hit) if handle else 0
+        with self._lock:
+            self.cached_tokens += cached
+            if handle is not None:
+                stats = self._latency[bool(cached)]
+                stats[0] += 1
+                stats[1] += latency_s
+
+        return {
+            "prefix_cache.hit": bool(cached),
+            "prefix_cache.cached_tokens": cached,
+            "prefix_cache.prefix_tokens": handle.tokens if handle else 0,
+            "prefix_cache.latency_saving_ms": round(self.latency_saving_s() * 1000, 1),
+        }
+
+    def latency_saving_s(self) -> float:
+        """
+        Mean latency of uncached minus cached requests with a cacheable prefix.
+
+        Returns:
+            float: Seconds saved per cached request (0 until both are observed)
+        """
+        (hit_n, hit_total), (miss_n, miss_total) = self._latency[True], self._latency[False]
+        if not hit_n or not miss_n:
+            return 0.0
+        return miss_total / miss_n - hit_total / hit_n
+
+
+def create_with_prefix_cache(client, manager: PrefixCacheManager, model: str, messages, **kwargs):
+    """
+    Issue a chat completion with prefix caching and record it on the trace.
+
+    Args:
+        client: OpenAI-compatible client pointing at the LiteLLM proxy
+        manager: PrefixCacheManager
+        model: Model name
+        messages: Full chat messages
+        **kwargs: Other chat completion parameters
+
+    Returns:
+        Chat completion response
+    """
+    prepared = manager.prepare(model, messages)
+    if prepared.get("extra_body"):
+        kwargs["extra_body"] = dict(kwargs.get("extra_body") or {}, **prepared["extra_body"])
+    start = time.perf_counter()
+    response = client.chat.completions.create(model=model, messages=prepared["messages"], **kwargs)
+    metrics = manager.record(prepared, response, time.perf_counter() - start)
+
+    try:
+        import mlflow
+
+        mlflow.update_current_trace(metadata={key: str(value) for key, value in metrics.items()})
+    except Exception as e:
+        log.warning("Error recording prefix cache metrics: %s", e)
+    return response
@@ -0,0 +1,441 @@
+"""
+Event-loop and callback profiling for the LiteLLM proxy process.
+
+When the proxy slows down this tells apart a slow provider, a slow
+logging callback and a blocked event loop:
+
+- LoopLagSampler measures how late the event loop wakes a sleeping task
+  and samples thread-pool queue depth (the loop's default executor plus
+  any registered pool).
+- instrument_callbacks() wraps the logging methods of LiteLLM's
+  CustomLogger callbacks (e.g. the mlflow logger) with timers, so each
+  callback gets an execution-time histogram.
+- StackSampler is an on-demand sampling CPU profiler over all threads;
+  output is in collapsed-stack format for flamegraph.pl/speedscope.
+
+Everything is exposed in Prometheus text format. ``install_routes``
+adds ``GET /debug/metrics`` and ``GET /debug/profile?seconds=N`` to the
+proxy app (master key required). With ``OBS_PROFILER_TRACES=1`` a
+snapshot is also logged to MLflow as a trace every minute.
+"""
+
+import asyncio
+import bisect
+import collections
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+
+from observability.settings import MLFLOW_TRACKING_URI, TRACE_EXPERIMENT_NAME
+
+
+log = logging.getLogger(__name__)
+
+# Seconds; Prometheus-style cumulative buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CALLBACK_METHODS = (
+    "log_success_event",
+    "log_failure_event",
+    "async_log_success_event",
+    "async_log_failure_event",
+)
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram.
+
+    Args:
+        buckets: Upper bounds in seconds, ascending
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, q: float) -> float:
+        """
+        Estimate a percentile as the upper bound of the bucket reaching it.
+
+        Args:
+            q: Percentile (0-100)
+
+        Returns:
+            float: Seconds, or 0.0 if empty
+        """
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = q / 100.0 * self.count
+            seen = 0
+            for bound, count in zip(self.buckets + (self.max,), self.counts):
+                seen += count
+                if seen >= target:
+                    return min(bound, self.max)
+            return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum_s": round(self.sum, 6),
+            "max_s": round(self.max, 6),
+            "p50_s": self.percentile(50),
+            "p99_s": self.percentile(99),
+        }
+
+    def prometheus(self, name: str, labels: str = "") -> list:
+        sep = "," if labels else ""
+        lines = []
+        with self._lock:
+            cumulative = 0
+            for bound, count in zip(self.buckets, self.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+            lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+            lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class ProfilerMetrics:
+    """
+    Process-wide profiling metrics.
+    """
+
+    def __init__(self):
+        self.loop_lag = Histogram()
+        self.callbacks = collections.defaultdict(Histogram)
+        self.callback_errors = collections.Counter()
+        self.callback_timeouts = collections.Counter()
+        self.pool_queue_depth = {}
+        self.pool_max_workers = {}
+
+    def prometheus(self) -> str:
+        lines = ["# TYPE obs_event_loop_lag_seconds histogram"]
+        lines += self.loop_lag.prometheus("obs_event_loop_lag_seconds")
+        lines.append("# TYPE obs_callback_seconds histogram")
+        for name, histogram in sorted(self.callbacks.items()):
+            lines += histogram.prometheus("obs_callback_seconds", f'callback="{name}"')
+        lines.append("# TYPE obs_callback_errors_total counter")
+        for name, count in sorted(self.callback_errors.items()):
+            lines.append(f'obs_callback_errors_total{{callback="{name}"}} {count}')
+        lines.append("# TYPE obs_callback_timeouts_total counter")
+        for name, count in sorted(self.callback_timeouts.items()):
+            lines.append(f'obs_callback_timeouts_total{{callback="{name}"}} {count}')
+        lines.append("# TYPE obs_thread_pool_queue_depth gauge")
+        for name, depth in sorted(self.pool_queue_depth.items()):
+            lines.append(f'obs_thread_pool_queue_depth{{pool="{name}"}} {depth}')
+        lines.append("# TYPE obs_thread_pool_max_workers gauge")
+        for name, workers in sorted(self.pool_max_workers.items()):
+            lines.append(f'obs_thread_pool_max_workers{{pool="{name}"}} {workers}')
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {
+            "loop_lag": self.loop_lag.snapshot(),
+            "callbacks": {name: h.snapshot() for name, h in self.callbacks.items()},
+            "callback_errors": dict(self.callback_errors),
+            "callback_timeouts": dict(self.callback_timeouts),
+            "pool_queue_depth": dict(self.pool_queue_depth),
+        }
+
+
+metrics = ProfilerMetrics()
+
+
+class LoopLagSampler:
+    """
+    Measures event-loop lag and thread-pool queue depth.
+
+    Args:
+        metrics: ProfilerMetrics to record into
+        interval: Seconds between samples
+        executors: Extra name -> ThreadPoolExecutor to watch
+    """
+
+    def __init__(self, metrics: ProfilerMetrics = metrics, interval: float = 0.1, executors: dict = None):
+        self.metrics = metrics
+        self.interval = interval
+        self.executors = dict(executors or {})
+        self._task = None
+
+    def watch_executor(self, name: str, executor):
+        self.executors[name] = executor
+
+    def sample_pools(self, loop=None):
+        executors = dict(self.executors)
+        default = getattr(loop, "_default_executor", None) if loop is not None else None
+        if default is not None:
+            executors.setdefault("default", default)
+        for name, executor in executors.items():
+            queue = getattr(executor, "_work_queue", None)
+            if queue is not None:
+                self.metrics.pool_queue_depth[name] = queue.qsize()
+                self.metrics.pool_max_workers[name] = getattr(executor, "_max_workers", 0)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            began = loop.time()
+            await asyncio.sleep(self.interval)
+            self.metrics.loop_lag.observe(max(0.0, loop.time() - began - self.interval))
+            self.sample_pools(loop)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def _timed(method, name: str, metrics: ProfilerMetrics):
+    if asyncio.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            began = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                metrics.callback_errors[name] += 1
+                raise
+            finally:
+                metrics.callbacks[name].observe(time.perf_counter() - began)
+    else:
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            began = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            except Exception:
+                metrics.callback_errors[name] += 1
+                raise
+            finally:
+                metrics.callbacks[name].observe(time.perf_counter() - began)
+    wrapper._obs_profiled = True
+    return wrapper
+
+
+def callback_name(callback) -> str:
+    name = type(callback).__name__
+    if name.endswith("Logger") and len(name) > len("Logger"):
+        name = name[:-len("Logger")]
+    return name.lower()
+
+
+def instrument_callback(callback, metrics: ProfilerMetrics = metrics, name: str = None) -> bool:
+    """
+    Time a callback object's logging methods.
+
+    Args:
+        callback: CustomLogger-like object
+        metrics: ProfilerMetrics to record into
+        name: Metric label (defaults to the class name without "Logger")
+
+    Returns:
+        bool: True if any method was wrapped
+    """
+    name = name or callback_name(callback)
+    wrapped = False
+    for method_name in CALLBACK_METHODS:
+        method = getattr(callback, method_name, None)
+        if method is None or getattr(method, "_obs_profiled", False):
+            continue
+        setattr(callback, method_name, _timed(method, name, metrics))
+        wrapped = True
+    return wrapped
+
+
+def instrument_callbacks(metrics: ProfilerMetrics = metrics, exclude=()) -> list:
+    """
+    Time every CustomLogger registered with LiteLLM.
+
+    String callbacks that LiteLLM handles inline (e.g. ``lite_debugger``)
+    have no object to wrap; they show up as time in the request itself.
+
+    Args:
+        metrics: ProfilerMetrics to record into
+        exclude: Callback objects to leave alone
+
+    Returns:
+        list: Names of the instrumented callbacks
+    """
+    import litellm
+
+    seen = set()
+    names = []
+    for attr in ("callbacks", "success_callback", "failure_callback",
+                 "_async_success_callback", "_async_failure_callback"):
+        for callback in getattr(litellm, attr, None) or []:
+            if isinstance(callback, str) or id(callback) in seen or callback in exclude:
+                continue
+            seen.add(id(callback))
+            if instrument_callback(callback, metrics):
+                names.append(callback_name(callback))
+    return names
+
+
+class StackSampler:
+    """
+    Sampling CPU profiler over all Python threads.
+
+    Args:
+        hz: Samples per second
+    """
+
+    def __init__(self, hz: int = 100):
+        self.hz = hz
+        self.samples = collections.Counter()
+        self.count = 0
+
+    def sample(self, skip_thread: int = None):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == skip_thread:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+        self.count += 1
+
+    def run(self, seconds: float) -> str:
+        """
+        Sample for ``seconds`` from the calling thread.
+
+        Returns:
+            str: Collapsed stacks, one "frame;frame;... count" per line
+        """
+        me = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        period = 1.0 / self.hz
+        while time.perf_counter() < deadline:
+            self.sample(skip_thread=me)
+            time.sleep(period)
+        return self.collapsed()
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+async def profile(seconds: float = 10.0, hz: int = 100) -> str:
+    """
+    Run a StackSampler in a dedicated thread without blocking the loop.
+
+    Returns:
+        str: Collapsed stacks
+    """
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    result = {}
+
+    def target():
+        try:
+            result["stacks"] = StackSampler(hz).run(seconds)
+        finally:
+            loop.call_soon_threadsafe(done.set_result, None)
+
+    # Not the default executor: a saturated pool is one of the things we profile
+    threading.Thread(target=target, name="stack-sampler", daemon=True).start()
+    await done
+    return result["stacks"]
+
+
+def require_master_key(request):
+    """
+    Reject a FastAPI request that does not carry the proxy master key.
+    """
+    from fastapi import HTTPException
+
+    master_key = os.environ.get("LITELLM_MASTER_KEY")
+    if master_key and request.headers.get("authorization") != f"Bearer {master_key}":
+        raise HTTPException(status_code=401, detail="Master key required")
+
+
+def install_routes(app, metrics: ProfilerMetrics = metrics, max_seconds: float = 60.0):
+    """
+    Add /debug/metrics and /debug/profile to a FastAPI app.
+
+    Both require ``Authorization: Bearer <LITELLM_MASTER_KEY>``.
+    """
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    async def debug_metrics(request: Request):
+        require_master_key(request)
+        return PlainTextResponse(metrics.prometheus())
+
+    async def debug_profile(request: Request, seconds: float = 10.0, hz: int = 100):
+        require_master_key(request)
+        return PlainTextResponse(await profile(min(seconds, max_seconds), hz))
+
+    app.add_api_route("/debug/metrics", debug_metrics, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/debug/profile", debug_profile, methods=["GET"], include_in_schema=False)
+
+
+class ProfileTraceEmitter:
+    """
+    Periodically logs a metrics snapshot to MLflow as a trace of the proxy.
+
+    Args:
+        metrics: ProfilerMetrics to snapshot
+        interval: Seconds between traces
+    """
+
+    def __init__(self, metrics: ProfilerMetrics = metrics, interval: float = 60.0,
+                 tracking_uri: str = MLFLOW_TRACKING_URI, experiment_name: str = TRACE_EXPERIMENT_NAME):
+        self.metrics = metrics
+        self.interval = interval
+        self.tracking_uri = tracking_uri
+        self.experiment_name = experiment_name
+        self._stop = threading.Event()
+
+    def emit(self):
+        from mlflow.tracking import MlflowClient
+
+        client = MlflowClient(self.tracking_uri)
+        experiment = client.get_experiment_by_name(self.experiment_name)
+        experiment_id = experiment.experiment_id if experiment else client.create_experiment(self.experiment_name)
+        snapshot = self.metrics.snapshot()
+        root = client.start_trace("proxy.profile", inputs={"interval_s": self.interval},
+                                  tags={"obs.kind": "proxy_profile"}, experiment_id=experiment_id)
+        trace_id = getattr(root, "trace_id", None) or root.request_id
+        for name, stats in snapshot["callbacks"].items():
+            span = client.start_span(f"callback.{name}", trace_id, root.span_id, inputs={}, attributes=stats)
+            client.end_span(trace_id, span.span_id)
+        client.end_trace(trace_id, outputs=snapshot)
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.emit()
+            except Exception as e:
+                log.warning("Error logging profile trace: %s", e)
+
+    def start(self):
+        threading.Thread(target=self.run, name="profile-traces", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
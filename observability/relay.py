@@ -0,0 +1,352 @@
+"""
+Fan-out relay for streaming completions.
+
+A streaming completion normally has exactly one consumer. StreamRelay
+reads one upstream stream and fans it out to any number of subscribers
+(the requesting client, dashboards tailing the stream, ...):
+
+- Each upstream chunk is wrapped once in a RelayChunk and the same object
+  is handed to every subscriber; its SSE encoding is computed at most
+  once and shared.
+- Each subscriber has a bounded buffer. A subscriber whose buffer fills
+  up is a slow consumer and is dropped (its iterator raises
+  SlowConsumerError) so it cannot hold up the others. A ``critical``
+  subscriber, such as the client that made the request, is never dropped;
+  the relay stops reading upstream until it catches up instead.
+- Late subscribers first receive the chunks seen so far (up to
+  ``history`` chunks).
+- Subscriber counts, drops and buffer high-water marks are reported by
+  ``trace_attributes()``. They are also set on the active async span
+  (observability.async_tracing) when the stream ends.
+
+RelayHub keeps the relays of in-flight streams by id. ``install_routes``
+serves them from the proxy at ``/relay`` (active streams) and
+``/relay/{stream_id}`` (server-sent events).
+
+Usage:
+    relay = StreamRelay(await client.chat.completions.create(..., stream=True))
+    primary = relay.subscribe(critical=True)
+    dashboard = relay.subscribe(capacity=64)
+    relay.start()
+    async for chunk in primary:
+        ...chunk.data...
+"""
+
+import asyncio
+import collections
+import json
+import logging
+import time
+
+from observability.async_tracing import current_span
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 256
+DEFAULT_HISTORY = 4096
+DONE_SSE = b"data: [DONE]\n\n"
+
+
+class SlowConsumerError(Exception):
+    """
+    Raised to a subscriber that was dropped for falling behind.
+    """
+
+
+class RelayChunk:
+    """
+    One upstream chunk, shared by all subscribers.
+    """
+
+    __slots__ = ("seq", "data", "_sse")
+
+    def __init__(self, seq: int, data):
+        self.seq = seq
+        self.data = data
+        self._sse = None
+
+    @property
+    def sse(self) -> bytes:
+        """
+        The chunk as a server-sent event, encoded on first use.
+        """
+        if self._sse is None:
+            data = self.data
+            if hasattr(data, "model_dump_json"):
+                body = data.model_dump_json(exclude_none=True)
+            elif isinstance(data, (bytes, str)):
+                body = data
+            else:
+                body = json.dumps(data, default=str)
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            self._sse = b"data: " + body + b"\n\n"
+        return self._sse
+
+
+class Subscriber:
+    """
+    A consumer of a relayed stream; iterate it for RelayChunk objects.
+
+    Created through StreamRelay.subscribe().
+    """
+
+    def __init__(self, relay: "StreamRelay", capacity: int, critical: bool, name: str = None):
+        self.relay = relay
+        self.capacity = capacity
+        self.critical = critical
+        self.name = name
+        self.buffer = collections.deque()
+        self.backlog = collections.deque()
+        self.high_water = 0
+        self.delivered = 0
+        self.dropped = False
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+
+    def _offer(self, chunk: RelayChunk) -> bool:
+        """
+        Buffer a chunk; returns False if the buffer is full.
+        """
+        if len(self.buffer) >= self.capacity:
+            return False
+        self.buffer.append(chunk)
+        if len(self.buffer) > self.high_water:
+            self.high_water = len(self.buffer)
+        if len(self.buffer) >= self.capacity:
+            self._space.clear()
+        self._ready.set()
+        return True
+
+    def _drop(self):
+        self.dropped = True
+        self.buffer.clear()
+        self._ready.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> RelayChunk:
+        while True:
+            if self.dropped:
+                raise SlowConsumerError(f"Subscriber {self.name or id(self)} fell {self.capacity} chunks behind")
+            if self.backlog:
+                self.delivered += 1
+                return self.backlog.popleft()
+            if self.buffer:
+                chunk = self.buffer.popleft()
+                self.delivered += 1
+                self._space.set()
+                return chunk
+            if self.relay.done:
+                self.close()
+                if self.relay.error is not None:
+                    raise self.relay.error
+                raise StopAsyncIteration
+            self._ready.clear()
+            await self._ready.wait()
+
+    async def sse(self):
+        """
+        Yield the stream as server-sent event bytes, ending with [DONE].
+        """
+        try:
+            async for chunk in self:
+                yield chunk.sse
+            yield DONE_SSE
+        finally:
+            self.close()
+
+    def close(self):
+        self.relay._unsubscribe(self)
+        # Release the relay if it is waiting on this subscriber
+        self._space.set()
+
+
+class StreamRelay:
+    """
+    Reads one upstream stream and fans it out to subscribers.
+
+    Args:
+        upstream: Async iterable of chunks (e.g. an AsyncOpenAI stream)
+        stream_id: Identifier used by RelayHub
+        history: Chunks kept for late subscribers (0 disables replay)
+        on_close: Called with the relay once the upstream is exhausted
+    """
+
+    def __init__(self, upstream, stream_id: str = None, history: int = DEFAULT_HISTORY, on_close=None):
+        self.upstream = upstream
+        self.stream_id = stream_id
+        self.history = collections.deque(maxlen=history) if history else None
+        self.on_close = on_close
+        self.subscribers = []
+        self.chunks = 0
+        self.done = False
+        self.error = None
+        self.started_at = time.time()
+        self.peak_subscribers = 0
+        self.dropped_subscribers = 0
+        self.buffer_high_water = 0
+        self._span = current_span()
+        self._task = None
+
+    def subscribe(self, capacity: int = DEFAULT_CAPACITY, critical: bool = False, name: str = None) -> Subscriber:
+        """
+        Add a subscriber; it first receives the retained history, which
+        does not count against its capacity.
+
+        Args:
+            capacity: Chunks buffered before the subscriber is dropped
+                (or, if critical, before the upstream is paused)
+            critical: Never drop this subscriber; apply backpressure instead
+            name: Label used in errors and stats
+
+        Returns:
+            Subscriber
+        """
+        subscriber = Subscriber(self, capacity, critical, name)
+        if self.history:
+            subscriber.backlog.extend(self.history)
+        self.subscribers.append(subscriber)
+        self.peak_subscribers = max(self.peak_subscribers, len(self.subscribers))
+        return subscriber
+
+    def _unsubscribe(self, subscriber: Subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+            self.buffer_high_water = max(self.buffer_high_water, subscriber.high_water)
+
+    def start(self) -> "StreamRelay":
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._pump())
+        return self
+
+    async def _publish(self, chunk: RelayChunk):
+        for subscriber in list(self.subscribers):
+            while not subscriber._offer(chunk):
+                if not subscriber.critical:
+                    subscriber._drop()
+                    self._unsubscribe(subscriber)
+                    self.dropped_subscribers += 1
+                    break
+                # Backpressure: wait for the critical subscriber to catch up
+                await subscriber._space.wait()
+                if subscriber not in self.subscribers:
+                    break
+
+    async def _pump(self):
+        try:
+            async for data in self.upstream:
+                chunk = RelayChunk(self.chunks, data)
+                self.chunks += 1
+                if self.history is not None:
+                    self.history.append(chunk)
+                await self._publish(chunk)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            for subscriber in list(self.subscribers):
+                subscriber._ready.set()
+            self._finish()
+
+    def _finish(self):
+        attributes = self.trace_attributes()
+        if self._span is not None:
+            for key, value in attributes.items():
+                self._span.set_attribute(key, value)
+        if self.on_close is not None:
+            try:
+                self.on_close(self)
+            except Exception as e:
+                log.warning("Error closing stream relay %s: %s", self.stream_id, e)
+
+    async def wait(self):
+        """
+        Wait until the upstream is exhausted.
+        """
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    def trace_attributes(self) -> dict:
+        high_water = max([self.buffer_high_water] + [s.high_water for s in self.subscribers])
+        return {
+            "relay.chunks": self.chunks,
+            "relay.subscribers": self.peak_subscribers,
+            "relay.dropped_subscribers": self.dropped_subscribers,
+            "relay.buffer_high_water": high_water,
+        }
+
+    def stats(self) -> dict:
+        return dict(
+            self.trace_attributes(),
+            stream_id=self.stream_id,
+            active_subscribers=len(self.subscribers),
+            done=self.done,
+            age_s=round(time.time() - self.started_at, 1),
+        )
+
+
+class RelayHub:
+    """
+    Registry of in-flight stream relays.
+
+    Args:
+        linger: Seconds a finished relay stays subscribable (for replay)
+    """
+
+    def __init__(self, linger: float = 30.0):
+        self.linger = linger
+        self.relays = {}
+
+    def open(self, stream_id: str, upstream, on_close=None, **kwargs) -> StreamRelay:
+        """
+        Create a relay for an upstream stream. Call ``start()`` after
+        adding the initial subscribers.
+        """
+        def closed(relay):
+            if on_close is not None:
+                on_close(relay)
+            asyncio.get_running_loop().call_later(self.linger, self.relays.pop, stream_id, None)
+
+        relay = StreamRelay(upstream, stream_id=stream_id, on_close=closed, **kwargs)
+        self.relays[stream_id] = relay
+        return relay
+
+    def get(self, stream_id: str) -> StreamRelay:
+        return self.relays.get(stream_id)
+
+    def stats(self) -> list:
+        return [relay.stats() for relay in self.relays.values()]
+
+
+hub = RelayHub()
+
+
+def install_routes(app, hub: RelayHub = hub, capacity: int = DEFAULT_CAPACITY):
+    """
+    Add /relay and /relay/{stream_id} to a FastAPI app.
+
+    Both require ``Authorization: Bearer <LITELLM_MASTER_KEY>``.
+    """
+    from fastapi import HTTPException, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    from observability.profiler import require_master_key
+
+    async def list_streams(request: Request):
+        require_master_key(request)
+        return JSONResponse(hub.stats())
+
+    async def tail_stream(request: Request, stream_id: str):
+        require_master_key(request)
+        relay = hub.get(stream_id)
+        if relay is None:
+            raise HTTPException(status_code=404, detail="No such stream")
+        subscriber = relay.subscribe(capacity=capacity, name=request.client.host if request.client else None)
+        return StreamingResponse(subscriber.sse(), media_type="text/event-stream")
+
+    app.add_api_route("/relay", list_streams, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/relay/{stream_id}", tail_stream, methods=["GET"], include_in_schema=False)
@@ -0,0 +1,511 @@
+"""
+Zero-downtime reload of the proxy's config.yaml.
+
+Changing ``model_list`` or the callbacks used to mean ``stop.sh`` and
+``start.sh``, dropping in-flight streams and unflushed traces. The
+ConfigReloader instead keeps the proxy running:
+
+- ``watch()`` polls the config file. Edits are detected by content hash,
+  so a touch without changes or a half-written file that fails to parse
+  does not reload anything.
+- The new configuration is built (router, callback objects) in a worker
+  thread while the current one keeps serving. A build error is logged and
+  reported, and the current configuration stays in place.
+- The swap itself is a handful of attribute assignments with no await in
+  between, so every request sees either the old or the new configuration.
+  Callback lists are replaced rather than mutated, which keeps any
+  iteration over the old lists valid.
+- Requests are counted per configuration generation (ReloadCallback in
+  observability.callbacks acquires one at pre-call and releases it when
+  the request is logged, i.e. after a stream's last chunk). After the
+  swap, the reloader waits for the old generation's requests to drain,
+  up to ``drain_timeout``, before closing its router's HTTP clients and
+  the callbacks that were removed.
+- Each reload produces a ReloadReport with the build, swap and drain
+  times; the recent ones are served at ``GET /config/reload`` and a
+  reload can be forced with ``POST /config/reload``.
+
+Only ``model_list``, ``router_settings``, the callbacks and the
+``litellm_settings`` keys in LIVE_SETTINGS (plain attributes of the
+litellm module) are applied live. Settings the proxy translates when it
+loads the config (e.g. ``cache: true`` becomes a Cache object),
+``general_settings`` (master key, custom auth, database) and
+``environment_variables`` still need a restart; a change to them is
+reported as ``restart_required``. Callback modules are not re-imported:
+a callback that is already loaded keeps its instance and state.
+
+Usage:
+    reloader = ConfigReloader(LITELLM_CONFIG_PATH, build_litellm_state, apply_litellm_state,
+                              close_litellm_state)
+    generation = reloader.adopt()
+    generation.state = current_litellm_state(generation.config)
+    reloader.start()
+"""
+
+import asyncio
+import collections
+import dataclasses
+import hashlib
+import importlib
+import inspect
+import logging
+import os
+import time
+
+import yaml
+
+from observability.settings import LITELLM_CONFIG_PATH
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = float(os.environ.get("OBS_RELOAD_INTERVAL", "2.0"))
+DEFAULT_DRAIN_TIMEOUT = float(os.environ.get("OBS_RELOAD_DRAIN_TIMEOUT", "300"))
+
+# Sections that cannot be applied without restarting the proxy
+RESTART_KEYS = ("general_settings", "environment_variables")
+
+# litellm_settings keys that are plain litellm module attributes, applied
+# with setattr; the proxy's config loader translates the others
+LIVE_SETTINGS = ("drop_params", "modify_params", "set_verbose", "request_timeout", "num_retries",
+                 "turn_off_message_logging", "redact_user_api_key_info", "default_fallbacks",
+                 "context_window_fallbacks", "content_policy_fallbacks")
+
+# litellm_settings keys holding callbacks, and the module-level lists in
+# litellm that callbacks are copied into while requests run
+CALLBACK_SETTINGS = ("callbacks", "success_callback", "failure_callback")
+CALLBACK_LISTS = ("callbacks", "input_callback", "success_callback", "failure_callback",
+                  "_async_input_callback", "_async_success_callback", "_async_failure_callback",
+                  "service_callback")
+
+
+class Generation:
+    """
+    One applied configuration and the requests still running on it.
+    """
+
+    def __init__(self, number: int, digest: str, config: dict, state=None):
+        self.number = number
+        self.digest = digest
+        self.config = config
+        self.state = state
+        self.loaded_at = time.time()
+        self.requests = set()
+        self._drained = asyncio.Event()
+        self._drained.set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.requests)
+
+    def acquire(self, request_id: str):
+        self.requests.add(request_id)
+        self._drained.clear()
+
+    def release(self, request_id: str):
+        self.requests.discard(request_id)
+        if not self.requests:
+            self._drained.set()
+
+    async def drained(self, timeout: float) -> bool:
+        """
+        Wait until no requests are running on this generation.
+
+        Returns:
+            bool: False if requests were still running after ``timeout``
+        """
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+@dataclasses.dataclass
+class ReloadReport:
+    """
+    Outcome and timings of one reload.
+    """
+
+    generation: int
+    ok: bool
+    build_ms: float = 0.0
+    swap_ms: float = 0.0
+    drain_ms: float = 0.0
+    drained_requests: int = 0
+    abandoned_requests: int = 0
+    restart_required: list = dataclasses.field(default_factory=list)
+    error: str = None
+    at: float = dataclasses.field(default_factory=time.time)
+
+
+def read_config(path: str):
+    """
+    Read and parse a config file.
+
+    Returns:
+        tuple: (sha256 of the content, parsed config dict)
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    config = yaml.safe_load(content) or {}
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: expected a mapping, got {type(config).__name__}")
+    return hashlib.sha256(content).hexdigest(), config
+
+
+class ConfigReloader:
+    """
+    Watches a config file and swaps configurations without dropping requests.
+
+    Args:
+        path: Config file
+        build: ``build(config) -> state`` (may be async); runs while the
+            current configuration keeps serving and may raise to reject
+            the config
+        apply: ``apply(state, previous_state)``, the synchronous swap
+        close: ``close(previous_state, state)`` once the previous
+            generation has drained (optional)
+        interval: Seconds between file checks
+        drain_timeout: Longest wait for the previous generation's requests
+        history: Reports kept for stats()
+    """
+
+    def __init__(self, path: str, build, apply, close=None, interval: float = DEFAULT_INTERVAL,
+                 drain_timeout: float = DEFAULT_DRAIN_TIMEOUT, history: int = 20):
+        self.path = path
+        self.build = build
+        self.apply = apply
+        self.close = close
+        self.interval = interval
+        self.drain_timeout = drain_timeout
+        self.reports = collections.deque(maxlen=history)
+        self.current = None
+        self.draining = []
+        self._generations = 0
+        self._lock = None
+        self._task = None
+        self._mtime = None
+
+    def adopt(self, state=None):
+        """
+        Register the configuration the proxy started with as generation 1.
+        """
+        digest, config = read_config(self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+        self._generations += 1
+        self.current = Generation(self._generations, digest, config, state)
+        return self.current
+
+    def acquire(self, request_id: str) -> Generation:
+        """
+        Count a request against the current generation.
+        """
+        generation = self.current
+        if generation is not None:
+            generation.acquire(request_id)
+        return generation
+
+    def release(self, request_id: str, number: int = None):
+        """
+        Mark a request finished (on the generation it was acquired on).
+        """
+        for generation in [self.current] + self.draining:
+            if generation is not None and (number is None or generation.number == number):
+                generation.release(request_id)
+
+    async def reload(self, force: bool = False) -> ReloadReport:
+        """
+        Reload the config file if its content changed.
+
+        Returns:
+            ReloadReport, or None if nothing changed
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.current is None:
+                self.adopt()
+            try:
+                self._mtime = os.stat(self.path).st_mtime_ns
+                digest, config = read_config(self.path)
+            except Exception as e:
+                return self._report(ReloadReport(self.current.number, ok=False, error=f"read: {e}"))
+            if digest == self.current.digest and not force:
+                return None
+
+            restart_required = changes_requiring_restart(self.current.config, config)
+            began = time.perf_counter()
+            try:
+                state = self.build(config)
+                if inspect.isawaitable(state):
+                    state = await state
+            except Exception as e:
+                log.warning("Config reload rejected, keeping generation %d: %s", self.current.number, e)
+                return self._report(ReloadReport(self.current.number, ok=False, error=str(e),
+                                                 build_ms=_ms(began), restart_required=restart_required))
+            built = time.perf_counter()
+
+            previous = self.current
+            self.apply(state, previous.state)
+            self._generations += 1
+            self.current = Generation(self._generations, digest, config, state)
+            swapped = time.perf_counter()
+
+            report = ReloadReport(self.current.number, ok=True, build_ms=_ms(began, built),
+                                  swap_ms=_ms(built, swapped), drained_requests=previous.in_flight,
+                                  restart_required=restart_required)
+            log.info("Config generation %d applied (build %.1f ms, swap %.3f ms), draining %d requests",
+                     self.current.number, report.build_ms, report.swap_ms, previous.in_flight)
+
+        # Drained outside the lock: another edit can be applied meanwhile
+        self.draining.append(previous)
+        try:
+            if not await previous.drained(self.drain_timeout):
+                report.abandoned_requests = previous.in_flight
+                log.warning("Config generation %d still had %d requests after %g s",
+                            previous.number, previous.in_flight, self.drain_timeout)
+            report.drained_requests -= report.abandoned_requests
+            report.drain_ms = _ms(swapped)
+            if self.close is not None:
+                try:
+                    closed = self.close(previous.state, state)
+                    if inspect.isawaitable(closed):
+                        await closed
+                except Exception as e:
+                    log.warning("Error closing config generation %d: %s", previous.number, e)
+        finally:
+            self.draining.remove(previous)
+        return self._report(report)
+
+    def _report(self, report: ReloadReport) -> ReloadReport:
+        self.reports.append(report)
+        return report
+
+    def changed(self) -> bool:
+        """
+        Cheap check (mtime) whether the file may have changed.
+        """
+        try:
+            return os.stat(self.path).st_mtime_ns != self._mtime
+        except OSError:
+            return False
+
+    async def _reload_logged(self):
+        try:
+            await self.reload()
+        except Exception as e:
+            log.warning("Error reloading config: %s", e)
+
+    async def watch(self):
+        pending = set()
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.changed():
+                # Not awaited: a reload waits for the previous generation to
+                # drain, and later edits must still be picked up meanwhile
+                self._mtime = os.stat(self.path).st_mtime_ns
+                task = asyncio.ensure_future(self._reload_logged())
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+    def start(self):
+        """
+        Start watching on the running event loop.
+        """
+        if self.current is None:
+            self.adopt()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.watch())
+        return self
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        current = self.current
+        return {
+            "path": self.path,
+            "generation": current.number if current else None,
+            "loaded_at": current.loaded_at if current else None,
+            "in_flight": current.in_flight if current else 0,
+            "draining": {g.number: g.in_flight for g in self.draining},
+            "reports": [dataclasses.asdict(r) for r in self.reports],
+        }
+
+
+def changes_requiring_restart(previous: dict, config: dict) -> list:
+    """
+    Changed sections and litellm_settings keys that a reload cannot apply.
+    """
+    changed = [key for key in RESTART_KEYS if config.get(key) != previous.get(key)]
+    before = previous.get("litellm_settings") or {}
+    after = config.get("litellm_settings") or {}
+    changed += [f"litellm_settings.{key}" for key in sorted(set(before) | set(after))
+                if key not in LIVE_SETTINGS and key not in CALLBACK_SETTINGS
+                and before.get(key) != after.get(key)]
+    return changed
+
+
+def _ms(began: float, ended: float = None) -> float:
+    return round(((ended if ended is not None else time.perf_counter()) - began) * 1000, 3)
+
+
+@dataclasses.dataclass
+class LiteLLMState:
+    """
+    What one config generation installs into the running proxy.
+    """
+
+    router: object
+    model_list: list
+    callbacks: dict
+    settings: dict
+
+
+def _resolve_callback(value):
+    # Same convention as the proxy: "module.attribute" is imported, a bare
+    # name ("lite_debugger") is a built-in integration
+    if not isinstance(value, str) or "." not in value:
+        return value
+    module_name, attribute = value.rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def _split_settings(config: dict):
+    settings = config.get("litellm_settings") or {}
+    callbacks = {key: [_resolve_callback(value) for value in settings.get(key) or []]
+                 for key in CALLBACK_SETTINGS}
+    return callbacks, {key: value for key, value in settings.items() if key in LIVE_SETTINGS}
+
+
+def _build_litellm_state(config: dict) -> LiteLLMState:
+    import litellm
+
+    model_list = config.get("model_list") or []
+    router = litellm.Router(model_list=model_list, **(config.get("router_settings") or {}))
+    callbacks, settings = _split_settings(config)
+    return LiteLLMState(router=router, model_list=model_list, callbacks=callbacks, settings=settings)
+
+
+async def build_litellm_state(config: dict) -> LiteLLMState:
+    """
+    Build a router and resolve callbacks for a config, without installing them.
+
+    Runs in a worker thread: building the router and importing callback
+    modules must not stall requests on the event loop.
+    """
+    return await asyncio.to_thread(_build_litellm_state, config)
+
+
+def apply_litellm_state(state: LiteLLMState, previous: LiteLLMState = None):
+    """
+    Install a built configuration into litellm and the proxy server.
+    """
+    import litellm
+    from litellm.proxy import proxy_server
+
+    previous_callbacks = previous.callbacks if previous else {key: [] for key in CALLBACK_SETTINGS}
+    removed = [cb for key in CALLBACK_SETTINGS for cb in previous_callbacks[key]
+               if all(cb is not other and cb != other for other in state.callbacks[key])]
+
+    # New lists, not in-place edits: requests iterating the old ones keep going
+    for name in CALLBACK_LISTS:
+        current = getattr(litellm, name, None)
+        if isinstance(current, list):
+            setattr(litellm, name, [cb for cb in current if not any(cb is r or cb == r for r in removed)])
+    for key in CALLBACK_SETTINGS:
+        current = getattr(litellm, key)
+        setattr(litellm, key, current + [cb for cb in state.callbacks[key]
+                                         if not any(cb is c or cb == c for c in current)])
+    for key, value in state.settings.items():
+        setattr(litellm, key, value)
+
+    proxy_server.llm_router = state.router
+    proxy_server.llm_model_list = state.model_list
+
+
+async def _close(obj, *names):
+    for name in names:
+        close = getattr(obj, name, None)
+        if callable(close):
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+            return
+
+
+def _router_clients(router) -> list:
+    # The router caches one HTTP client per deployment and client kind
+    cache = getattr(getattr(router, "cache", None), "in_memory_cache", None)
+    values = getattr(cache, "cache_dict", None) or {}
+    return [value for value in list(values.values())
+            if not isinstance(value, (dict, list, str)) and (hasattr(value, "aclose") or hasattr(value, "close"))]
+
+
+async def close_litellm_state(previous: LiteLLMState, state: LiteLLMState):
+    """
+    Close the previous router's HTTP clients and the callbacks the new
+    configuration no longer uses.
+    """
+    router = previous.router
+    if router is not None and router is not state.router:
+        for client in _router_clients(router):
+            try:
+                await _close(client, "aclose", "close")
+            except Exception as e:
+                log.warning("Error closing router client: %s", e)
+        # Unregisters the router's own callbacks from litellm
+        discard = getattr(router, "discard", None)
+        if callable(discard):
+            discard()
+
+    kept = [cb for callbacks in state.callbacks.values() for cb in callbacks]
+    for callbacks in previous.callbacks.values():
+        for callback in callbacks:
+            if any(callback is cb for cb in kept):
+                continue
+            await _close(callback, "close")
+
+
+def current_litellm_state(config: dict) -> LiteLLMState:
+    """
+    Describe what the proxy loaded at startup, for the first generation.
+    """
+    import litellm
+    from litellm.proxy import proxy_server
+
+    callbacks, settings = _split_settings(config)
+    return LiteLLMState(router=getattr(proxy_server, "llm_router", None),
+                        model_list=getattr(proxy_server, "llm_model_list", None) or [],
+                        callbacks=callbacks, settings=settings)
+
+
+def install_routes(app, reloader: ConfigReloader):
+    """
+    Add GET/POST /config/reload to a FastAPI app.
+
+    Both require ``Authorization: Bearer <LITELLM_MASTER_KEY>``. POST
+    reloads now (even if the file is unchanged with ``?force=true``) and
+    returns the report once the previous generation has drained.
+    """
+    from fastapi import Request
+    from fastapi.responses import JSONResponse
+
+    from observability.profiler import require_master_key
+
+    async def reload_status(request: Request):
+        require_master_key(request)
+        return JSONResponse(reloader.stats())
+
+    async def reload_now(request: Request, force: bool = False):
+        require_master_key(request)
+        report = await reloader.reload(force=force)
+        if report is None:
+            return JSONResponse({"reloaded": False, "generation": reloader.current.number})
+        return JSONResponse(dataclasses.asdict(report), status_code=200 if report.ok else 422)
+
+    app.add_api_route("/config/reload", reload_status, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/config/reload", reload_now, methods=["POST"], include_in_schema=False)
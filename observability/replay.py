@@ -0,0 +1,369 @@
+"""
+Offline evaluation by replaying stored traces against a candidate model.
+
+Historical requests are read from MLflow traces page by page and
+re-issued concurrently against a candidate: another model route in
+config.yaml, behind the proxy (``--model``), or the in-process
+MockBackend (``--mock``), which needs no provider or proxy. Each case
+compares the candidate with the original trace on latency, tokens, cost
+and response text. The report is logged as an MLflow evaluation run:
+summary metrics plus ``replay_cases.json`` and ``replay_diffs.md``
+artifacts.
+
+Usage:
+    python -m observability.replay --model groq/llama-3.1-8b-instant --max-traces 500
+    python -m observability.replay --mock --filter "tags.\\`obs.model\\` = 'gemini/gemini-2.0-flash'"
+"""
+
+import argparse
+import asyncio
+import difflib
+import json
+import os
+import random
+import time
+
+from observability.cost import get_cost_engine
+from observability.settings import MLFLOW_TRACKING_URI, TRACE_EXPERIMENT_NAME
+
+
+DEFAULT_EXPERIMENT = "Replay-Evaluations"
+REPLAYED_PARAMS = ("temperature", "top_p", "max_tokens", "stop", "presence_penalty", "frequency_penalty")
+
+
+class ReplayCase:
+    """
+    One historical request and what the original trace recorded about it.
+    """
+
+    def __init__(self, trace_id: str, messages: list, params: dict = None, baseline: dict = None):
+        self.trace_id = trace_id
+        self.messages = messages
+        self.params = dict(params or {})
+        self.baseline = dict(baseline or {})
+
+
+def _loads(value):
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _response_text(response) -> str:
+    response = _loads(response)
+    if isinstance(response, dict):
+        choices = response.get("choices") or []
+        if choices:
+            message = choices[0].get("message") or {}
+            return message.get("content") or ""
+        return response.get("content") or ""
+    return response if isinstance(response, str) else ""
+
+
+def case_from_trace(trace):
+    """
+    Build a ReplayCase from an MLflow trace, or None if it has no messages.
+
+    Handles both spooled proxy traces (inputs are the messages plus the
+    request's model parameters, and ``obs.*`` tags) and OpenAI autolog
+    traces (inputs are the request).
+    """
+    info = trace.info
+    tags = dict(getattr(info, "tags", None) or {})
+    inputs = _loads(getattr(trace.data, "request", None)) or {}
+    if not isinstance(inputs, dict) or not inputs.get("messages"):
+        return None
+
+    def tag_number(key):
+        try:
+            return float(tags[key])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    trace_id = getattr(info, "trace_id", None) or info.request_id
+    baseline = {
+        "model": tags.get("obs.model") or inputs.get("model"),
+        "latency_ms": getattr(info, "execution_time_ms", None) or getattr(info, "execution_duration", None),
+        "prompt_tokens": tag_number("obs.prompt_tokens"),
+        "completion_tokens": tag_number("obs.completion_tokens"),
+        "cost": tag_number("obs.response_cost"),
+        "content": _response_text(getattr(trace.data, "response", None)),
+        "status": str(getattr(info, "status", "")),
+    }
+    params = {key: inputs[key] for key in REPLAYED_PARAMS if inputs.get(key) is not None}
+    return ReplayCase(trace_id, inputs["messages"], params, baseline)
+
+
+def iter_trace_cases(client, experiment_ids, filter_string: str = None, page_size: int = 100,
+                     max_traces: int = None):
+    """
+    Stream replayable cases from MLflow, one search page at a time.
+
+    Args:
+        client: MlflowClient
+        experiment_ids: Experiments to read from
+        filter_string: search_traces filter (e.g. by model or time range)
+        page_size: Traces per page
+        max_traces: Stop after this many cases
+
+    Yields:
+        ReplayCase
+    """
+    token = None
+    produced = 0
+    while True:
+        page = client.search_traces(experiment_ids=experiment_ids, filter_string=filter_string,
+                                    max_results=page_size, order_by=["timestamp_ms DESC"], page_token=token)
+        for trace in page:
+            case = case_from_trace(trace)
+            if case is None:
+                continue
+            yield case
+            produced += 1
+            if max_traces and produced >= max_traces:
+                return
+        token = getattr(page, "token", None)
+        if not token:
+            return
+
+
+class MockBackend:
+    """
+    In-process stand-in for the proxy: echoes a canned answer after a
+    simulated latency. Exposes ``chat.completions.create`` like AsyncOpenAI.
+
+    Args:
+        latency_ms: Mean simulated latency
+        seed: Random seed
+    """
+
+    def __init__(self, latency_ms: float = 200.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.random = random.Random(seed)
+        self.chat = self
+        self.completions = self
+
+    async def create(self, model: str, messages: list, **kwargs):
+        await asyncio.sleep(self.random.expovariate(1.0 / self.latency_ms) / 1000.0)
+        prompt = messages[-1].get("content") if messages else ""
+        content = f"Mock answer to: {prompt}"[: 4 * (kwargs.get("max_tokens") or 256)]
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        return _MockResponse(model, content, prompt_tokens, len(content) // 4)
+
+
+class _MockResponse:
+    def __init__(self, model, content, prompt_tokens, completion_tokens):
+        self.model = model
+        self.choices = [type("Choice", (), {
+            "message": type("Message", (), {"content": content})(),
+            "finish_reason": "stop",
+        })()]
+        self.usage = type("Usage", (), {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        })()
+
+
+def compare(case: ReplayCase, candidate: dict) -> dict:
+    """
+    Side-by-side row for one case.
+
+    Returns:
+        dict: Baseline and candidate metrics plus response similarity
+    """
+    baseline_text = case.baseline.get("content") or ""
+    candidate_text = candidate.get("content") or ""
+    return {
+        "trace_id": case.trace_id,
+        "baseline_model": case.baseline.get("model"),
+        "baseline_latency_ms": case.baseline.get("latency_ms"),
+        "candidate_latency_ms": candidate.get("latency_ms"),
+        "baseline_completion_tokens": case.baseline.get("completion_tokens"),
+        "candidate_completion_tokens": candidate.get("completion_tokens"),
+        "baseline_cost": case.baseline.get("cost"),
+        "candidate_cost": candidate.get("cost"),
+        "similarity": round(difflib.SequenceMatcher(None, baseline_text, candidate_text).ratio(), 4),
+        "exact_match": baseline_text == candidate_text,
+        "baseline_content": baseline_text,
+        "candidate_content": candidate_text,
+        "error": candidate.get("error"),
+    }
+
+
+class ReplayRunner:
+    """
+    Replays cases concurrently against a candidate.
+
+    Args:
+        client: AsyncOpenAI pointed at the proxy, or MockBackend
+        model: Candidate model / route name
+        concurrency: Requests in flight
+    """
+
+    def __init__(self, client, model: str, concurrency: int = 16):
+        self.client = client
+        self.model = model
+        self.concurrency = concurrency
+
+    async def _replay(self, case: ReplayCase) -> dict:
+        began = time.perf_counter()
+        result = {}
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model, messages=case.messages, **case.params
+            )
+            usage = response.usage
+            result = {
+                "content": response.choices[0].message.content,
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "cost": sum(get_cost_engine().cost(self.model, usage.prompt_tokens, usage.completion_tokens)),
+            }
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency_ms"] = round((time.perf_counter() - began) * 1000, 2)
+        return compare(case, result)
+
+    async def run(self, cases) -> list:
+        """
+        Replay an iterable of cases, pulling from it only as fast as
+        requests complete (the iterable may page lazily from MLflow).
+
+        Returns:
+            list: compare() rows in completion order
+        """
+        iterator = iter(cases)
+        rows = []
+        pending = set()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < self.concurrency:
+                # Page fetches block on MLflow; keep them off the loop
+                case = await asyncio.to_thread(next, iterator, None)
+                if case is None:
+                    exhausted = True
+                    break
+                pending.add(asyncio.ensure_future(self._replay(case)))
+            if not pending:
+                return rows
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            rows.extend(task.result() for task in done)
+
+
+def _percentile(values, q):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(q / 100.0 * (len(values) - 1))))]
+
+
+def summarize(rows: list) -> dict:
+    """
+    Aggregate replay rows into report metrics.
+    """
+    ok = [row for row in rows if not row.get("error")]
+    summary = {"cases": len(rows), "errors": len(rows) - len(ok)}
+    for side in ("baseline", "candidate"):
+        latencies = [row[f"{side}_latency_ms"] for row in ok]
+        summary[f"{side}_p50_latency_ms"] = _percentile(latencies, 50)
+        summary[f"{side}_p95_latency_ms"] = _percentile(latencies, 95)
+        summary[f"{side}_completion_tokens"] = sum(row[f"{side}_completion_tokens"] or 0 for row in ok)
+        summary[f"{side}_cost"] = sum(row[f"{side}_cost"] or 0.0 for row in ok)
+    if ok:
+        summary["mean_similarity"] = sum(row["similarity"] for row in ok) / len(ok)
+        summary["exact_match_rate"] = sum(1 for row in ok if row["exact_match"]) / len(ok)
+    return {key: value for key, value in summary.items() if value is not None}
+
+
+def diff_report(rows: list, limit: int = 20) -> str:
+    """
+    Markdown with unified diffs of the least similar responses.
+    """
+    lines = ["# Replay response diffs", ""]
+    for row in sorted((r for r in rows if not r.get("error")), key=lambda r: r["similarity"])[:limit]:
+        lines.append(f"## {row['trace_id']} (similarity {row['similarity']})")
+        lines.append("```diff")
+        lines.extend(difflib.unified_diff(
+            row["baseline_content"].splitlines(), row["candidate_content"].splitlines(),
+            fromfile="baseline", tofile="candidate", lineterm=""
+        ))
+        lines.append("```")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def log_evaluation_run(client, experiment_name: str, candidate: str, rows: list, params: dict = None) -> str:
+    """
+    Log a replay report as an MLflow run.
+
+    Returns:
+        str: The run id
+    """
+    from mlflow.entities import Metric, Param
+
+    experiment = client.get_experiment_by_name(experiment_name)
+    experiment_id = experiment.experiment_id if experiment else client.create_experiment(experiment_name)
+    run = client.create_run(experiment_id, run_name=f"replay-{candidate}",
+                            tags={"obs.kind": "replay_evaluation", "replay.candidate": candidate})
+    run_id = run.info.run_id
+    now = int(time.time() * 1000)
+    client.log_batch(
+        run_id,
+        metrics=[Metric(key, float(value), now, 0) for key, value in summarize(rows).items()],
+        params=[Param(key, str(value)[:500]) for key, value in dict(params or {}, candidate=candidate).items()]
+    )
+    client.log_dict(run_id, rows, "replay_cases.json")
+    client.log_text(run_id, diff_report(rows), "replay_diffs.md")
+    client.set_terminated(run_id, "FINISHED")
+    return run_id
+
+
+def main(argv=None):
+    from mlflow.tracking import MlflowClient
+
+    parser = argparse.ArgumentParser(description="Replay stored traces against a candidate model")
+    parser.add_argument("--model", help="Candidate model / config.yaml route")
+    parser.add_argument("--mock", action="store_true", help="Use the in-process mock backend")
+    parser.add_argument("--source-experiment", default=TRACE_EXPERIMENT_NAME)
+    parser.add_argument("--filter", help="search_traces filter for the historical traces")
+    parser.add_argument("--max-traces", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--base-url", default=os.environ.get("LITELLM_PROXY_URL", "http://localhost:4000"))
+    parser.add_argument("--api-key", default=os.environ.get("LITELLM_MASTER_KEY", "sk-1234"))
+    parser.add_argument("--experiment", default=DEFAULT_EXPERIMENT)
+    parser.add_argument("--tracking-uri", default=MLFLOW_TRACKING_URI)
+    args = parser.parse_args(argv)
+    if not args.model and not args.mock:
+        parser.error("--model or --mock is required")
+
+    mlflow_client = MlflowClient(args.tracking_uri)
+    source = mlflow_client.get_experiment_by_name(args.source_experiment)
+    if source is None:
+        parser.error(f"Experiment {args.source_experiment} not found")
+
+    if args.mock:
+        candidate_client, candidate = MockBackend(), args.model or "mock"
+    else:
+        from openai import AsyncOpenAI
+
+        candidate_client, candidate = AsyncOpenAI(api_key=args.api_key, base_url=args.base_url), args.model
+
+    cases = iter_trace_cases(mlflow_client, [source.experiment_id], args.filter,
+                             page_size=args.page_size, max_traces=args.max_traces)
+    rows = asyncio.run(ReplayRunner(candidate_client, candidate, args.concurrency).run(cases))
+    run_id = log_evaluation_run(mlflow_client, args.experiment, candidate, rows, params={
+        "source_experiment": args.source_experiment,
+        "filter": args.filter or "",
+        "max_traces": args.max_traces,
+    })
+    print(f"✓ Replayed {len(rows)} traces against {candidate}: {summarize(rows)}")
+    print(f"✓ Evaluation run: {run_id}")
+
+
+if __name__ == "__main__":
+    main()
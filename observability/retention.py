@@ -0,0 +1,593 @@
+"""
+Trace retention and tiered storage for the MLflow backend store.
+
+Nothing in MLflow expires traces, so ``trace_info`` and its tag, metadata
+and span tables grow with every request and slow down ingest and search.
+This job applies a retention policy in bounded batches:
+
+1. Traces older than the shortest retention window are scanned in
+   (timestamp_ms, request_id) order and matched against the policy rules
+   (first match wins; traces matching no rule are kept). The scan position
+   is kept in ``obs_retention_state``: a capped run (``--max-batches``)
+   resumes where the previous one stopped, and a new pass starts at the
+   low-water mark below which every remaining trace is kept for good
+   (older than the longest retention window when the pass began). The
+   position is reset when the policy changes.
+2. For expired traces, the trace info, tags, request metadata, spans and
+   the ``traces.json`` payload are written to gzip JSONL archives under
+   the artifact root (``_archive/traces/<day>/``) and fsynced, optionally
+   only for a sample of them.
+3. Per day/experiment/model/status aggregates are added to
+   ``obs_trace_daily`` (kept forever), the rows are deleted from the hot
+   tables in the same transaction, and local payload files are removed
+   after the commit.
+4. On Postgres the trace tables are vacuumed and analyzed.
+
+Policy file (``OBS_RETENTION_POLICY``, JSON):
+    {"rules": [
+        {"name": "evals", "experiments": ["Replay-Evaluations"], "keep_days": null},
+        {"name": "errors", "status": ["ERROR"], "keep_days": 90},
+        {"name": "sweeps", "tags": {"sweep.cached": "true"}, "keep_days": 1, "archive": false},
+        {"name": "default", "keep_days": 7, "sample_rate": 0.1}
+    ]}
+
+Usage (e.g. from cron, hourly):
+    python -m observability.retention --dry-run
+    python -m observability.retention --batch-size 2000 --max-batches 50
+"""
+
+import argparse
+import collections
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+
+from observability.settings import (
+    MLFLOW_ARTIFACT_ROOT,
+    MLFLOW_ARTIFACTS_DESTINATION,
+    MLFLOW_BACKEND_STORE_URI,
+    REPO_DIR,
+)
+
+
+log = logging.getLogger(__name__)
+
+POLICY_FILE = os.environ.get("OBS_RETENTION_POLICY")
+DEFAULT_BATCH_SIZE = 2000
+ARCHIVE_ROOT = os.path.join(MLFLOW_ARTIFACT_ROOT, "_archive", "traces")
+
+DEFAULT_POLICY = {
+    "rules": [
+        {"name": "errors", "status": ["ERROR"], "keep_days": 90},
+        {"name": "default", "keep_days": 7},
+    ]
+}
+
+# Hot tables holding per-trace rows -> column referencing trace_info
+CHILD_TABLES = {
+    "spans": "trace_id",
+    "assessments": "trace_id",
+    "trace_tags": "request_id",
+    "trace_request_metadata": "request_id",
+    "obs_trace_index": "request_id",
+}
+
+CREATE_DAILY_SQL = """
+CREATE TABLE IF NOT EXISTS obs_trace_daily (
+    day VARCHAR(10) NOT NULL,
+    experiment_id VARCHAR(32) NOT NULL,
+    model VARCHAR(250) NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    traces BIGINT NOT NULL,
+    latency_ms BIGINT NOT NULL,
+    prompt_tokens BIGINT NOT NULL,
+    completion_tokens BIGINT NOT NULL,
+    cost DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (day, experiment_id, model, status)
+)
+"""
+
+UPSERT_DAILY_SQL = """
+INSERT INTO obs_trace_daily (day, experiment_id, model, status, traces, latency_ms,
+                             prompt_tokens, completion_tokens, cost)
+VALUES (:day, :experiment_id, :model, :status, :traces, :latency_ms,
+        :prompt_tokens, :completion_tokens, :cost)
+ON CONFLICT (day, experiment_id, model, status) DO UPDATE SET
+    traces = obs_trace_daily.traces + excluded.traces,
+    latency_ms = obs_trace_daily.latency_ms + excluded.latency_ms,
+    prompt_tokens = obs_trace_daily.prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = obs_trace_daily.completion_tokens + excluded.completion_tokens,
+    cost = obs_trace_daily.cost + excluded.cost
+"""
+
+CREATE_STATE_SQL = """
+CREATE TABLE IF NOT EXISTS obs_retention_state (
+    name VARCHAR(32) PRIMARY KEY,
+    policy VARCHAR(64) NOT NULL,
+    pass_cutoff BIGINT NOT NULL,
+    done_ts BIGINT NOT NULL,
+    done_rid VARCHAR(50) NOT NULL,
+    resume_ts BIGINT,
+    resume_rid VARCHAR(50)
+)
+"""
+
+SELECT_STATE_SQL = "SELECT * FROM obs_retention_state WHERE name = 'scan'"
+
+UPSERT_STATE_SQL = """
+INSERT INTO obs_retention_state (name, policy, pass_cutoff, done_ts, done_rid, resume_ts, resume_rid)
+VALUES ('scan', :policy, :pass_cutoff, :done_ts, :done_rid, :resume_ts, :resume_rid)
+ON CONFLICT (name) DO UPDATE SET
+    policy = excluded.policy,
+    pass_cutoff = excluded.pass_cutoff,
+    done_ts = excluded.done_ts,
+    done_rid = excluded.done_rid,
+    resume_ts = excluded.resume_ts,
+    resume_rid = excluded.resume_rid
+"""
+
+SELECT_BATCH_SQL = """
+SELECT request_id, experiment_id, timestamp_ms, execution_time_ms, status
+FROM trace_info
+WHERE (timestamp_ms, request_id) > (:ts, :rid) AND timestamp_ms < :upper
+ORDER BY timestamp_ms, request_id
+LIMIT :limit
+"""
+
+SELECT_KV_SQL = """
+SELECT request_id, key, value FROM trace_tags WHERE request_id IN :ids
+UNION ALL
+SELECT request_id, key, value FROM trace_request_metadata WHERE request_id IN :ids
+"""
+
+SELECT_SPANS_SQL = "SELECT * FROM spans WHERE trace_id IN :ids"
+
+
+class RetentionRule:
+    """
+    One policy rule.
+
+    Args:
+        name: Rule name used in reports
+        experiments: Experiment ids or names the rule applies to (all if empty)
+        status: Trace statuses the rule applies to (all if empty)
+        tags: Tag / request metadata values that must all match
+        keep_days: Days to keep matching traces (None keeps them forever)
+        archive: Archive payloads before deleting
+        sample_rate: Fraction of expired traces archived; the rest only
+            contribute to the daily aggregates
+    """
+
+    def __init__(self, name: str, experiments=(), status=(), tags: dict = None, keep_days: float = None,
+                 archive: bool = True, sample_rate: float = 1.0):
+        self.name = name
+        self.experiments = {str(e) for e in experiments}
+        self.status = set(status)
+        self.tags = tags or {}
+        self.keep_days = keep_days
+        self.archive = archive
+        self.sample_rate = sample_rate
+
+    def matches(self, trace: dict, experiment_name: str = None) -> bool:
+        if self.experiments and not {str(trace["experiment_id"]), experiment_name} & self.experiments:
+            return False
+        if self.status and trace["status"] not in self.status:
+            return False
+        kv = trace["kv"]
+        return all(kv.get(key) == str(value) for key, value in self.tags.items())
+
+    def archives(self, request_id: str) -> bool:
+        """
+        Whether an expired trace is archived (stable per trace id).
+        """
+        if not self.archive or self.sample_rate <= 0:
+            return False
+        if self.sample_rate >= 1:
+            return True
+        bucket = int(hashlib.md5(request_id.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return bucket < self.sample_rate
+
+
+def load_policy(path: str = POLICY_FILE) -> list:
+    """
+    Load retention rules from a JSON policy file (DEFAULT_POLICY if unset).
+
+    Returns:
+        list: RetentionRule objects in match order
+    """
+    policy = DEFAULT_POLICY
+    if path:
+        with open(path) as f:
+            policy = json.load(f)
+    return [RetentionRule(**rule) for rule in policy["rules"]]
+
+
+def resolve_local_payload(location: str):
+    """
+    Map a trace's ``mlflow.artifactLocation`` to a local directory.
+
+    Returns:
+        str: Directory path, or None for remote artifact stores
+    """
+    if not location:
+        return None
+    if location.startswith("mlflow-artifacts:/"):
+        return os.path.join(MLFLOW_ARTIFACTS_DESTINATION, location[len("mlflow-artifacts:/"):].strip("/"))
+    if location.startswith("file://"):
+        return location[len("file://"):]
+    if "://" in location or location.startswith("mlflow-artifacts:"):
+        return None
+    # Relative to the directory start.sh runs the server from
+    return location if os.path.isabs(location) else os.path.join(REPO_DIR, location)
+
+
+def _read_payload(directory: str):
+    path = os.path.join(directory, "traces.json") if directory else None
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            return None
+
+
+def _day(timestamp_ms: int) -> str:
+    return datetime.datetime.fromtimestamp(timestamp_ms / 1000, datetime.timezone.utc).date().isoformat()
+
+
+def write_archive_batch(records, archive_root: str = ARCHIVE_ROOT) -> list:
+    """
+    Write archived traces to compressed JSONL, one file per day.
+
+    Files are fsynced before returning so the database rows can be
+    deleted safely. A batch that is written but not committed is archived
+    again on the next run; readers should dedupe on request_id.
+
+    Args:
+        records: Dicts with at least request_id and timestamp_ms
+        archive_root: Archive root directory
+
+    Returns:
+        list: Paths of the files written
+    """
+    by_day = collections.defaultdict(list)
+    for record in records:
+        by_day[_day(record["timestamp_ms"])].append(record)
+
+    paths = []
+    for day, day_records in by_day.items():
+        directory = os.path.join(archive_root, day)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.jsonl.gz")
+        with open(path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+                for record in day_records:
+                    f.write(json.dumps(record, default=str).encode("utf-8") + b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+        paths.append(path)
+    return paths
+
+
+def read_archive(day: datetime.date, archive_root: str = ARCHIVE_ROOT):
+    """
+    Read archived traces for one day.
+
+    Args:
+        day: Day to read
+        archive_root: Archive root directory
+
+    Yields:
+        dict: One record per trace (deduplicated by request_id)
+    """
+    directory = os.path.join(archive_root, day.isoformat())
+    if not os.path.isdir(directory):
+        return
+    seen = set()
+    for name in sorted(os.listdir(directory)):
+        with gzip.open(os.path.join(directory, name), "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["request_id"] not in seen:
+                    seen.add(record["request_id"])
+                    yield record
+
+
+def aggregate(traces) -> list:
+    """
+    Roll traces up into obs_trace_daily rows.
+
+    Returns:
+        list: Parameter dicts for UPSERT_DAILY_SQL
+    """
+    rows = {}
+    for trace in traces:
+        kv = trace["kv"]
+        key = (_day(trace["timestamp_ms"]), str(trace["experiment_id"]), kv.get("obs.model") or "",
+               trace["status"] or "")
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = dict(zip(("day", "experiment_id", "model", "status"), key), traces=0,
+                                   latency_ms=0, prompt_tokens=0, completion_tokens=0, cost=0.0)
+        row["traces"] += 1
+        row["latency_ms"] += trace["execution_time_ms"] or 0
+        row["prompt_tokens"] += _number(kv.get("obs.prompt_tokens"), int)
+        row["completion_tokens"] += _number(kv.get("obs.completion_tokens"), int)
+        row["cost"] += _number(kv.get("obs.response_cost"), float)
+    return list(rows.values())
+
+
+def _number(value, kind):
+    try:
+        return kind(float(value))
+    except (TypeError, ValueError):
+        return kind(0)
+
+
+class RetentionEngine:
+    """
+    Applies a retention policy to the MLflow trace tables.
+
+    Args:
+        engine: SQLAlchemy engine for the MLflow backend store
+        rules: RetentionRule list (load_policy() by default)
+        archive_root: Archive root directory
+        batch_size: Traces scanned per batch
+        now: Reference time in epoch seconds (defaults to time.time())
+    """
+
+    def __init__(self, engine, rules: list = None, archive_root: str = ARCHIVE_ROOT,
+                 batch_size: int = DEFAULT_BATCH_SIZE, now: float = None):
+        from sqlalchemy import inspect, text
+
+        self.engine = engine
+        self.rules = rules if rules is not None else load_policy()
+        self.archive_root = archive_root
+        self.batch_size = batch_size
+        self.now = now
+        inspector = inspect(engine)
+        self.child_tables = {table: column for table, column in CHILD_TABLES.items() if inspector.has_table(table)}
+        with engine.begin() as conn:
+            conn.execute(text(CREATE_DAILY_SQL))
+            conn.execute(text(CREATE_STATE_SQL))
+        # Loaded at the start of each run, so experiments created while a
+        # --interval daemon is running match their name-based rules
+        self.experiment_names = {}
+
+    def load_experiment_names(self):
+        from sqlalchemy import text
+
+        with self.engine.connect() as conn:
+            self.experiment_names = {
+                str(row[0]): row[1] for row in conn.execute(text("SELECT experiment_id, name FROM experiments"))
+            }
+
+    def _cutoffs(self) -> dict:
+        now_ms = int((self.now if self.now is not None else time.time()) * 1000)
+        return {
+            rule.name: now_ms - int(rule.keep_days * 86400 * 1000)
+            for rule in self.rules if rule.keep_days is not None
+        }
+
+    def policy_digest(self) -> str:
+        """
+        Fingerprint of the rules; the scan position is reset when it changes.
+        """
+        rules = json.dumps([vars(rule) for rule in self.rules], sort_keys=True, default=sorted)
+        return hashlib.sha256(rules.encode("utf-8")).hexdigest()
+
+    def _scan_state(self, cutoffs: dict) -> dict:
+        from sqlalchemy import text
+
+        policy = self.policy_digest()
+        with self.engine.connect() as conn:
+            row = conn.execute(text(SELECT_STATE_SQL)).mappings().first()
+        state = dict(row) if row is not None and row["policy"] == policy else {
+            "policy": policy, "done_ts": -1, "done_rid": "", "resume_ts": None, "resume_rid": None,
+        }
+        state.pop("name", None)
+        if state["resume_ts"] is None:
+            # New pass: traces below the longest window's cutoff are expired now
+            state["pass_cutoff"] = min(cutoffs.values())
+        return state
+
+    def _load(self, conn, ts: int, rid: str, upper: int) -> list:
+        from sqlalchemy import bindparam, text
+
+        traces = [dict(row, kv={}) for row in conn.execute(
+            text(SELECT_BATCH_SQL), {"ts": ts, "rid": rid, "upper": upper, "limit": self.batch_size}
+        ).mappings()]
+        if traces:
+            by_id = {trace["request_id"]: trace for trace in traces}
+            query = text(SELECT_KV_SQL).bindparams(bindparam("ids", expanding=True))
+            for request_id, key, value in conn.execute(query, {"ids": list(by_id)}):
+                by_id[request_id]["kv"][key] = value
+        return traces
+
+    def _classify(self, traces: list, cutoffs: dict):
+        expired = []
+        for trace in traces:
+            name = self.experiment_names.get(str(trace["experiment_id"]))
+            rule = next((rule for rule in self.rules if rule.matches(trace, name)), None)
+            if rule is not None and rule.name in cutoffs and trace["timestamp_ms"] < cutoffs[rule.name]:
+                expired.append((trace, rule))
+        return expired
+
+    def _archive(self, conn, expired: list) -> list:
+        from sqlalchemy import bindparam, text
+
+        archived = [trace for trace, rule in expired if rule.archives(trace["request_id"])]
+        if not archived:
+            return []
+        spans = collections.defaultdict(list)
+        if "spans" in self.child_tables:
+            query = text(SELECT_SPANS_SQL).bindparams(bindparam("ids", expanding=True))
+            for span in conn.execute(query, {"ids": [t["request_id"] for t in archived]}).mappings():
+                spans[span["trace_id"]].append(dict(span))
+
+        records = []
+        for trace in archived:
+            record = {k: trace[k] for k in ("request_id", "experiment_id", "timestamp_ms",
+                                            "execution_time_ms", "status")}
+            record["kv"] = trace["kv"]
+            record["spans"] = spans.get(trace["request_id"], [])
+            record["payload"] = _read_payload(resolve_local_payload(trace["kv"].get("mlflow.artifactLocation")))
+            records.append(record)
+        write_archive_batch(records, self.archive_root)
+        return records
+
+    def _delete(self, conn, request_ids: list):
+        from sqlalchemy import bindparam, text
+
+        for table, column in self.child_tables.items():
+            query = text(f"DELETE FROM {table} WHERE {column} IN :ids").bindparams(bindparam("ids", expanding=True))
+            conn.execute(query, {"ids": request_ids})
+        query = text("DELETE FROM trace_info WHERE request_id IN :ids").bindparams(bindparam("ids", expanding=True))
+        conn.execute(query, {"ids": request_ids})
+
+    def run(self, max_batches: int = None, dry_run: bool = False) -> dict:
+        """
+        Run one retention pass.
+
+        Args:
+            max_batches: Optional cap on batches scanned in this pass
+            dry_run: Only count what would be deleted and archived
+
+        Returns:
+            dict: Traces scanned, deleted and archived, per-rule deletions,
+                batches and elapsed seconds
+        """
+        from sqlalchemy import text
+
+        start = time.time()
+        cutoffs = self._cutoffs()
+        result = {"scanned": 0, "deleted": 0, "archived": 0, "by_rule": collections.Counter(), "batches": 0}
+        if not cutoffs:
+            return dict(result, seconds=0.0)
+
+        self.load_experiment_names()
+        upper = max(cutoffs.values())
+        state = self._scan_state(cutoffs)
+        if state["resume_ts"] is None:
+            ts, rid = state["done_ts"], state["done_rid"]
+        else:
+            ts, rid = state["resume_ts"], state["resume_rid"]
+        while max_batches is None or result["batches"] < max_batches:
+            with self.engine.begin() as conn:
+                traces = self._load(conn, ts, rid, upper)
+                if not traces:
+                    state["resume_ts"], state["resume_rid"] = None, None
+                    if not dry_run:
+                        conn.execute(text(UPSERT_STATE_SQL), state)
+                    break
+                expired = self._classify(traces, cutoffs)
+                if dry_run:
+                    archived = [t for t, rule in expired if rule.archives(t["request_id"])]
+                elif expired:
+                    archived = self._archive(conn, expired)
+                    for row in aggregate(t for t, _ in expired):
+                        conn.execute(text(UPSERT_DAILY_SQL), row)
+                    self._delete(conn, [t["request_id"] for t, _ in expired])
+                else:
+                    archived = []
+
+                # Everything scanned below the pass cutoff that is left is kept for good
+                position = (traces[-1]["timestamp_ms"], traces[-1]["request_id"])
+                done = max((state["done_ts"], state["done_rid"]), min(position, (state["pass_cutoff"], "")))
+                state["done_ts"], state["done_rid"] = done
+                if len(traces) < self.batch_size:
+                    state["resume_ts"], state["resume_rid"] = None, None
+                else:
+                    state["resume_ts"], state["resume_rid"] = position
+                if not dry_run:
+                    conn.execute(text(UPSERT_STATE_SQL), state)
+
+            if not dry_run:
+                # Payload files go only after the rows are gone
+                for trace, _ in expired:
+                    _remove_payload(resolve_local_payload(trace["kv"].get("mlflow.artifactLocation")))
+
+            ts, rid = position
+            result["scanned"] += len(traces)
+            result["deleted"] += len(expired)
+            result["archived"] += len(archived)
+            result["by_rule"].update(rule.name for _, rule in expired)
+            result["batches"] += 1
+            log.info("Batch %d: scanned %d, expired %d, archived %d",
+                     result["batches"], len(traces), len(expired), len(archived))
+            if len(traces) < self.batch_size:
+                break
+
+        if result["deleted"] and not dry_run:
+            self.vacuum()
+        result["by_rule"] = dict(result["by_rule"])
+        result["seconds"] = round(time.time() - start, 1)
+        return result
+
+    def vacuum(self):
+        if self.engine.dialect.name != "postgresql":
+            return
+        # VACUUM cannot run inside a transaction block
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for table in ("trace_info", *self.child_tables):
+                conn.exec_driver_sql(f"VACUUM (ANALYZE) {table}")
+
+
+def _remove_payload(directory: str):
+    if not directory or not os.path.isdir(directory):
+        return
+    shutil.rmtree(directory, ignore_errors=True)
+    # .../traces/<request_id>/artifacts: drop the now-empty trace directory too
+    parent = os.path.dirname(directory.rstrip(os.sep))
+    try:
+        os.rmdir(parent)
+    except OSError:
+        pass
+
+
+def main(argv=None):
+    from sqlalchemy import create_engine
+
+    from observability.logs import configure_from_env
+
+    parser = argparse.ArgumentParser(description="Apply the trace retention policy")
+    parser.add_argument("--db-uri", default=MLFLOW_BACKEND_STORE_URI)
+    parser.add_argument("--policy", default=POLICY_FILE, help="JSON policy file (default: errors 90d, others 7d)")
+    parser.add_argument("--archive-root", default=ARCHIVE_ROOT)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted")
+    parser.add_argument("--interval", type=int, default=0,
+                        help="Repeat every N seconds instead of running once")
+    args = parser.parse_args(argv)
+    if configure_from_env("trace-retention", logger="observability") is None:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    retention = RetentionEngine(
+        create_engine(args.db_uri),
+        rules=load_policy(args.policy),
+        archive_root=args.archive_root,
+        batch_size=args.batch_size
+    )
+    while True:
+        try:
+            result = retention.run(max_batches=args.max_batches, dry_run=args.dry_run)
+            log.info("✓ Trace retention%s: %s", " (dry run)" if args.dry_run else "", result)
+        except Exception as e:
+            log.error("Error during trace retention: %s", e)
+            if not args.interval:
+                raise
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
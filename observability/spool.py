@@ -0,0 +1,644 @@
+"""
+Durable write-ahead spool for proxy traces.
+
+The LiteLLM callback appends each finished request to a memory-mapped,
+segment-rotated log on local disk and returns immediately. A background
+shipper replays the log to MLflow in batches, so a restarting MLflow
+server or a saturated Postgres never blocks the request path.
+
+Segment layout: a preallocated file of fixed size holding back-to-back
+records, each framed as ``<u32 length><u32 crc32><payload>``. A zero
+length marks the end of written data. The header is written after the
+payload, so a reader never observes a half-written record as valid.
+
+Delivery is at-least-once: the shipper advances its checkpoint only after
+a batch is accepted. Every record carries a ``trace_id`` that the MLflow
+sink uses to skip traces that were already shipped before a crash.
+
+Usage:
+    python -m observability.spool ship     # run the shipper
+    python -m observability.spool stats    # show spool backlog
+    python -m observability.spool collect [socket]   # single writer for proxy workers
+"""
+
+import asyncio
+import json
+import logging
+import mmap
+import os
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+
+from observability.settings import SPOOL_DIR, MLFLOW_TRACKING_URI, TRACE_EXPERIMENT_NAME
+
+
+log = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_SIZE = 16 * 1024 * 1024
+MAX_SEGMENTS = 64
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{12})\.log$")
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def segment_name(seq: int) -> str:
+    return f"segment-{seq:012d}.log"
+
+
+def list_segments(directory: str):
+    """
+    List segment sequence numbers in a spool directory, oldest first.
+
+    Args:
+        directory: Spool directory
+
+    Returns:
+        list: Sorted segment sequence numbers
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    seqs = []
+    for name in names:
+        match = SEGMENT_PATTERN.match(name)
+        if match:
+            seqs.append(int(match.group(1)))
+    return sorted(seqs)
+
+
+def iter_records(buf, offset: int = 0):
+    """
+    Iterate over valid records in a segment buffer.
+
+    Stops at the end-of-data marker, at the end of the buffer, or at the
+    first record whose checksum does not match (a torn write).
+
+    Args:
+        buf: bytes-like segment contents
+        offset: Byte offset to start from
+
+    Yields:
+        tuple: (payload bytes, offset of the next record)
+    """
+    size = len(buf)
+    while offset + RECORD_HEADER.size <= size:
+        length, crc = RECORD_HEADER.unpack_from(buf, offset)
+        if length == 0:
+            return
+        start = offset + RECORD_HEADER.size
+        end = start + length
+        if end > size:
+            return
+        payload = bytes(buf[start:end])
+        if zlib.crc32(payload) != crc:
+            return
+        yield payload, end
+        offset = end
+
+
+class SpoolWriter:
+    """
+    Append-only writer for the trace spool.
+
+    Safe to share between threads. Each append is a JSON encode, a CRC and
+    a copy into the mapped segment; no syscalls happen on the hot path
+    except when a segment rotates.
+    """
+
+    def __init__(self, directory: str = SPOOL_DIR, segment_size: int = SEGMENT_SIZE,
+                 max_segments: int = MAX_SEGMENTS):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.dropped_segments = 0
+        self._lock = threading.Lock()
+        self._map = None
+        self._seq = 0
+        self._offset = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open_tail()
+
+    def _open_tail(self):
+        seqs = list_segments(self.directory)
+        if not seqs:
+            self._open_segment(0)
+            return
+        self._open_segment(seqs[-1])
+        # Resume after the last valid record; a torn tail seals the segment
+        offset = 0
+        for _, offset in iter_records(self._map):
+            pass
+        self._offset = offset
+        if offset + RECORD_HEADER.size <= self.segment_size:
+            length, _ = RECORD_HEADER.unpack_from(self._map, offset)
+            if length != 0:
+                self._rotate()
+
+    def _open_segment(self, seq: int):
+        path = os.path.join(self.directory, segment_name(seq))
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < self.segment_size:
+                os.ftruncate(fd, self.segment_size)
+            self._map = mmap.mmap(fd, self.segment_size, access=mmap.ACCESS_WRITE)
+        finally:
+            os.close(fd)
+        self._seq = seq
+        self._offset = 0
+
+    def _rotate(self):
+        self._map.flush()
+        self._map.close()
+        self._open_segment(self._seq + 1)
+        self._enforce_limit()
+
+    def _enforce_limit(self):
+        # Bound disk usage by dropping the oldest sealed segments
+        seqs = list_segments(self.directory)
+        while len(seqs) > self.max_segments:
+            oldest = seqs.pop(0)
+            try:
+                os.remove(os.path.join(self.directory, segment_name(oldest)))
+                self.dropped_segments += 1
+            except FileNotFoundError:
+                pass
+
+    def append(self, record: dict) -> str:
+        """
+        Append a trace record to the spool.
+
+        Args:
+            record: JSON-serializable trace payload. A ``trace_id`` is
+                assigned if missing.
+
+        Returns:
+            str: The record's trace id
+        """
+        trace_id = record.get("trace_id") or uuid.uuid4().hex
+        record["trace_id"] = trace_id
+        payload = json.dumps(record, separators=(",", ":"), default=str).encode("utf-8")
+        needed = RECORD_HEADER.size + len(payload)
+        # Keep room for the end-of-data marker after the record
+        if needed + RECORD_HEADER.size > self.segment_size:
+            raise ValueError(f"Record of {len(payload)} bytes exceeds spool segment size")
+
+        with self._lock:
+            if self._offset + needed + RECORD_HEADER.size > self.segment_size:
+                self._rotate()
+            start = self._offset + RECORD_HEADER.size
+            self._map[start:start + len(payload)] = payload
+            RECORD_HEADER.pack_into(self._map, self._offset, len(payload), zlib.crc32(payload))
+            self._offset += needed
+        return trace_id
+
+    def flush(self):
+        """Flush the active segment to disk."""
+        with self._lock:
+            if self._map is not None:
+                self._map.flush()
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.flush()
+                self._map.close()
+                self._map = None
+
+
+class SpoolReader:
+    """
+    Checkpointed reader over spool segments.
+
+    The checkpoint records the (segment, offset) of the first record that
+    has not been acknowledged yet and is persisted atomically.
+    """
+
+    def __init__(self, directory: str = SPOOL_DIR):
+        self.directory = directory
+        self.checkpoint_path = os.path.join(directory, CHECKPOINT_FILE)
+        self.segment, self.offset = self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                data = json.load(f)
+            return int(data["segment"]), int(data["offset"])
+        except (FileNotFoundError, ValueError, KeyError):
+            return 0, 0
+
+    def read_batch(self, max_records: int = 500):
+        """
+        Read up to ``max_records`` unacknowledged records.
+
+        Args:
+            max_records: Maximum number of records to return
+
+        Returns:
+            tuple: (list of record dicts, position after the batch)
+        """
+        records = []
+        position = (self.segment, self.offset)
+        for seq in list_segments(self.directory):
+            if seq < position[0]:
+                continue
+            if seq > position[0]:
+                # Checkpointed segment was dropped or fully read
+                position = (seq, 0)
+            path = os.path.join(self.directory, segment_name(seq))
+            try:
+                with open(path, "rb") as f:
+                    buf = f.read()
+            except FileNotFoundError:
+                continue
+            for payload, end in iter_records(buf, position[1]):
+                try:
+                    records.append(json.loads(payload))
+                except ValueError:
+                    pass
+                position = (seq, end)
+                if len(records) >= max_records:
+                    return records, position
+        return records, position
+
+    def commit(self, position):
+        """
+        Acknowledge all records before ``position`` and delete fully
+        shipped segments.
+
+        Args:
+            position: (segment, offset) returned by read_batch
+        """
+        self.segment, self.offset = position
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"segment": self.segment, "offset": self.offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+        for seq in list_segments(self.directory):
+            if seq >= self.segment:
+                break
+            try:
+                os.remove(os.path.join(self.directory, segment_name(seq)))
+            except FileNotFoundError:
+                pass
+
+    def backlog(self) -> int:
+        """
+        Count records not yet acknowledged.
+
+        Returns:
+            int: Number of pending records
+        """
+        count = 0
+        for seq in list_segments(self.directory):
+            if seq < self.segment:
+                continue
+            offset = self.offset if seq == self.segment else 0
+            try:
+                with open(os.path.join(self.directory, segment_name(seq)), "rb") as f:
+                    buf = f.read()
+            except FileNotFoundError:
+                continue
+            count += sum(1 for _ in iter_records(buf, offset))
+        return count
+
+
+class MlflowTraceSink:
+    """
+    Ships spooled records to MLflow as traces.
+
+    Each trace is tagged with ``spool.trace_id``. When ``dedupe`` is set
+    the sink first checks whether that id already exists, which covers
+    batches that may have been partially shipped before a crash.
+    """
+
+    def __init__(self, tracking_uri: str = MLFLOW_TRACKING_URI,
+                 experiment_name: str = TRACE_EXPERIMENT_NAME):
+        import mlflow
+        from mlflow.tracking import MlflowClient
+
+        mlflow.set_tracking_uri(tracking_uri)
+        self.client = MlflowClient(tracking_uri)
+        experiment = self.client.get_experiment_by_name(experiment_name)
+        if experiment:
+            self.experiment_id = experiment.experiment_id
+        else:
+            self.experiment_id = self.client.create_experiment(experiment_name)
+
+    def _exists(self, trace_id: str) -> bool:
+        traces = self.client.search_traces(
+            experiment_ids=[self.experiment_id],
+            filter_string=f"tags.`spool.trace_id` = '{trace_id}'",
+            max_results=1
+        )
+        return len(traces) > 0
+
+    def ship(self, records, dedupe: bool = False):
+        """
+        Log a batch of records as MLflow traces.
+
+        Args:
+            records: List of spooled record dicts
+            dedupe: Skip records whose trace id is already in MLflow
+        """
+        for record in records:
+            if dedupe and self._exists(record["trace_id"]):
+                continue
+            self._log_trace(record)
+
+    def _log_trace(self, record: dict):
+        tags = {"spool.trace_id": record["trace_id"]}
+        metadata = record.get("metadata") or {}
+        for key in ("mlflow.trace.user", "mlflow.trace.session"):
+            if metadata.get(key):
+                tags[key] = str(metadata[key])
+
+        attributes = {
+            "model": record.get("model"),
+            "prompt_tokens": record.get("prompt_tokens"),
+            "completion_tokens": record.get("completion_tokens"),
+            "total_tokens": record.get("total_tokens"),
+            "cached_tokens": record.get("cached_tokens"),
+            "response_cost": record.get("response_cost"),
+            "input_cost": record.get("input_cost"),
+            "output_cost": record.get("output_cost"),
+            "ttft_ms": _ttft_ms(record),
+            # Set by observability.callbacks.reload_handler
+            "config_generation": metadata.get("config_generation"),
+        }
+        # Set by observability.callbacks.relay_handler on relayed streams
+        attributes.update({k: v for k, v in metadata.items() if k.startswith("relay.")})
+        attributes = {k: v for k, v in attributes.items() if v is not None}
+        # Mirror the flat analytics fields as tags so the exporter can read
+        # them from the backend store without parsing span payloads
+        for key, value in attributes.items():
+            tags[f"obs.{key}"] = str(value)
+
+        start_ns = int(float(record.get("start_time", time.time())) * 1e9)
+        end_ns = int(float(record.get("end_time", time.time())) * 1e9)
+
+        span = self.client.start_trace(
+            name=record.get("call_type") or "litellm_completion",
+            inputs=dict(record.get("model_parameters") or {}, messages=record.get("messages")),
+            attributes=attributes,
+            tags=tags,
+            experiment_id=self.experiment_id,
+            start_time_ns=start_ns
+        )
+        request_id = getattr(span, "trace_id", None) or span.request_id
+        self.client.end_trace(
+            request_id,
+            outputs=record.get("response"),
+            status="ERROR" if record.get("status") == "failure" else "OK",
+            end_time_ns=end_ns
+        )
+
+
+def _ttft_ms(record: dict):
+    try:
+        first_chunk = float(record["completion_start_time"])
+        return round((first_chunk - float(record["start_time"])) * 1000, 3)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class SpoolShipper:
+    """
+    Background thread that drains the spool into a sink.
+
+    Failures back off exponentially and never drop data; the next attempt
+    re-reads from the last checkpoint with deduplication enabled.
+    """
+
+    def __init__(self, sink, directory: str = SPOOL_DIR, batch_size: int = 200,
+                 poll_interval: float = 0.5, max_backoff: float = 30.0):
+        self.sink = sink
+        self.reader = SpoolReader(directory)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.shipped = 0
+        self.failures = 0
+        # The previous process may have shipped part of the first batch
+        self._dedupe = True
+        self._stop = threading.Event()
+        self._thread = None
+
+    def ship_once(self) -> int:
+        """
+        Ship a single batch.
+
+        Returns:
+            int: Number of records acknowledged
+        """
+        records, position = self.reader.read_batch(self.batch_size)
+        if position == (self.reader.segment, self.reader.offset):
+            return 0
+        try:
+            self.sink.ship(records, dedupe=self._dedupe)
+        except Exception:
+            self._dedupe = True
+            self.failures += 1
+            raise
+        self._dedupe = False
+        self.reader.commit(position)
+        self.shipped += len(records)
+        return len(records)
+
+    def run(self):
+        backoff = self.poll_interval
+        while not self._stop.is_set():
+            try:
+                shipped = self.ship_once()
+                backoff = self.poll_interval
+            except Exception as e:
+                log.warning("Error shipping traces: %s", e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            if shipped < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="spool-shipper", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+FRAME_HEADER = struct.Struct("<I")
+ACK = b"\x01"
+
+
+class SpoolForwarder:
+    """
+    SpoolWriter stand-in for proxy workers that sends records to a collector.
+
+    A spool directory has a single writer. With several proxy workers
+    (observability.workers) every worker forwards its records over a
+    local socket to the one SpoolCollector process that owns the spool.
+    Each record is framed as ``<u32 length><payload>`` and acknowledged
+    once it is in the spool, so append() returning means the record is
+    as durable as with a local SpoolWriter.
+
+    Args:
+        path: Collector's Unix socket
+        timeout: Seconds to wait for the collector's acknowledgement
+    """
+
+    def __init__(self, path: str, timeout: float = 2.0):
+        self.path = path
+        self.timeout = timeout
+        self.sent = 0
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self._sock = sock
+
+    def _send(self, frame: bytes):
+        if self._sock is None:
+            self._connect()
+        self._sock.sendall(frame)
+        if self._sock.recv(1) != ACK:
+            raise ConnectionError("Spool collector closed the connection")
+
+    def append(self, record: dict) -> str:
+        """
+        Send a trace record to the collector.
+
+        Returns:
+            str: The record's trace id
+        """
+        trace_id = record.get("trace_id") or uuid.uuid4().hex
+        record["trace_id"] = trace_id
+        payload = json.dumps(record, separators=(",", ":"), default=str).encode("utf-8")
+        frame = FRAME_HEADER.pack(len(payload)) + payload
+        with self._lock:
+            try:
+                self._send(frame)
+            except OSError:
+                # Collector restarted: reconnect once; a duplicate is
+                # skipped by the shipper's trace id check
+                self.close()
+                self._send(frame)
+            self.sent += 1
+        return trace_id
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+
+class SpoolCollector:
+    """
+    Single spool writer receiving records from SpoolForwarders.
+
+    Args:
+        path: Unix socket to listen on (a stale socket file is replaced)
+        writer: SpoolWriter to append to
+    """
+
+    def __init__(self, path: str, writer: SpoolWriter = None):
+        self.path = path
+        self.writer = writer or SpoolWriter()
+        self.received = 0
+        self.errors = 0
+        self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                (length,) = FRAME_HEADER.unpack(header)
+                payload = await reader.readexactly(length)
+                try:
+                    self.writer.append(json.loads(payload))
+                    self.received += 1
+                except Exception as e:
+                    # Acknowledged anyway: resending a bad record cannot help
+                    self.errors += 1
+                    log.warning("Error spooling forwarded record: %s", e)
+                writer.write(ACK)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        return self._server
+
+    async def serve(self):
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        self.writer.close()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "ship"
+
+    if command == "stats":
+        reader = SpoolReader()
+        print(f"Spool directory: {SPOOL_DIR}")
+        print(f"Segments: {len(list_segments(SPOOL_DIR))}")
+        print(f"Checkpoint: segment {reader.segment}, offset {reader.offset}")
+        print(f"Pending records: {reader.backlog()}")
+    elif command == "ship":
+        from observability.logs import configure_from_env
+
+        configure_from_env("spool-shipper")
+        shipper = SpoolShipper(MlflowTraceSink())
+        print(f"Shipping traces from {SPOOL_DIR} to {MLFLOW_TRACKING_URI}")
+        try:
+            shipper.run()
+        except KeyboardInterrupt:
+            pass
+        print(f"Shipped {shipper.shipped} traces")
+    elif command == "collect":
+        from observability.logs import configure_from_env
+
+        configure_from_env("spool-collector")
+        socket_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(SPOOL_DIR, "collector.sock")
+        collector = SpoolCollector(socket_path)
+        print(f"Collecting traces on {socket_path} into {SPOOL_DIR}")
+        try:
+            asyncio.run(collector.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            collector.close()
+        print(f"Collected {collector.received} traces")
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(1)
@@ -0,0 +1,340 @@
+"""
+Concurrent parameter sweeps logged as MLflow runs.
+
+A sweep expands a parameter grid (e.g. temperature x top_p x max_tokens
+x penalties x prompts) into cells and runs them against the proxy with an
+AsyncOpenAI client under a concurrency cap. Identical cells run once, and
+results are cached on disk (``data/sweeps/cache.jsonl``), so a re-run only
+calls the model for cells it has not seen. Pass ``refresh=True`` to bypass
+the cache.
+
+Each cell is logged as a child run of one parent sweep run. Params,
+metrics (latency, tokens, cost) and tags for a cell go in a single
+``log_batch`` call. Finished cells are logged from a background thread in
+groups, and the price table load and cache writes also run off the event
+loop, so neither MLflow round trips nor disk I/O hold up the requests.
+
+Usage:
+    python -m observability.sweep --grid grid.json --concurrency 32
+
+grid.json:
+    {"temperature": [0.0, 0.7, 1.0], "top_p": [0.5, 1.0], "max_tokens": [50, 100],
+     "prompt": ["Describe a sunset.", "Explain MLflow in detail."]}
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+
+from observability.cost import get_cost_engine
+from observability.settings import DATA_DIR, MLFLOW_TRACKING_URI
+
+
+SWEEP_DIR = os.path.join(DATA_DIR, "sweeps")
+DEFAULT_EXPERIMENT = "Parameter-Sweeps"
+
+# Mirrors tests/test_parameters.py
+DEFAULT_GRID = {
+    "temperature": [0.0, 0.3, 0.7, 1.0],
+    "top_p": [0.5, 0.9, 1.0],
+    "max_tokens": [50, 100],
+    "prompt": ["Generate a creative sentence about clouds.", "Explain MLflow in detail."],
+}
+
+
+def expand_grid(grid: dict) -> list:
+    """
+    Expand a parameter grid into cells, in a stable order.
+
+    Args:
+        grid: Parameter name -> list of values. ``prompt`` values become a
+            single user message; ``messages`` values are used as given.
+
+    Returns:
+        list: One dict per combination
+    """
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def cell_key(model: str, cell: dict) -> str:
+    """
+    Stable cache key for a model and cell.
+    """
+    canonical = json.dumps({"model": model, **cell}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+def cell_request(model: str, cell: dict) -> dict:
+    request = {k: v for k, v in cell.items() if k not in ("prompt", "messages")}
+    if "messages" in cell:
+        request["messages"] = cell["messages"]
+    else:
+        request["messages"] = [{"role": "user", "content": cell["prompt"]}]
+    request["model"] = model
+    return request
+
+
+class SweepCache:
+    """
+    Append-only JSONL cache of cell results.
+
+    Args:
+        path: Cache file
+    """
+
+    def __init__(self, path: str = os.path.join(SWEEP_DIR, "cache.jsonl")):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn last line after a crash
+                        continue
+                    self.entries[entry["key"]] = entry
+
+    def get(self, key: str):
+        return self.entries.get(key)
+
+    def put(self, result: dict):
+        with self._lock:
+            self.entries[result["key"]] = result
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(result, default=str) + "\n")
+
+
+class MlflowSweepLogger:
+    """
+    Logs cells as child runs of a sweep run, from a background thread.
+
+    Args:
+        experiment_name: Experiment receiving the runs
+        tracking_uri: MLflow server
+        batch_size: Cells logged per background flush
+        client: MlflowClient (created from tracking_uri by default)
+    """
+
+    def __init__(self, experiment_name: str = DEFAULT_EXPERIMENT, tracking_uri: str = MLFLOW_TRACKING_URI,
+                 batch_size: int = 50, client=None):
+        if client is None:
+            from mlflow.tracking import MlflowClient
+
+            client = MlflowClient(tracking_uri)
+        self.client = client
+        self.batch_size = batch_size
+        experiment = client.get_experiment_by_name(experiment_name)
+        self.experiment_id = experiment.experiment_id if experiment else client.create_experiment(experiment_name)
+        self.parent_run_id = None
+        self.logged = 0
+        self._pending = []
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="sweep-log")
+        self._futures = []
+
+    def start(self, name: str, grid: dict, model: str):
+        run = self.client.create_run(self.experiment_id, run_name=name, tags={"sweep.model": model})
+        self.parent_run_id = run.info.run_id
+        self.client.log_batch(self.parent_run_id, params=self._params({
+            "grid": json.dumps(grid, sort_keys=True)[:500],
+            "model": model,
+        }))
+
+    @staticmethod
+    def _params(values: dict):
+        from mlflow.entities import Param
+
+        return [Param(key, str(value)[:500]) for key, value in values.items()]
+
+    def _log_cells(self, results):
+        from mlflow.entities import Metric, RunTag
+
+        now = int(time.time() * 1000)
+        for result in results:
+            tags = {"mlflow.parentRunId": self.parent_run_id, "sweep.cell_key": result["key"],
+                    "sweep.cached": str(result.get("cached", False)).lower()}
+            run = self.client.create_run(self.experiment_id, run_name=f"cell-{result['index']}", tags=tags)
+            params = {k: (v if isinstance(v, (int, float)) else json.dumps(v)) for k, v in result["cell"].items()}
+            metrics = [
+                Metric(name, float(result[name]), now, 0)
+                for name in ("latency_ms", "prompt_tokens", "completion_tokens", "total_tokens", "cost")
+                if result.get(name) is not None
+            ]
+            self.client.log_batch(
+                run.info.run_id,
+                metrics=metrics,
+                params=self._params(params),
+                tags=[RunTag("sweep.error", result["error"][:500])] if result.get("error") else []
+            )
+            self.client.set_terminated(run.info.run_id, "FAILED" if result.get("error") else "FINISHED")
+        self.logged += len(results)
+
+    def add(self, result: dict):
+        self._pending.append(result)
+        if len(self._pending) >= self.batch_size:
+            self._submit()
+
+    def _submit(self):
+        if self._pending:
+            batch, self._pending = self._pending, []
+            self._futures.append(self._executor.submit(self._log_cells, batch))
+
+    def finish(self, summary: dict):
+        """
+        Log remaining cells and the sweep summary, then close the parent run.
+        """
+        from mlflow.entities import Metric
+
+        self._submit()
+        for future in self._futures:
+            future.result()
+        now = int(time.time() * 1000)
+        self.client.log_batch(self.parent_run_id, metrics=[
+            Metric(name, float(value), now, 0) for name, value in summary.items()
+        ])
+        self.client.set_terminated(self.parent_run_id, "FINISHED")
+        self._executor.shutdown()
+
+
+class SweepRunner:
+    """
+    Runs sweep cells concurrently against an OpenAI-compatible client.
+
+    Args:
+        client: openai.AsyncOpenAI pointed at the proxy
+        model: Model name
+        concurrency: Maximum requests in flight
+        cache: SweepCache (None disables caching)
+        logger: MlflowSweepLogger (None disables MLflow logging)
+    """
+
+    def __init__(self, client, model: str, concurrency: int = 16, cache: SweepCache = None,
+                 logger: MlflowSweepLogger = None):
+        self.client = client
+        self.model = model
+        self.concurrency = concurrency
+        self.cache = cache
+        self.logger = logger
+        self.calls = 0
+        self.cost_engine = None
+
+    async def _call(self, key: str, cell: dict) -> dict:
+        result = {"key": key, "cell": cell}
+        began = time.perf_counter()
+        try:
+            response = await self.client.chat.completions.create(**cell_request(self.model, cell))
+            self.calls += 1
+            usage = response.usage
+            result.update({
+                "content": response.choices[0].message.content,
+                "finish_reason": response.choices[0].finish_reason,
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "total_tokens": usage.total_tokens,
+                "cost": sum(self.cost_engine.cost(self.model, usage.prompt_tokens, usage.completion_tokens)),
+            })
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency_ms"] = round((time.perf_counter() - began) * 1000, 2)
+        if self.cache is not None and "error" not in result:
+            await asyncio.to_thread(self.cache.put, result)
+        return result
+
+    async def run(self, grid: dict, name: str = None, refresh: bool = False) -> list:
+        """
+        Run every cell of a grid.
+
+        Args:
+            grid: Parameter grid (see expand_grid)
+            name: Sweep run name
+            refresh: Ignore cached results
+
+        Returns:
+            list: One result dict per cell, in grid order
+        """
+        cells = expand_grid(grid)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        in_flight = {}
+        if self.cost_engine is None:
+            # The first engine loads the price table (and imports litellm)
+            self.cost_engine = await asyncio.to_thread(get_cost_engine)
+        if self.logger is not None:
+            await asyncio.to_thread(self.logger.start, name or f"sweep-{int(time.time())}", grid, self.model)
+
+        async def run_cell(key, cell):
+            async with semaphore:
+                return await self._call(key, cell)
+
+        async def resolve(index, cell):
+            key = cell_key(self.model, cell)
+            cached = None if refresh or self.cache is None else self.cache.get(key)
+            if cached is not None:
+                result = dict(cached, cached=True)
+            else:
+                # Identical cells in one sweep share a single request
+                if key not in in_flight:
+                    in_flight[key] = asyncio.ensure_future(run_cell(key, cell))
+                result = dict(await in_flight[key], cached=False)
+            result["index"] = index
+            if self.logger is not None:
+                self.logger.add(result)
+            return result
+
+        began = time.perf_counter()
+        results = await asyncio.gather(*(resolve(i, cell) for i, cell in enumerate(cells)))
+        if self.logger is not None:
+            errors = sum(1 for r in results if r.get("error"))
+            await asyncio.to_thread(self.logger.finish, {
+                "cells": len(results),
+                "errors": errors,
+                "model_calls": self.calls,
+                "total_cost": sum(r.get("cost") or 0.0 for r in results if not r.get("cached")),
+                "wall_time_s": time.perf_counter() - began,
+            })
+        return results
+
+
+def main(argv=None):
+    from openai import AsyncOpenAI
+
+    parser = argparse.ArgumentParser(description="Concurrent parameter sweep")
+    parser.add_argument("--grid", help="JSON file with the parameter grid (default mirrors test_parameters)")
+    parser.add_argument("--model", default="gemini/gemini-2.0-flash")
+    parser.add_argument("--base-url", default=os.environ.get("LITELLM_PROXY_URL", "http://localhost:4000"))
+    parser.add_argument("--api-key", default=os.environ.get("LITELLM_MASTER_KEY", "sk-1234"))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--experiment", default=DEFAULT_EXPERIMENT)
+    parser.add_argument("--name")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached cell results")
+    args = parser.parse_args(argv)
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+
+    runner = SweepRunner(
+        AsyncOpenAI(api_key=args.api_key, base_url=args.base_url),
+        args.model,
+        concurrency=args.concurrency,
+        cache=SweepCache(),
+        logger=MlflowSweepLogger(args.experiment)
+    )
+    began = time.perf_counter()
+    results = asyncio.run(runner.run(grid, name=args.name, refresh=args.refresh))
+    errors = sum(1 for r in results if r.get("error"))
+    print(f"✓ {len(results)} cells ({runner.calls} model calls, {errors} errors) "
+          f"in {time.perf_counter() - began:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
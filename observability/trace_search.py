@@ -0,0 +1,476 @@
+"""
+Accelerated trace search over the MLflow backend store.
+
+On-call searches are mostly "traces of this user / session / status in
+this time range, newest first". MLflow answers them by joining
+``trace_tags`` and ``trace_request_metadata`` with per-key filters and
+paginating with OFFSET, so deep pages and busy users get slower as the
+store grows.
+
+This module keeps a narrow side table, ``obs_trace_index``, with one row
+per trace and the common keys (user, session, model) materialized as
+indexed columns. Triggers on the MLflow tables keep it current (Postgres);
+``backfill`` fills it for existing traces. TraceSearch queries it with
+keyset pagination on (timestamp_ms, request_id), and SearchCache keeps
+results for a short TTL. After the TTL a cached first page is refreshed
+incrementally: only traces newer than the cached head, plus cached traces
+still IN_PROGRESS, are read again.
+
+Usage:
+    python -m observability.trace_search install
+    python -m observability.trace_search search --user user_042 --limit 50
+    python -m observability.trace_search --db-uri postgresql://.../mlflow_bench bench --seed 10000000
+"""
+
+import argparse
+import base64
+import collections
+import threading
+import time
+
+from observability.export import build_trace_page_query
+from observability.settings import MLFLOW_BACKEND_STORE_URI
+
+
+# Indexed column -> tag / request metadata key
+INDEXED_KEYS = {
+    "user_id": "mlflow.trace.user",
+    "session_id": "mlflow.trace.session",
+    "model": "obs.model",
+}
+COLUMNS = ("request_id", "experiment_id", "timestamp_ms", "execution_time_ms", "status") + tuple(INDEXED_KEYS)
+
+CREATE_INDEX_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS obs_trace_index (
+    request_id VARCHAR(50) PRIMARY KEY REFERENCES trace_info (request_id) ON DELETE CASCADE,
+    experiment_id INTEGER NOT NULL,
+    timestamp_ms BIGINT NOT NULL,
+    execution_time_ms BIGINT,
+    status VARCHAR(50),
+    user_id VARCHAR(250),
+    session_id VARCHAR(250),
+    model VARCHAR(250)
+);
+CREATE INDEX IF NOT EXISTS obs_trace_index_experiment
+    ON obs_trace_index (experiment_id, timestamp_ms DESC, request_id DESC);
+CREATE INDEX IF NOT EXISTS obs_trace_index_user
+    ON obs_trace_index (user_id, timestamp_ms DESC, request_id DESC) WHERE user_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS obs_trace_index_session
+    ON obs_trace_index (session_id, timestamp_ms DESC, request_id DESC) WHERE session_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS obs_trace_index_status
+    ON obs_trace_index (experiment_id, status, timestamp_ms DESC, request_id DESC);
+"""
+
+INSTALL_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION obs_trace_index_info() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO obs_trace_index (request_id, experiment_id, timestamp_ms, execution_time_ms, status)
+    VALUES (NEW.request_id, NEW.experiment_id, NEW.timestamp_ms, NEW.execution_time_ms, NEW.status)
+    ON CONFLICT (request_id) DO UPDATE SET
+        execution_time_ms = EXCLUDED.execution_time_ms,
+        status = EXCLUDED.status;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION obs_trace_index_kv() RETURNS trigger AS $$
+BEGIN
+    UPDATE obs_trace_index SET
+        user_id = CASE WHEN NEW.key = 'mlflow.trace.user' THEN NEW.value ELSE user_id END,
+        session_id = CASE WHEN NEW.key = 'mlflow.trace.session' THEN NEW.value ELSE session_id END,
+        model = CASE WHEN NEW.key = 'obs.model' THEN NEW.value ELSE model END
+    WHERE request_id = NEW.request_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS obs_trace_index_info ON trace_info;
+CREATE TRIGGER obs_trace_index_info AFTER INSERT OR UPDATE ON trace_info
+FOR EACH ROW EXECUTE FUNCTION obs_trace_index_info();
+
+DROP TRIGGER IF EXISTS obs_trace_index_tags ON trace_tags;
+CREATE TRIGGER obs_trace_index_tags AFTER INSERT OR UPDATE ON trace_tags
+FOR EACH ROW WHEN (NEW.key IN ('mlflow.trace.user', 'mlflow.trace.session', 'obs.model'))
+EXECUTE FUNCTION obs_trace_index_kv();
+
+DROP TRIGGER IF EXISTS obs_trace_index_metadata ON trace_request_metadata;
+CREATE TRIGGER obs_trace_index_metadata AFTER INSERT OR UPDATE ON trace_request_metadata
+FOR EACH ROW WHEN (NEW.key IN ('mlflow.trace.user', 'mlflow.trace.session', 'obs.model'))
+EXECUTE FUNCTION obs_trace_index_kv();
+"""
+
+INSERT_INDEX_SQL = f"""
+INSERT INTO obs_trace_index ({", ".join(COLUMNS)})
+VALUES ({", ".join(":" + c for c in COLUMNS)})
+ON CONFLICT (request_id) DO NOTHING
+"""
+
+# What the MLflow store does for a tag-filtered search, for the benchmark
+BASELINE_SEARCH_SQL = """
+SELECT ti.request_id, ti.timestamp_ms, ti.status
+FROM trace_info ti
+WHERE ti.experiment_id = :experiment_id
+  AND EXISTS (SELECT 1 FROM trace_tags t
+              WHERE t.request_id = ti.request_id AND t.key = 'mlflow.trace.user' AND t.value = :user_id)
+ORDER BY ti.timestamp_ms DESC, ti.request_id DESC
+LIMIT :limit OFFSET :offset
+"""
+
+
+def encode_cursor(timestamp_ms: int, request_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp_ms}:{request_id}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    timestamp_ms, request_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split(":", 1)
+    return int(timestamp_ms), request_id
+
+
+def build_search_query(filters: dict, cursor: bool = False, newer_than: bool = False) -> str:
+    """
+    Build the index search query for the given filters.
+
+    Args:
+        filters: Subset of experiment_id, user_id, session_id, model,
+            status, start_ms, end_ms that is set
+        cursor: Add the keyset condition (:cursor_ts, :cursor_rid)
+        newer_than: Only rows newer than (:head_ts, :head_rid)
+
+    Returns:
+        str: SQL text; the caller binds the filter values and :limit
+    """
+    conditions = []
+    for column in ("experiment_id", "user_id", "session_id", "model", "status"):
+        if column in filters:
+            conditions.append(f"{column} = :{column}")
+    if "start_ms" in filters:
+        conditions.append("timestamp_ms >= :start_ms")
+    if "end_ms" in filters:
+        conditions.append("timestamp_ms < :end_ms")
+    if cursor:
+        conditions.append("(timestamp_ms, request_id) < (:cursor_ts, :cursor_rid)")
+    if newer_than:
+        conditions.append("(timestamp_ms, request_id) > (:head_ts, :head_rid)")
+    where = " AND ".join(conditions) or "1 = 1"
+    return f"""
+SELECT {", ".join(COLUMNS)}
+FROM obs_trace_index
+WHERE {where}
+ORDER BY timestamp_ms DESC, request_id DESC
+LIMIT :limit
+"""
+
+
+class SearchCache:
+    """
+    Short-TTL cache of search pages.
+
+    Args:
+        ttl_seconds: Age after which an entry is refreshed
+        max_entries: LRU bound
+        clock: Time source, overridable in tests
+    """
+
+    def __init__(self, ttl_seconds: float = 5.0, max_entries: int = 1024, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.refreshes = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns:
+            tuple: (rows, fresh) or (None, False) when absent
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            self._entries.move_to_end(key)
+            rows, stored_at = entry
+            return rows, self.clock() - stored_at < self.ttl_seconds
+
+    def put(self, key, rows):
+        with self._lock:
+            self._entries[key] = (rows, self.clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class TraceSearch:
+    """
+    Trace search over obs_trace_index with keyset pagination and caching.
+
+    Args:
+        engine: SQLAlchemy engine on the MLflow backend store
+        cache: SearchCache (None disables caching)
+    """
+
+    def __init__(self, engine, cache: SearchCache = None):
+        self.engine = engine
+        self.cache = cache
+
+    def _query(self, sql: str, params: dict) -> list:
+        from sqlalchemy import text
+
+        with self.engine.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(text(sql), params)]
+
+    def search(self, experiment_id=None, user_id: str = None, session_id: str = None, model: str = None,
+               status: str = None, start_ms: int = None, end_ms: int = None, limit: int = 100,
+               cursor: str = None):
+        """
+        Search traces, newest first.
+
+        Args:
+            cursor: Value returned as next_cursor by the previous page
+
+        Returns:
+            tuple: (rows, next_cursor); next_cursor is None on the last page
+        """
+        filters = {
+            key: value for key, value in (
+                ("experiment_id", experiment_id), ("user_id", user_id), ("session_id", session_id),
+                ("model", model), ("status", status), ("start_ms", start_ms), ("end_ms", end_ms),
+            ) if value is not None
+        }
+        cache_key = (tuple(sorted(filters.items())), limit, cursor)
+        rows = None
+        fresh = False
+        if self.cache is not None:
+            cached, fresh = self.cache.get(cache_key)
+            if cached is not None and fresh:
+                self.cache.hits += 1
+                rows = cached
+            elif cached is not None and cursor is None and status is None:
+                # A status filter can gain older traces as they finish, so
+                # only unfiltered first pages are refreshed incrementally
+                self.cache.refreshes += 1
+                rows = self._refresh_head(filters, limit, cached)
+            else:
+                self.cache.misses += 1
+
+        if rows is None:
+            params = dict(filters, limit=limit)
+            if cursor:
+                params["cursor_ts"], params["cursor_rid"] = decode_cursor(cursor)
+            rows = self._query(build_search_query(filters, cursor=bool(cursor)), params)
+        if self.cache is not None and not fresh:
+            self.cache.put(cache_key, rows)
+
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = encode_cursor(rows[-1]["timestamp_ms"], rows[-1]["request_id"])
+        return rows, next_cursor
+
+    def _refresh_head(self, filters: dict, limit: int, cached: list) -> list:
+        """
+        Update a cached first page with traces newer than its head and the
+        current state of cached traces that were still in progress.
+        """
+        if not cached:
+            return self._query(build_search_query(filters), dict(filters, limit=limit))
+        head = cached[0]
+        newer = self._query(
+            build_search_query(filters, newer_than=True),
+            dict(filters, limit=limit, head_ts=head["timestamp_ms"], head_rid=head["request_id"])
+        )
+        rows = newer + cached
+        in_progress = [row["request_id"] for row in rows if row["status"] == "IN_PROGRESS"]
+        if in_progress:
+            from sqlalchemy import bindparam, text
+
+            query = text(f"SELECT {', '.join(COLUMNS)} FROM obs_trace_index WHERE request_id IN :ids")
+            query = query.bindparams(bindparam("ids", expanding=True))
+            with self.engine.connect() as conn:
+                current = {row.request_id: dict(row._mapping) for row in conn.execute(query, {"ids": in_progress})}
+            rows = [current.get(row["request_id"], row) for row in rows]
+        return rows[:limit]
+
+
+def install(engine):
+    """
+    Create obs_trace_index and, on Postgres, the triggers that maintain it.
+    """
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        for statement in CREATE_INDEX_TABLE_SQL.split(";"):
+            if statement.strip():
+                conn.execute(text(statement))
+        if engine.dialect.name == "postgresql":
+            conn.exec_driver_sql(INSTALL_TRIGGERS_SQL)
+
+
+def backfill(engine, page_size: int = 10000) -> int:
+    """
+    Index traces that existed before the triggers, in keyset order.
+
+    Returns:
+        int: Rows inserted
+    """
+    from sqlalchemy import text
+
+    query = text(build_trace_page_query(INDEXED_KEYS))
+    ts, rid = -1, ""
+    inserted = 0
+    while True:
+        with engine.begin() as conn:
+            page = [dict(row._mapping) for row in conn.execute(
+                query, {"ts": ts, "rid": rid, "upper": 2 ** 62, "limit": page_size}
+            )]
+            if not page:
+                return inserted
+            conn.execute(text(INSERT_INDEX_SQL), [{c: row.get(c) for c in COLUMNS} for row in page])
+        inserted += len(page)
+        ts, rid = page[-1]["timestamp_ms"], page[-1]["request_id"]
+
+
+SEED_EXPERIMENT_SQL = """
+INSERT INTO experiments (name, artifact_location, lifecycle_stage, creation_time, last_update_time)
+VALUES (:name, '/tmp/obs-trace-search-bench', 'active', :now, :now)
+RETURNING experiment_id
+"""
+
+SEED_TRACES_SQL = """
+INSERT INTO trace_info (request_id, experiment_id, timestamp_ms, execution_time_ms, status)
+SELECT 'tr-' || md5(g::text), :experiment_id, :start_ms + g * 10, 100 + g % 900,
+       CASE WHEN g % 50 = 0 THEN 'ERROR' ELSE 'OK' END
+FROM generate_series(:lo, :hi) g
+"""
+
+SEED_TAGS_SQL = """
+INSERT INTO trace_tags (key, value, request_id)
+SELECT k.key,
+       CASE k.key
+           WHEN 'mlflow.trace.user' THEN 'user_' || lpad((g % 5000)::text, 5, '0')
+           WHEN 'mlflow.trace.session' THEN 'session_' || lpad((g % 200000)::text, 7, '0')
+           ELSE CASE WHEN g % 3 = 0 THEN 'groq/llama-3.1-8b-instant' ELSE 'gemini/gemini-2.0-flash' END
+       END,
+       'tr-' || md5(g::text)
+FROM generate_series(:lo, :hi) g
+CROSS JOIN (VALUES ('mlflow.trace.user'), ('mlflow.trace.session'), ('obs.model')) AS k(key)
+"""
+
+
+def seed_synthetic(engine, traces: int, chunk: int = 1_000_000) -> int:
+    """
+    Fill a scratch Postgres MLflow store with synthetic traces.
+
+    The database must already have the MLflow schema (``mlflow db upgrade``).
+    Use a dedicated database: the rows are not cleaned up.
+
+    Returns:
+        int: Experiment id holding the synthetic traces
+    """
+    from sqlalchemy import text
+
+    now = int(time.time() * 1000)
+    with engine.begin() as conn:
+        experiment_id = conn.execute(text(SEED_EXPERIMENT_SQL),
+                                     {"name": f"trace-search-bench-{now}", "now": now}).scalar()
+    start_ms = now - traces * 10
+    for lo in range(0, traces, chunk):
+        params = {"experiment_id": experiment_id, "start_ms": start_ms, "lo": lo, "hi": min(traces, lo + chunk) - 1}
+        with engine.begin() as conn:
+            conn.execute(text(SEED_TRACES_SQL), params)
+            conn.execute(text(SEED_TAGS_SQL), params)
+        print(f"  Seeded {min(traces, lo + chunk)} / {traces} traces")
+    return experiment_id
+
+
+def _timed(fn, repeats: int = 5) -> float:
+    timings = []
+    for _ in range(repeats):
+        began = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - began)
+    return round(sorted(timings)[len(timings) // 2] * 1000, 2)
+
+
+def bench(engine, experiment_id, user_id: str = "user_00042", pages: int = 20, limit: int = 100) -> dict:
+    """
+    Compare OFFSET search on the MLflow tables with the accelerated path.
+
+    Returns:
+        dict: Median latencies in ms
+    """
+    from sqlalchemy import text
+
+    def baseline(offset):
+        with engine.connect() as conn:
+            conn.execute(text(BASELINE_SEARCH_SQL), {"experiment_id": experiment_id, "user_id": user_id,
+                                                     "limit": limit, "offset": offset}).fetchall()
+
+    search = TraceSearch(engine)
+    cursors = [None]
+    for _ in range(pages - 1):
+        _, cursor = search.search(experiment_id=experiment_id, user_id=user_id, limit=limit, cursor=cursors[-1])
+        if cursor is None:
+            break
+        cursors.append(cursor)
+
+    cached = TraceSearch(engine, SearchCache(ttl_seconds=60))
+    cached.search(experiment_id=experiment_id, user_id=user_id, limit=limit)
+    return {
+        "baseline_first_page_ms": _timed(lambda: baseline(0)),
+        "baseline_last_page_ms": _timed(lambda: baseline((len(cursors) - 1) * limit)),
+        "index_first_page_ms": _timed(lambda: search.search(experiment_id=experiment_id, user_id=user_id,
+                                                            limit=limit)),
+        "index_last_page_ms": _timed(lambda: search.search(experiment_id=experiment_id, user_id=user_id,
+                                                           limit=limit, cursor=cursors[-1])),
+        "cached_page_ms": _timed(lambda: cached.search(experiment_id=experiment_id, user_id=user_id, limit=limit)),
+        "pages": len(cursors),
+    }
+
+
+def main(argv=None):
+    from sqlalchemy import create_engine
+
+    parser = argparse.ArgumentParser(description="Accelerated MLflow trace search")
+    parser.add_argument("--db-uri", default=MLFLOW_BACKEND_STORE_URI)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("install", help="Create the index table and triggers, then backfill")
+    search_parser = subparsers.add_parser("search", help="Search traces")
+    for name in ("experiment-id", "user", "session", "model", "status", "cursor"):
+        search_parser.add_argument(f"--{name}")
+    search_parser.add_argument("--limit", type=int, default=50)
+    bench_parser = subparsers.add_parser("bench", help="Benchmark against OFFSET search")
+    bench_parser.add_argument("--seed", type=int, default=0, help="Synthetic traces to create first")
+    bench_parser.add_argument("--experiment-id", type=int)
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.db_uri)
+    if args.command == "install":
+        install(engine)
+        print(f"✓ Indexed {backfill(engine)} existing traces")
+    elif args.command == "search":
+        rows, cursor = TraceSearch(engine).search(
+            experiment_id=int(args.experiment_id) if args.experiment_id else None,
+            user_id=args.user, session_id=args.session, model=args.model, status=args.status,
+            limit=args.limit, cursor=args.cursor
+        )
+        for row in rows:
+            print(f"  {row['timestamp_ms']} {row['request_id']} {row['status']} {row['user_id']} {row['model']}")
+        print(f"✓ {len(rows)} traces, next cursor: {cursor}")
+    else:
+        experiment_id = args.experiment_id
+        if args.seed:
+            # Seed before installing the triggers and index in one backfill pass
+            experiment_id = seed_synthetic(engine, args.seed)
+        if experiment_id is None:
+            parser.error("--seed or --experiment-id is required")
+        install(engine)
+        print(f"✓ Indexed {backfill(engine)} traces")
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE trace_info; ANALYZE trace_tags; ANALYZE obs_trace_index")
+        print(f"✓ {bench(engine, experiment_id)}")
+
+
+if __name__ == "__main__":
+    main()
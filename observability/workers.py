@@ -0,0 +1,440 @@
+"""
+Multi-process LiteLLM proxy workers.
+
+``start_litellm_clean.sh`` runs the proxy as one process, bound to one
+core. ``python -m observability.workers --workers N`` pre-forks N proxy
+workers instead:
+
+- Every worker binds its own listening socket on the proxy port with
+  SO_REUSEPORT, and the kernel spreads connections across them.
+- State that must be global lives in anonymous shared memory created
+  before the fork. SharedCounters gives every worker its own column in
+  each row, so increments need no cross-process lock and reads sum the
+  columns; the budget cache (observability.budget) keeps spend recorded
+  since each key was loaded and key cache hit/load counts there.
+  SharedBuckets holds token buckets (per-key ``rpm_limit``) updated
+  under one process-shared lock, so N workers do not allow N times the
+  limit.
+- Trace records are not written to the spool by the workers. One
+  collector process (observability.spool.SpoolCollector) owns the spool
+  and receives records from every worker over a Unix socket, so there is
+  still exactly one spool writer and one shipper.
+- The supervisor restarts workers that exit and, on SIGTERM/SIGINT, stops
+  the workers first (uvicorn drains their connections) and the collector
+  last.
+
+Shared tables are fixed size (``--slots`` rows); a key that does not fit
+is counted in ``overflows`` and then tracked only in the worker's own
+memory.
+
+Usage:
+    python -m observability.workers --workers 4 --port 4000
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+
+from observability.settings import LITELLM_CONFIG_PATH, SPOOL_DIR
+
+
+DEFAULT_SLOTS = 8192
+DEFAULT_APP = "litellm.proxy.proxy_server:app"
+
+# Counters shown per worker by stats()
+STAT_NAMES = ("key_cache.hits", "key_cache.loads")
+
+_DIGEST_SIZE = 16
+_CELL = struct.Struct("<d")
+_EMPTY = bytes(_DIGEST_SIZE)
+_fork = multiprocessing.get_context("fork")
+
+
+class SharedTable:
+    """
+    Fixed-size open-addressing hash table of float64 rows in shared memory.
+
+    Keys are stored as 16-byte digests. Lookups probe without a lock;
+    rows are created under a process-shared lock, which re-probes the
+    chain so a key can never get two rows, and are never removed.
+
+    Args:
+        slots: Number of rows
+        columns: float64 values per row
+    """
+
+    def __init__(self, slots: int, columns: int):
+        self.slots = slots
+        self.columns = columns
+        self.row_size = _DIGEST_SIZE + _CELL.size * columns
+        # Lookups that found the table full, by any worker
+        self._overflows = _fork.Value("q", 0)
+        # Anonymous MAP_SHARED memory: inherited by forked workers
+        self._buf = mmap.mmap(-1, slots * self.row_size)
+        self._insert_lock = _fork.Lock()
+
+    @property
+    def overflows(self) -> int:
+        return self._overflows.value
+
+    def _probe(self, digest: bytes, start: int):
+        """
+        Offset of the digest's row, or of the first empty slot in its chain
+        (None if the table is full).
+
+        Returns:
+            tuple: (offset, found)
+        """
+        for probe in range(self.slots):
+            offset = ((start + probe) % self.slots) * self.row_size
+            stored = self._buf[offset:offset + _DIGEST_SIZE]
+            if stored == digest:
+                return offset, True
+            if stored == _EMPTY:
+                return offset, False
+        return None, False
+
+    def _row(self, key: str, create: bool):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=_DIGEST_SIZE).digest()
+        start = int.from_bytes(digest[:8], "little") % self.slots
+        offset, found = self._probe(digest, start)
+        if found:
+            return offset
+        if not create:
+            if offset is not None:
+                return None
+        else:
+            with self._insert_lock:
+                # The lock-free probe may have read a digest mid-write (even
+                # this key's); inserts only happen under the lock, so the
+                # chain is complete now
+                offset, found = self._probe(digest, start)
+                if offset is not None and not found:
+                    self._buf[offset:offset + _DIGEST_SIZE] = digest
+            if offset is not None:
+                return offset
+        with self._overflows.get_lock():
+            self._overflows.value += 1
+        return None
+
+    def _get(self, offset: int, column: int) -> float:
+        return _CELL.unpack_from(self._buf, offset + _DIGEST_SIZE + column * _CELL.size)[0]
+
+    def _set(self, offset: int, column: int, value: float):
+        _CELL.pack_into(self._buf, offset + _DIGEST_SIZE + column * _CELL.size, value)
+
+
+class SharedCounters(SharedTable):
+    """
+    Counters summed across workers.
+
+    Each worker only writes its own column, so adding is lock-free across
+    processes (a thread lock serializes threads of one worker).
+
+    Args:
+        workers: Number of worker columns
+        slots: Number of counters that fit
+    """
+
+    def __init__(self, workers: int, slots: int = DEFAULT_SLOTS):
+        super().__init__(slots, workers)
+        self.worker = 0
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: str, value: float = 1.0):
+        offset = self._row(key, create=True)
+        with self._lock:
+            if offset is None:
+                self._local[key] = self._local.get(key, 0.0) + value
+                return
+            self._set(offset, self.worker, self._get(offset, self.worker) + value)
+
+    def per_worker(self, key: str) -> list:
+        offset = self._row(key, create=False)
+        values = [0.0] * self.columns
+        if offset is not None:
+            values = [self._get(offset, column) for column in range(self.columns)]
+        values[self.worker] += self._local.get(key, 0.0)
+        return values
+
+    def total(self, key: str) -> float:
+        return sum(self.per_worker(key))
+
+
+class SharedBuckets(SharedTable):
+    """
+    Token buckets shared by all workers.
+
+    Args:
+        slots: Number of buckets that fit
+        clock: Time source; must be the same across processes
+            (time.monotonic is system-wide on Linux)
+    """
+
+    def __init__(self, slots: int = DEFAULT_SLOTS, clock=time.monotonic):
+        super().__init__(slots, 2)
+        self.clock = clock
+        self._lock = _fork.Lock()
+
+    def allow(self, key: str, rate: float, burst: float, cost: float = 1.0) -> bool:
+        """
+        Take ``cost`` tokens from a bucket refilled at ``rate`` per second.
+
+        Returns:
+            bool: False if the bucket does not hold enough tokens
+        """
+        offset = self._row(key, create=True)
+        if offset is None:
+            # Table full: fail open rather than reject every new key
+            return True
+        with self._lock:
+            now = self.clock()
+            updated = self._get(offset, 1)
+            tokens = burst if updated == 0.0 else min(burst, self._get(offset, 0) + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._set(offset, 0, tokens)
+            # Never store 0.0, which marks a new bucket
+            self._set(offset, 1, now or 1e-9)
+        return allowed
+
+
+class WorkerState:
+    """
+    Shared memory and identity of one worker.
+    """
+
+    def __init__(self, workers: int = 1, slots: int = DEFAULT_SLOTS, spool_socket: str = None):
+        self.workers = workers
+        self.counters = SharedCounters(workers, slots)
+        self.buckets = SharedBuckets(slots)
+        self.spool_socket = spool_socket
+        self.worker = 0
+        self.supervised = False
+        self.started_at = time.time()
+
+    def assign(self, worker: int):
+        self.worker = worker
+        self.counters.worker = worker
+        self.supervised = True
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "worker": self.worker,
+            "pid": os.getpid(),
+            "counters": {name: self.counters.per_worker(name) for name in STAT_NAMES},
+            "overflows": {"counters": self.counters.overflows, "buckets": self.buckets.overflows},
+            "spool_socket": self.spool_socket,
+        }
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def current() -> WorkerState:
+    """
+    The state inherited from the supervisor, or None outside worker mode.
+    """
+    return _state if _state is not None and _state.supervised else None
+
+
+def shared() -> WorkerState:
+    """
+    The worker's shared state; a single-worker state outside worker mode,
+    so callers use the same counters and buckets either way.
+    """
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = WorkerState()
+    return _state
+
+
+def reuseport_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """
+    A listening TCP socket that other processes can bind to the same port.
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def _run_worker(worker: int, state: WorkerState, host: str, port: int, config: str, app: str):
+    global _state
+    _state = state
+    state.assign(worker)
+    # Read by the proxy's startup event, as when started by `litellm --config`
+    os.environ["WORKER_CONFIG"] = json.dumps({"config": config})
+    os.environ["OBS_WORKER_ID"] = str(worker)
+    if state.spool_socket:
+        os.environ["OBS_SPOOL_SOCKET"] = state.spool_socket
+
+    import uvicorn
+
+    sock = reuseport_socket(host, port)
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, timeout_graceful_shutdown=30))
+    server.run(sockets=[sock])
+
+
+def _run_collector(path: str):
+    import asyncio
+
+    from observability.logs import configure_from_env
+    from observability.spool import SpoolCollector
+
+    configure_from_env("spool-collector")
+    # Ctrl-C reaches the whole process group: keep collecting until the
+    # supervisor has stopped the workers and terminates us
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    collector = SpoolCollector(path)
+    try:
+        asyncio.run(collector.serve())
+    finally:
+        collector.close()
+
+
+class Supervisor:
+    """
+    Pre-forks proxy workers and the spool collector and keeps them running.
+
+    Args:
+        workers: Proxy worker processes
+        host: Listen address
+        port: Proxy port, shared by all workers
+        config: LiteLLM config file
+        spool_socket: Collector socket
+        slots: Rows per shared table
+        app: ASGI app of the proxy
+    """
+
+    def __init__(self, workers: int, host: str = "0.0.0.0", port: int = 4000,
+                 config: str = LITELLM_CONFIG_PATH,
+                 spool_socket: str = os.path.join(SPOOL_DIR, "collector.sock"),
+                 slots: int = DEFAULT_SLOTS, app: str = DEFAULT_APP):
+        self.host = host
+        self.port = port
+        self.config = config
+        self.app = app
+        # Created before any fork so every child maps the same memory
+        self.state = WorkerState(workers, slots, spool_socket)
+        self.workers = {}
+        self.collector = None
+        self.restarts = 0
+        self._stopping = False
+
+    def _start_collector(self, timeout: float = 10.0):
+        path = self.state.spool_socket
+        if os.path.exists(path):
+            os.unlink(path)
+        self.collector = _fork.Process(target=_run_collector, args=(path,), name="spool-collector")
+        self.collector.start()
+        deadline = time.monotonic() + timeout
+        while not os.path.exists(path):
+            if not self.collector.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError(f"Spool collector did not start on {path}")
+            time.sleep(0.05)
+
+    def _start_worker(self, worker: int):
+        process = _fork.Process(target=_run_worker, name=f"proxy-worker-{worker}",
+                                args=(worker, self.state, self.host, self.port, self.config, self.app))
+        process.start()
+        self.workers[worker] = process
+
+    def _stop(self, signum=None, frame=None):
+        self._stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        self._start_collector()
+        for worker in range(self.state.workers):
+            self._start_worker(worker)
+        print(f"Started {self.state.workers} proxy workers on {self.host}:{self.port}", flush=True)
+
+        while not self._stopping:
+            sentinels = [p.sentinel for p in self.workers.values()] + [self.collector.sentinel]
+            multiprocessing.connection.wait(sentinels, timeout=1.0)
+            if self._stopping:
+                break
+            if not self.collector.is_alive():
+                print("Spool collector exited, restarting", flush=True)
+                self._start_collector()
+            for worker, process in list(self.workers.items()):
+                if not process.is_alive():
+                    print(f"Worker {worker} exited with {process.exitcode}, restarting", flush=True)
+                    self.restarts += 1
+                    self._start_worker(worker)
+        self.shutdown()
+
+    def shutdown(self, timeout: float = 35.0):
+        """
+        Stop workers (graceful, then killed after ``timeout``) and then the collector.
+        """
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self.workers.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+        if self.collector is not None and self.collector.is_alive():
+            self.collector.terminate()
+            self.collector.join(5.0)
+
+
+def install_routes(app, state: WorkerState):
+    """
+    Add /debug/workers to a FastAPI app (requires the master key).
+
+    Shows the answering worker and per-worker shared counters.
+    """
+    from fastapi import Request
+    from fastapi.responses import JSONResponse
+
+    from observability.profiler import require_master_key
+
+    async def worker_stats(request: Request):
+        require_master_key(request)
+        return JSONResponse(state.stats())
+
+    app.add_api_route("/debug/workers", worker_stats, methods=["GET"], include_in_schema=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the LiteLLM proxy as several worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--config", default=LITELLM_CONFIG_PATH)
+    parser.add_argument("--spool-socket", default=os.path.join(SPOOL_DIR, "collector.sock"))
+    parser.add_argument("--slots", type=int, default=DEFAULT_SLOTS, help="Rows per shared-memory table")
+    args = parser.parse_args(argv)
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    Supervisor(args.workers, args.host, args.port, args.config, args.spool_socket, args.slots).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,9 +20,21 @@ fi
 # Add venv bin to PATH so subprocess calls to 'prisma' work
 export PATH="$SCRIPT_DIR/.venv/bin:$PATH"
 
-# Explicitly unset database-related variables
-# unset DATABASE_URL
-# unset STORE_MODEL_IN_DB
+# Make the observability package importable for custom callbacks in config.yaml
+export PYTHONPATH="$SCRIPT_DIR${PYTHONPATH:+:$PYTHONPATH}"
+
+# Explicitly unset database-related variables (set LITELLM_NO_DB=1, e.g. by
+# ./start.sh --profile sqlite, to run LiteLLM without a database)
+if [ -n "$LITELLM_NO_DB" ]; then
+    unset DATABASE_URL
+    unset STORE_MODEL_IN_DB
+fi
+
+# Several proxy processes sharing port 4000 (./start.sh --workers N)
+if [ "${LITELLM_WORKERS:-1}" -gt 1 ]; then
+    exec "$SCRIPT_DIR/.venv/bin/python" -m observability.workers --workers "$LITELLM_WORKERS" \
+        --port 4000 --config "${LITELLM_CONFIG:-$SCRIPT_DIR/config.yaml}"
+fi
 
 # Start LiteLLM
-exec "$SCRIPT_DIR/.venv/bin/litellm" --config "$SCRIPT_DIR/config.yaml" --port 4000
+exec "$SCRIPT_DIR/.venv/bin/litellm" --config "${LITELLM_CONFIG:-$SCRIPT_DIR/config.yaml}" --port 4000
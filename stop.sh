@@ -17,8 +17,13 @@ stop_process() {
         if ps -p $pid > /dev/null 2>&1; then
             echo "Stopping $service_name (PID: $pid)..."
             kill $pid
-            sleep 2
-            
+            # Give in-flight requests and trace flushes time to finish
+            local waited=0
+            while ps -p $pid > /dev/null 2>&1 && [ $waited -lt ${STOP_TIMEOUT:-30} ]; do
+                sleep 1
+                waited=$((waited + 1))
+            done
+
             # Force kill if still running
             if ps -p $pid > /dev/null 2>&1; then
                 echo "  Force stopping $service_name..."
@@ -35,28 +40,45 @@ stop_process() {
 }
 
 # Stop LiteLLM first
-stop_process ".litellm.pid" "LiteLLM"
+stop_process "litellm.pid" "LiteLLM"
+
+# Stop the trace shipper (spooled traces stay on disk until next start)
+stop_process "spool_shipper.pid" "Trace shipper"
 
 # Stop MLflow
-stop_process ".mlflow.pid" "MLflow"
+stop_process "mlflow.pid" "MLflow"
 
 # Also try to kill by port (fallback)
 echo ""
 echo "Checking for any remaining processes..."
 
-# Kill any process on port 4000 (LiteLLM)
-LITELLM_PORT_PID=$(lsof -ti:4000 2>/dev/null)
-if [ ! -z "$LITELLM_PORT_PID" ]; then
-    echo "Found process on port 4000, stopping..."
-    kill -9 $LITELLM_PORT_PID 2>/dev/null || true
-fi
+# Stop any process still listening on a port, gracefully first
+stop_port() {
+    local port=$1
+    local pids=$(lsof -ti:$port 2>/dev/null)
+
+    if [ ! -z "$pids" ]; then
+        echo "Found process on port $port, stopping..."
+        kill $pids 2>/dev/null || true
+        local waited=0
+        while [ ! -z "$(lsof -ti:$port 2>/dev/null)" ] && [ $waited -lt ${STOP_TIMEOUT:-30} ]; do
+            sleep 1
+            waited=$((waited + 1))
+        done
+
+        pids=$(lsof -ti:$port 2>/dev/null)
+        if [ ! -z "$pids" ]; then
+            echo "  Force stopping processes on port $port..."
+            kill -9 $pids 2>/dev/null || true
+        fi
+    fi
+}
+
+# LiteLLM (all workers share port 4000)
+stop_port 4000
 
-# Kill any process on port 5001 (MLflow)
-MLFLOW_PORT_PID=$(lsof -ti:5001 2>/dev/null)
-if [ ! -z "$MLFLOW_PORT_PID" ]; then
-    echo "Found process on port 5001, stopping..."
-    kill -9 $MLFLOW_PORT_PID 2>/dev/null || true
-fi
+# MLflow
+stop_port 5001
 
 echo ""
 echo "=========================================="
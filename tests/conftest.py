@@ -15,7 +15,8 @@ from tests.utils import (
 def setup_mlflow_session():
     """
     Session-level fixture to configure MLflow.
-    Runs once before all tests.
+    Runs once before all tests; MLflow itself is only imported and
+    autolog patched when a test first creates a client.
     """
     setup_mlflow()
     enable_mlflow_tracing()
@@ -0,0 +1,132 @@
+"""
+Test vectorized trace analytics against numpy reference results
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+np = pytest.importorskip("numpy")
+pytest.importorskip("pyarrow")
+from observability.analytics import (
+    TraceFrame,
+    group_percentiles,
+    token_throughput,
+    time_buckets,
+    detect_regressions,
+    load_traces,
+)
+from observability.export import TRACE_SCHEMA, write_partitioned, partition_key
+
+
+def make_frame(n=1000, seed=7, slowdown=1.0, start_ms=1760832000000):
+    """Synthetic traces for two models, one ~3x slower than the other"""
+    rng = np.random.default_rng(seed)
+    model = np.where(rng.random(n) < 0.5, "gemini-2.0-flash", "groq/llama3")
+    latency = rng.gamma(2.0, 200.0, n) * np.where(model == "groq/llama3", 1.0, 3.0) * slowdown
+    latency[::50] = np.nan
+    return TraceFrame({
+        "timestamp_ms": start_ms + np.sort(rng.integers(0, 6 * 3600 * 1000, n)).astype(np.float64),
+        "model": model.astype(object),
+        "user_id": np.where(rng.random(n) < 0.3, "user_001", "user_002").astype(object),
+        "status": np.where(rng.random(n) < 0.05, "ERROR", "OK").astype(object),
+        "latency_ms": latency,
+        "ttft_ms": latency * 0.2,
+        "completion_tokens": rng.integers(1, 200, n).astype(np.float64),
+        "total_tokens": rng.integers(200, 400, n).astype(np.float64),
+        "cost": rng.random(n) / 1000,
+    })
+
+
+def test_group_percentiles_match_numpy():
+    """
+    Test grouped percentiles against numpy.percentile per group.
+    """
+    frame = make_frame()
+    result = group_percentiles(frame, "latency_ms", by=("model", "user_id"))
+
+    for (model, user), stats in result.items():
+        mask = (frame["model"] == model) & (frame["user_id"] == user)
+        values = frame["latency_ms"][mask]
+        values = values[~np.isnan(values)]
+        assert stats["count"] == len(values)
+        for q in (50, 90, 95, 99):
+            assert stats[f"p{q}"] == pytest.approx(np.percentile(values, q))
+    print(f"\n✓ Percentiles for {len(result)} groups match numpy")
+
+
+def test_throughput_and_buckets():
+    """
+    Test token throughput and time-bucket aggregates.
+    """
+    frame = make_frame()
+    throughput = token_throughput(frame)
+    assert set(throughput) == {"gemini-2.0-flash", "groq/llama3"}
+    assert throughput["groq/llama3"]["p50_tps"] > throughput["gemini-2.0-flash"]["p50_tps"]
+
+    buckets = time_buckets(frame, bucket_ms=3600 * 1000)
+    assert buckets["requests"].sum() == len(frame)
+    assert buckets["errors"].sum() == (frame["status"] != "OK").sum()
+    assert buckets["cost"].sum() == pytest.approx(frame["cost"].sum())
+    print(f"\n✓ {len(buckets['requests'])} hourly buckets")
+
+
+def test_detect_regressions():
+    """
+    Test that a slower candidate window is reported and an unchanged one is not.
+    """
+    baseline = make_frame(seed=1)
+    assert detect_regressions(baseline, make_frame(seed=2)) == []
+
+    regressions = detect_regressions(baseline, make_frame(seed=2, slowdown=1.5))
+    assert {r["group"] for r in regressions} == {"gemini-2.0-flash", "groq/llama3"}
+    assert all(r["relative_change"] > 0.1 for r in regressions)
+    print(f"\n✓ Detected {len(regressions)} regressions")
+
+
+def test_zero_baseline_needs_absolute_increase():
+    """
+    Test that 0 -> 0 is unchanged and a zero baseline regresses only above the floor.
+    """
+    free = make_frame(seed=1)
+    free["cost"][:] = 0.0
+    assert detect_regressions(free, make_frame(seed=2), value="cost", absolute_floor=0.01) == []
+
+    still_free = make_frame(seed=2)
+    still_free["cost"][:] = 0.0
+    assert detect_regressions(free, still_free, value="cost", absolute_floor=0.0) == []
+
+    paid = make_frame(seed=2)
+    paid["cost"][:] = 0.05
+    regressions = detect_regressions(free, paid, value="cost", absolute_floor=0.01)
+    assert {r["group"] for r in regressions} == {"gemini-2.0-flash", "groq/llama3"}
+    assert all(r["relative_change"] == float("inf") for r in regressions)
+
+
+def test_load_exported_dataset(tmp_path):
+    """
+    Test loading a partitioned export with window pruning.
+    """
+    frame = make_frame(n=200)
+    rows = []
+    for i in range(len(frame)):
+        row = {name: frame.columns.get(name, [None] * len(frame))[i] for name, _ in TRACE_SCHEMA}
+        row["trace_id"] = f"tr-{i}"
+        row["timestamp_ms"] = int(row["timestamp_ms"])
+        row["date"] = "2025-10-19"
+        row["latency_ms"] = None if np.isnan(row["latency_ms"]) else int(row["latency_ms"])
+        for name in ("completion_tokens", "total_tokens"):
+            row[name] = int(row[name])
+        rows.append(row)
+    write_partitioned(rows, TRACE_SCHEMA, str(tmp_path),
+                      lambda row: tuple(zip(("date", "model"), partition_key(row))))
+
+    middle = int(np.median(frame["timestamp_ms"]))
+    loaded = load_traces(str(tmp_path), columns=["model", "latency_ms"], start=middle)
+    assert len(loaded) == (frame["timestamp_ms"] >= middle).sum()
+    assert set(loaded["model"]) == {"gemini-2.0-flash", "groq/llama3"}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
@@ -8,17 +8,13 @@ import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from openai import AsyncOpenAI
-from tests.utils import LITELLM_PROXY_URL, VIRTUAL_KEY
+from tests.utils import get_async_litellm_client
 
 
 @pytest.fixture
 def async_client():
     """Fixture for async OpenAI client"""
-    return AsyncOpenAI(
-        api_key=VIRTUAL_KEY,
-        base_url=LITELLM_PROXY_URL
-    )
+    return get_async_litellm_client()
 
 
 @pytest.mark.asyncio
@@ -90,15 +86,12 @@ async def test_async_streaming(async_client, model_name):
     full_response = ""
     chunk_count = 0
     
-    print("\n✓ Async streaming:")
     async for chunk in stream:
         if chunk.choices[0].delta.content:
-            content = chunk.choices[0].delta.content
-            print(content, end="", flush=True)
-            full_response += content
+            full_response += chunk.choices[0].delta.content
             chunk_count += 1
     
-    print()
+    print(f"\n✓ Async streaming: {full_response}")
     
     assert chunk_count > 0
     assert len(full_response) > 0
@@ -107,17 +100,13 @@ async def test_async_streaming(async_client, model_name):
 
 
 if __name__ == "__main__":
-    from tests.utils import setup_mlflow, enable_mlflow_tracing, LITELLM_PROXY_URL, VIRTUAL_KEY, MODEL_NAME
-    from openai import AsyncOpenAI
+    from tests.utils import setup_mlflow, enable_mlflow_tracing, MODEL_NAME
     
     setup_mlflow()
     enable_mlflow_tracing()
     
     async def run_all_tests():
-        async_client = AsyncOpenAI(
-            api_key=VIRTUAL_KEY,
-            base_url=LITELLM_PROXY_URL
-        )
+        async_client = get_async_litellm_client()
         
         print("\n" + "="*60)
         print("Running Async Completion Tests")
@@ -0,0 +1,232 @@
+"""
+Test asyncio-native trace logging
+"""
+
+import pytest
+import asyncio
+import json
+import random
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.async_tracing import (
+    AsyncTraceExporter,
+    MlflowRestSink,
+    async_span,
+    current_span,
+    instrument_async_openai,
+)
+
+
+# Maximum event-loop lag tolerated while 500 traced requests are in flight
+LOOP_LAG_BOUND_MS = 25.0
+
+
+class SlowSink:
+    """Stands in for MLflow: every export takes a few milliseconds of I/O."""
+
+    def __init__(self, delay: float = 0.005):
+        self.delay = delay
+        self.traces = []
+
+    async def export(self, trace):
+        await asyncio.sleep(self.delay)
+        self.traces.append(trace)
+
+
+class FakeUsage:
+    prompt_tokens = 12
+    completion_tokens = 8
+    total_tokens = 20
+
+
+class FakeResponse:
+    usage = FakeUsage()
+
+    def model_dump(self):
+        return {"choices": [{"message": {"role": "assistant", "content": "4"}}]}
+
+
+class FakeCompletions:
+    async def create(self, **kwargs):
+        # Simulated network round trip to the proxy
+        await asyncio.sleep(random.uniform(0.001, 0.02))
+        return FakeResponse()
+
+
+class FakeChat:
+    def __init__(self):
+        self.completions = FakeCompletions()
+
+
+class FakeAsyncOpenAI:
+    def __init__(self):
+        self.chat = FakeChat()
+
+
+async def sample_loop_lag(stop: asyncio.Event, interval: float = 0.001):
+    """Record how late the loop wakes up a task sleeping ``interval`` seconds."""
+    lags = []
+    while not stop.is_set():
+        began = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - began - interval) * 1000)
+    return lags
+
+
+@pytest.mark.asyncio
+async def test_spans_parented_across_gather():
+    """
+    Test that spans opened in gathered tasks are children of the active span.
+    """
+    sink = SlowSink(delay=0)
+    exporter = AsyncTraceExporter(sink).start()
+
+    async def step(i):
+        async with async_span(f"step_{i}", span_type="LLM", exporter=exporter) as span:
+            await asyncio.sleep(0)
+            return span
+
+    async with async_span("conversation", exporter=exporter) as root:
+        children = await asyncio.gather(*(step(i) for i in range(3)))
+        assert current_span() is root
+
+    assert current_span() is None
+    await exporter.aclose()
+
+    assert len(sink.traces) == 1
+    trace = sink.traces[0]
+    assert trace.root is root
+    assert {span.parent_id for span in children} == {root.span_id}
+    assert all(span.trace is trace for span in children)
+
+
+@pytest.mark.asyncio
+async def test_error_recorded_on_span():
+    """
+    Test that an exception marks the span as failed and is re-raised.
+    """
+    sink = SlowSink(delay=0)
+    exporter = AsyncTraceExporter(sink).start()
+
+    with pytest.raises(RuntimeError):
+        async with async_span("failing", exporter=exporter):
+            raise RuntimeError("boom")
+
+    await exporter.aclose()
+    assert sink.traces[0].root.status == "ERROR"
+    assert "boom" in sink.traces[0].root.status_message
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_instead_of_blocking():
+    """
+    Test that submit never waits when the export queue is full.
+    """
+    exporter = AsyncTraceExporter(SlowSink(), max_queue=2)
+    # Not started: nothing drains the queue
+    for i in range(5):
+        async with async_span(f"t{i}", exporter=exporter):
+            pass
+    assert exporter.dropped == 3
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_with_500_concurrent_requests():
+    """
+    Test that 500 concurrent traced requests keep the event loop responsive.
+    """
+    sink = SlowSink()
+    exporter = AsyncTraceExporter(sink, concurrency=8).start()
+    client = instrument_async_openai(FakeAsyncOpenAI(), exporter)
+
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_loop_lag(stop))
+
+    async def request(i):
+        return await client.chat.completions.create(
+            model="gemini/gemini-2.0-flash",
+            messages=[{"role": "user", "content": f"What is {i} + {i}?"}]
+        )
+
+    responses = await asyncio.gather(*(request(i) for i in range(500)))
+    await exporter.flush()
+    stop.set()
+    lags = sorted(await sampler)
+    await exporter.aclose()
+
+    assert len(responses) == 500
+    assert len(sink.traces) == 500
+    assert exporter.dropped == 0
+    span = sink.traces[0].root
+    assert span.span_type == "LLM"
+    assert span.attributes["total_tokens"] == 20
+
+    p99 = lags[int(len(lags) * 0.99) - 1]
+    print(f"\n✓ Loop lag p99 {p99:.2f} ms, max {lags[-1]:.2f} ms over {len(lags)} samples")
+    assert p99 < LOOP_LAG_BOUND_MS
+
+
+@pytest.mark.asyncio
+async def test_rest_sink_calls_mlflow_api():
+    """
+    Test the StartTrace / artifact upload / EndTrace sequence against a mock server.
+    """
+    httpx = pytest.importorskip("httpx")
+    calls = []
+
+    async def handler(request):
+        calls.append((request.method, request.url.path))
+        if request.url.path.endswith("get-by-name"):
+            return httpx.Response(200, json={"experiment": {"experiment_id": "7"}})
+        if request.method == "POST" and request.url.path == "/api/2.0/mlflow/traces":
+            return httpx.Response(200, json={"trace_info": {
+                "request_id": "tr-1",
+                "tags": [{"key": "mlflow.artifactLocation",
+                          "value": "mlflow-artifacts:/7/traces/tr-1/artifacts"}],
+            }})
+        return httpx.Response(200, json={})
+
+    client = httpx.AsyncClient(base_url="http://mlflow", transport=httpx.MockTransport(handler))
+    exporter = AsyncTraceExporter(MlflowRestSink("http://mlflow", client=client)).start()
+    async with async_span("conversation", inputs={"q": "hi"}, exporter=exporter):
+        pass
+    await exporter.aclose()
+
+    assert exporter.exported == 1
+    assert calls == [
+        ("GET", "/api/2.0/mlflow/experiments/get-by-name"),
+        ("POST", "/api/2.0/mlflow/traces"),
+        ("PUT", "/api/2.0/mlflow-artifacts/artifacts/7/traces/tr-1/artifacts/traces.json"),
+        ("PATCH", "/api/2.0/mlflow/traces/tr-1"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rest_sink_writes_local_artifacts(tmp_path):
+    """
+    Test that span data is written directly for a local artifact root.
+    """
+    httpx = pytest.importorskip("httpx")
+    location = f"file://{tmp_path}/7/traces/tr-2/artifacts"
+
+    async def handler(request):
+        if request.url.path.endswith("get-by-name"):
+            return httpx.Response(200, json={"experiment": {"experiment_id": "7"}})
+        if request.method == "POST":
+            return httpx.Response(200, json={"trace_info": {
+                "request_id": "tr-2", "tags": [{"key": "mlflow.artifactLocation", "value": location}],
+            }})
+        return httpx.Response(200, json={})
+
+    client = httpx.AsyncClient(base_url="http://mlflow", transport=httpx.MockTransport(handler))
+    exporter = AsyncTraceExporter(MlflowRestSink("http://mlflow", client=client)).start()
+    async with async_span("conversation", inputs={"q": "hi"}, exporter=exporter):
+        pass
+    await exporter.aclose()
+
+    payload = json.loads((tmp_path / "7" / "traces" / "tr-2" / "artifacts" / "traces.json").read_text())
+    assert exporter.exported == 1
+    assert [span["name"] for span in payload["spans"]] == ["conversation"]
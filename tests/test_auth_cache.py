@@ -0,0 +1,194 @@
+"""
+Test the cached, pooled authentication path and the test-user database
+helpers in tests.utils (no server required; SQLite for the database)
+"""
+
+import pytest
+import base64
+import json
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tests.utils import auth as utils
+
+
+def make_jwt(exp):
+    payload = base64.urlsafe_b64encode(json.dumps({"sub": "test_user", "exp": exp}).encode()).rstrip(b"=")
+    return f"eyJhbGciOiJIUzI1NiJ9.{payload.decode()}.signature"
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, token):
+        self._token = token
+        self.text = ""
+
+    def json(self):
+        return {"access_token": self._token}
+
+
+class FakeSession:
+    """Counts logins and issues tokens with a configurable lifetime"""
+
+    def __init__(self, lifetime):
+        self.lifetime = lifetime
+        self.logins = 0
+
+    def post(self, url, json=None):
+        self.logins += 1
+        return FakeResponse(make_jwt(time.time() + self.lifetime))
+
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    session = FakeSession(lifetime=3600)
+    monkeypatch.setattr(utils, "_http_session", session)
+    utils.clear_auth_cache()
+    yield session
+    utils.clear_auth_cache()
+
+
+def test_token_is_cached(fake_session):
+    """
+    Test that repeated logins for the same user reuse the cached token.
+    """
+    tokens = {utils.get_auth_token("test_user", "secret") for _ in range(100)}
+
+    assert len(tokens) == 1
+    assert fake_session.logins == 1
+    print(f"\n✓ 100 token requests, {fake_session.logins} login")
+
+
+def test_token_refreshed_before_expiry(fake_session):
+    """
+    Test that tokens inside the refresh margin are renewed proactively.
+    """
+    fake_session.lifetime = utils.TOKEN_REFRESH_MARGIN_SECONDS - 1
+    utils.get_auth_token("test_user", "secret")
+    utils.get_auth_token("test_user", "secret")
+    assert fake_session.logins == 2
+
+    # A different password never reuses another credential's token
+    fake_session.lifetime = 3600
+    utils.get_auth_token("test_user", "other")
+    assert fake_session.logins == 3
+
+
+def test_jwt_expiry_parsing():
+    """
+    Test reading the exp claim from a JWT.
+    """
+    assert utils._jwt_expiry(make_jwt(1760832000)) == 1760832000
+    assert utils._jwt_expiry("not-a-jwt") is None
+
+
+@pytest.fixture
+def user_db(monkeypatch):
+    """SQLite tables shaped like user_management's users, roles and links"""
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Table
+    from sqlalchemy.orm import Session
+
+    metadata = MetaData()
+    users = Table("users", metadata, Column("id", Integer, primary_key=True),
+                  Column("username", String), Column("email", String))
+    roles = Table("roles", metadata, Column("id", Integer, primary_key=True), Column("name", String))
+    role_links = Table("user_roles", metadata,
+                       Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+                       Column("role_id", Integer, ForeignKey("roles.id"), primary_key=True))
+    api_keys = Table("api_keys", metadata, Column("id", Integer, primary_key=True),
+                     Column("user_id", Integer, ForeignKey("users.id")))
+    engine = sqlalchemy.create_engine("sqlite://")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(roles.insert(), [{"id": 1, "name": "viewer"}, {"id": 2, "name": "admin"}])
+
+    statements = []
+    sqlalchemy.event.listen(engine, "before_cursor_execute",
+                            lambda conn, cursor, statement, *args: statements.append(statement))
+    monkeypatch.setattr(utils, "_test_user_markers", None)
+    utils.clear_auth_cache()
+    yield engine, Session, statements, (users, roles, role_links, api_keys)
+    utils.clear_auth_cache()
+
+
+def add_users(db, users, names):
+    result = db.execute(users.insert().returning(users.c.id),
+                        [{"username": name, "email": f"{name}@example.com"} for name in names])
+    return [row[0] for row in result]
+
+
+def test_role_id_cached_and_links_inserted_directly(user_db):
+    """
+    Test that the role is looked up once per process and that users, role
+    links and markers are written in the caller's single transaction.
+    """
+    engine, Session, statements, (users, roles, role_links, _) = user_db
+
+    for batch in (["test_a", "test_b"], ["test_c"]):
+        with Session(engine) as db:
+            role_id = utils._get_role_id(db, roles, "viewer")
+            utils._register_test_users(db, users, role_links, add_users(db, users, batch), role_id)
+            db.commit()
+    assert sum("FROM roles" in statement for statement in statements) == 1
+
+    with Session(engine) as db:
+        utils._register_test_users(db, users, role_links, add_users(db, users, ["test_d"]), 2)
+        db.rollback()
+
+    with engine.connect() as conn:
+        assert conn.execute(users.select()).all() == [(1, "test_a", "test_a@example.com"),
+                                                       (2, "test_b", "test_b@example.com"),
+                                                       (3, "test_c", "test_c@example.com")]
+        assert sorted(conn.execute(role_links.select()).all()) == [(1, 1), (2, 1), (3, 1)]
+        assert conn.exec_driver_sql(f"SELECT COUNT(*) FROM {utils.TEST_USER_MARKER_TABLE}").scalar() == 3
+
+
+def test_cleanup_deletes_in_chunks_with_dependent_rows(user_db):
+    """
+    Test chunked deletion of marked and legacy test users, their role links
+    and other rows referencing them, and the returned counts.
+    """
+    engine, Session, statements, (users, roles, role_links, api_keys) = user_db
+
+    with Session(engine) as db:
+        marked = add_users(db, users, [f"user_{i}" for i in range(5)])
+        utils._register_test_users(db, users, role_links, marked, 1)
+        legacy, kept = add_users(db, users, ["old_test_user", "alice"])
+        db.execute(role_links.insert(), [{"user_id": legacy, "role_id": 2}, {"user_id": kept, "role_id": 2}])
+        db.execute(api_keys.insert(), [{"user_id": marked[0]}, {"user_id": legacy}, {"user_id": kept}])
+        db.commit()
+
+    with Session(engine) as db:
+        statements.clear()
+        deleted = utils._delete_test_users(db, users, role_links, chunk_size=2, include_legacy=True)
+
+    assert deleted == {"users": 6, "role_links": 6, "api_keys": 2}
+    assert sum(statement.startswith("DELETE FROM users") for statement in statements) == 3
+    with engine.connect() as conn:
+        assert conn.execute(users.select()).all() == [(kept, "alice", "alice@example.com")]
+        assert conn.execute(role_links.select()).all() == [(kept, 2)]
+        assert conn.execute(api_keys.select().with_only_columns(api_keys.c.user_id)).all() == [(kept,)]
+
+
+def test_cleanup_without_legacy_keeps_unmarked_users(user_db):
+    """
+    Test that include_legacy=False only removes users the helpers created.
+    """
+    engine, Session, _, (users, _, role_links, _) = user_db
+
+    with Session(engine) as db:
+        utils._register_test_users(db, users, role_links, add_users(db, users, ["new_test_user"]), None)
+        add_users(db, users, ["old_test_user"])
+        db.commit()
+        assert utils._delete_test_users(db, users, role_links, include_legacy=False)["users"] == 1
+
+    with engine.connect() as conn:
+        assert [row.username for row in conn.execute(users.select())] == ["old_test_user"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
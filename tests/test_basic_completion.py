@@ -9,6 +9,7 @@ import os
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from tests.utils import verify_trace_exists
+from observability.cost import get_cost_engine
 
 
 def test_simple_completion(litellm_client, model_name, simple_message):
@@ -27,6 +28,14 @@ def test_simple_completion(litellm_client, model_name, simple_message):
     assert response is not None
     assert len(response.choices) > 0
     assert response.choices[0].message.content is not None
+    assert response.usage.prompt_tokens > 0
+    assert response.usage.completion_tokens > 0
+    assert response.usage.total_tokens == response.usage.prompt_tokens + response.usage.completion_tokens
+
+    input_cost, output_cost = get_cost_engine().cost(
+        model_name, response.usage.prompt_tokens, response.usage.completion_tokens
+    )
+    assert input_cost > 0 and output_cost > 0
     
     # Verify trace was created (MLflow autolog should capture this)
     # Note: Trace verification might need a small delay
@@ -37,6 +46,7 @@ def test_simple_completion(litellm_client, model_name, simple_message):
     print(f"\n✓ Response: {response.choices[0].message.content}")
     print(f"✓ Model: {response.model}")
     print(f"✓ Tokens used: {response.usage.total_tokens}")
+    print(f"✓ Cost: ${input_cost + output_cost:.6f}")
 
 
 def test_completion_with_system_message(litellm_client, model_name):
@@ -0,0 +1,164 @@
+"""
+Test the in-memory key/budget cache and in-memory spend
+"""
+
+import asyncio
+import pytest
+import sys
+import os
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.budget import (
+    INVALIDATION_TRIGGER_SQL,
+    KeyBudgetCache,
+    KeyState,
+    BudgetExceededError,
+    InvalidKeyError,
+    hash_key,
+)
+
+
+VIRTUAL_KEY = "sk-test-budget"
+
+
+class FakeKeyStore:
+    """Stands in for PostgresKeyStore; counts loads"""
+
+    def __init__(self, max_budget=None):
+        self.keys = {hash_key(VIRTUAL_KEY): dict(spend=0.0, max_budget=max_budget)}
+        self.loads = 0
+
+    def load(self, token):
+        self.loads += 1
+        row = self.keys.get(token)
+        return KeyState(token, **row) if row else None
+
+
+def test_cached_auth_avoids_db_reads():
+    """
+    Test that repeated checks hit the cache and invalidation forces a reload.
+    """
+    store = FakeKeyStore()
+    cache = KeyBudgetCache(store.load)
+    for _ in range(1000):
+        cache.check(VIRTUAL_KEY)
+    assert store.loads == 1
+
+    store.keys[hash_key(VIRTUAL_KEY)]["blocked"] = True
+    cache.invalidate(VIRTUAL_KEY)
+    with pytest.raises(InvalidKeyError):
+        cache.check(VIRTUAL_KEY)
+    with pytest.raises(InvalidKeyError):
+        cache.check("sk-unknown")
+
+
+def test_budget_enforced_from_local_spend():
+    """
+    Test that spend recorded in memory is enforced before any flush.
+    """
+    cache = KeyBudgetCache(FakeKeyStore(max_budget=1.0).load)
+    cache.check(VIRTUAL_KEY)
+    cache.record_spend(VIRTUAL_KEY, 0.6)
+    cache.check(VIRTUAL_KEY)
+    cache.record_spend(VIRTUAL_KEY, 0.6)
+
+    with pytest.raises(BudgetExceededError):
+        cache.check(VIRTUAL_KEY)
+
+
+@pytest.mark.asyncio
+async def test_async_check_loads_off_the_loop():
+    """
+    Test that async checks load keys in a worker thread and enforce models.
+    """
+    store = FakeKeyStore()
+    store.keys[hash_key(VIRTUAL_KEY)].update(models=["gpt-4o-mini"], team_id="team-a")
+    threads = []
+
+    def load(token):
+        threads.append(threading.current_thread())
+        return store.load(token)
+
+    cache = KeyBudgetCache(load)
+    state = await cache.acheck(VIRTUAL_KEY, "gpt-4o-mini")
+    await cache.acheck(VIRTUAL_KEY)
+    assert state.team_id == "team-a"
+    assert store.loads == 1 and cache.hits == 1
+    assert threads[0] is not threading.main_thread()
+
+    with pytest.raises(InvalidKeyError):
+        await cache.acheck(VIRTUAL_KEY, "gpt-4o")
+
+
+def test_concurrent_spend_is_counted_exactly_once():
+    """
+    Test that spend recorded from many threads is enforced without loss or
+    double counting.
+    """
+    store = FakeKeyStore(max_budget=32.5)
+    cache = KeyBudgetCache(store.load)
+    cache.check(VIRTUAL_KEY)
+
+    def worker():
+        for _ in range(2000):
+            cache.check(VIRTUAL_KEY)
+            cache.record_spend(VIRTUAL_KEY, 0.001)
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.spend(cache.get(VIRTUAL_KEY)) == pytest.approx(16 * 2000 * 0.001)
+    cache.record_spend(VIRTUAL_KEY, 0.5)
+    with pytest.raises(BudgetExceededError):
+        cache.check(VIRTUAL_KEY)
+    assert store.loads == 1
+
+
+def test_trigger_ddl_is_serialized():
+    """
+    Test that workers installing the trigger together take the advisory lock first.
+    """
+    statements = [line for line in INVALIDATION_TRIGGER_SQL.splitlines() if line.strip()]
+    assert statements[0].startswith("SELECT pg_advisory_xact_lock(")
+
+
+@pytest.mark.asyncio
+async def test_auth_errors_map_to_http_status():
+    """
+    Test that the custom_auth hook answers 429 for rate limits and raises
+    LiteLLM's budget error, instead of a plain exception LiteLLM turns into 401.
+    """
+    pytest.importorskip("litellm.proxy._types")
+    fastapi = pytest.importorskip("fastapi")
+    import litellm
+    from observability import callbacks
+    from observability.workers import SharedBuckets
+
+    store = FakeKeyStore(max_budget=1.0)
+    store.keys[hash_key(VIRTUAL_KEY)].update(rpm_limit=2)
+    cache = KeyBudgetCache(store.load, limiter=SharedBuckets(slots=8))
+    previous, callbacks._budget_cache = callbacks._budget_cache, cache
+    try:
+        await callbacks.user_api_key_auth(None, f"Bearer {VIRTUAL_KEY}")
+        await callbacks.user_api_key_auth(None, VIRTUAL_KEY)
+        with pytest.raises(fastapi.HTTPException) as rate_limited:
+            await callbacks.user_api_key_auth(None, VIRTUAL_KEY)
+        assert rate_limited.value.status_code == 429
+        assert rate_limited.value.headers["Retry-After"] == "30"
+
+        cache.limiter = None
+        cache.record_spend(VIRTUAL_KEY, 1.5)
+        with pytest.raises(litellm.BudgetExceededError) as over_budget:
+            await callbacks.user_api_key_auth(None, VIRTUAL_KEY)
+        assert over_budget.value.current_cost == pytest.approx(1.5)
+        assert over_budget.value.max_budget == 1.0
+    finally:
+        callbacks._budget_cache = previous
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
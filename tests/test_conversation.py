@@ -9,6 +9,16 @@ import os
 import mlflow
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.conversation import ConversationManager, message_tokens
+from observability.prefix_cache import (
+    GEMINI_MIN_CACHE_TOKENS,
+    GeminiContextCacheBackend,
+    PrefixCacheManager,
+    create_with_prefix_cache,
+)
+
+# Shared across tests so repeated system prompts reuse the provider cache
+prefix_cache = PrefixCacheManager(GeminiContextCacheBackend())
 
 
 @mlflow.trace
@@ -27,16 +37,14 @@ def test_simple_conversation(litellm_client, model_name):
         }
     )
     
-    # Start conversation
-    messages = [
-        {"role": "user", "content": "What is MLflow?"}
-    ]
-    
+    # Start conversation (history is kept within a token budget)
+    conversation = ConversationManager(max_tokens=1000)
+    conversation.add_user("What is MLflow?")
     
     # First turn
     response1 = litellm_client.chat.completions.create(
         model=model_name,
-        messages=messages,
+        messages=conversation.messages(),
         temperature=0.7,
         max_tokens=100
     )
@@ -47,15 +55,14 @@ def test_simple_conversation(litellm_client, model_name):
     print(f"  [User: {user_id}, Session: {session_id}]")
     
     # Add assistant response to conversation
-    messages.append({"role": "assistant", "content": assistant_response})
+    conversation.add_assistant(assistant_response)
     
     # Second turn
-    messages.append({"role": "user", "content": "What are its main components?"})
-    
+    conversation.add_user("What are its main components?")
     
     response2 = litellm_client.chat.completions.create(
         model=model_name,
-        messages=messages,
+        messages=conversation.messages(),
         temperature=0.7,
         max_tokens=150
     )
@@ -63,6 +70,7 @@ def test_simple_conversation(litellm_client, model_name):
     assert response2 is not None
     print(f"\n✓ Turn 2 - Assistant: {response2.choices[0].message.content}")
     print(f"  [User: {user_id}, Session: {session_id}]")
+    conversation.record_on_trace()
     
     # Return summary for trace
     return {"turns": 2, "final_response": response2.choices[0].message.content[:100]}
@@ -106,7 +114,8 @@ def test_long_conversation(litellm_client, model_name):
     """
     user_id = "user_003"
     session_id = "session_conv_003"
-    messages = []
+    # Small budget so older turns get summarised as the conversation grows
+    conversation = ConversationManager(max_tokens=300, summary_tokens=80)
     
     conversation_turns = [
         "What is observability?",
@@ -115,7 +124,7 @@ def test_long_conversation(litellm_client, model_name):
     ]
     
     for i, user_message in enumerate(conversation_turns):
-        messages.append({"role": "user", "content": user_message})
+        conversation.add_user(user_message)
         
         # Update trace for each turn
         mlflow.update_current_trace(
@@ -128,21 +137,25 @@ def test_long_conversation(litellm_client, model_name):
         
         response = litellm_client.chat.completions.create(
             model=model_name,
-            messages=messages,
+            messages=conversation.messages(),
             temperature=0.7,
             max_tokens=100
         )
         
         assistant_response = response.choices[0].message.content
-        messages.append({"role": "assistant", "content": assistant_response})
+        conversation.add_assistant(assistant_response)
         
         print(f"\n✓ Turn {i+1}")
         print(f"  User: {user_message}")
         print(f"  Assistant: {assistant_response[:100]}...")
         print(f"  [User: {user_id}, Session: {session_id}, Turn: {i+1}]")
     
-    # Verify we have all turns
-    assert len(messages) == len(conversation_turns) * 2
+    # Verify every turn is either kept verbatim or folded into the summary
+    stats = conversation.stats()
+    assert stats["kept_messages"] + stats["trimmed_messages"] == len(conversation_turns) * 2
+    assert stats["kept_tokens"] <= 300 or stats["kept_messages"] <= conversation.min_recent_messages
+    conversation.record_on_trace()
+    print(f"\n✓ Context: {stats}")
     
     # Return summary for trace
     return {"turns": len(conversation_turns), "conversation_complete": True}
@@ -170,7 +183,9 @@ def test_conversation_with_system_prompt(litellm_client, model_name):
         {"role": "user", "content": "What is MLflow?"}
     ]
     
-    response = litellm_client.chat.completions.create(
+    response = create_with_prefix_cache(
+        litellm_client,
+        prefix_cache,
         model=model_name,
         messages=messages,
         temperature=0.7,
@@ -185,6 +200,34 @@ def test_conversation_with_system_prompt(litellm_client, model_name):
     return {"response": response.choices[0].message.content}
 
 
+@mlflow.trace
+def test_long_system_prompt_uses_context_cache(litellm_client, model_name):
+    """
+    Test that a system prompt above Gemini's minimum cache size is served
+    from a cachedContent when it repeats.
+    """
+    # Several times the minimum, so every Gemini model accepts the cache
+    reference = " ".join(f"Fact {i}: MLflow component {i % 7} records run metadata." for i in range(600))
+    assert message_tokens({"role": "system", "content": reference}) > 4 * GEMINI_MIN_CACHE_TOKENS
+    messages = [
+        {"role": "system", "content": f"Answer from this reference in one sentence.\n{reference}"},
+        {"role": "user", "content": "What does MLflow record?"},
+    ]
+
+    hits = prefix_cache.hits
+    responses = [
+        create_with_prefix_cache(litellm_client, prefix_cache, model=model_name, messages=messages, max_tokens=50)
+        for _ in range(2)
+    ]
+
+    assert prefix_cache.hits == hits + 1
+    cached = responses[1].usage.prompt_tokens_details.cached_tokens
+    assert cached >= GEMINI_MIN_CACHE_TOKENS
+    print(f"\n✓ Cached prompt tokens on repeat: {cached}")
+
+    return {"cached_tokens": cached}
+
+
 if __name__ == "__main__":
     from tests.utils import setup_mlflow, enable_mlflow_tracing, get_litellm_client, set_user_context, MODEL_NAME
     
@@ -216,6 +259,9 @@ if __name__ == "__main__":
         
         print("\n[Test 4] Conversation with system prompt...")
         test_conversation_with_system_prompt(client, MODEL_NAME)
+
+        print("\n[Test 5] Long system prompt from the context cache...")
+        test_long_system_prompt_uses_context_cache(client, MODEL_NAME)
         
         print("\n" + "="*60)
         print("✓ All conversation tests completed!")
@@ -0,0 +1,60 @@
+"""
+Test the token-budgeted conversation manager (no LLM calls)
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.conversation import ConversationManager, count_tokens, message_tokens
+
+
+def test_count_tokens_is_cached():
+    """
+    Test the local token estimate and its per-message cache.
+    """
+    text = "MLflow is an open-source platform for managing machine learning workflows."
+    count_tokens.cache_clear()
+
+    assert count_tokens("") == 0
+    assert 10 <= count_tokens(text) <= 25
+    count_tokens(text)
+    assert count_tokens.cache_info().hits >= 1
+
+
+def test_history_stays_within_budget():
+    """
+    Test that a long conversation is trimmed to the budget and summarised.
+    """
+    conversation = ConversationManager(max_tokens=200, system_prompt="Be concise.", summary_tokens=60)
+    for turn in range(50):
+        conversation.add_user(f"Question {turn}: how does observability differ from monitoring?")
+        conversation.add_assistant(f"Answer {turn}. Observability explains why; monitoring says what. " * 3)
+
+    stats = conversation.stats()
+    messages = conversation.messages()
+
+    assert stats["kept_tokens"] <= 200
+    assert stats["kept_messages"] + stats["trimmed_messages"] == 100
+    assert sum(message_tokens(m) for m in messages) == stats["kept_tokens"]
+    assert messages[0] == {"role": "system", "content": "Be concise."}
+    assert messages[1]["content"].startswith("Summary of the earlier conversation")
+    assert messages[2]["role"] == "user"
+    assert messages[-1]["content"].startswith("Answer 49.")
+    print(f"\n✓ Context stats: {stats}")
+
+
+def test_recent_messages_kept_over_budget():
+    """
+    Test that the most recent messages are kept even if they exceed the budget.
+    """
+    conversation = ConversationManager(max_tokens=10, summarizer=None)
+    conversation.add_user("word " * 100)
+
+    assert conversation.stats()["kept_messages"] == 1
+    assert conversation.summary == ""
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
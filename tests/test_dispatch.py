@@ -0,0 +1,117 @@
+"""
+Test the fan-out dispatcher for log sinks
+"""
+
+import pytest
+import asyncio
+import threading
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.dispatch import Dispatcher
+from observability.profiler import ProfilerMetrics
+
+
+RECORD = {
+    "trace_id": "abc",
+    "model": "gemini/gemini-2.0-flash",
+    "messages": [{"role": "user", "content": "Hello!"}],
+    "status": "success",
+}
+
+
+def make_dispatcher(**kwargs):
+    metrics = ProfilerMetrics()
+    return Dispatcher(metrics=metrics, **kwargs), metrics
+
+
+def test_sinks_share_one_read_only_payload():
+    """
+    Test that all sinks get the same payload and cannot modify it.
+    """
+    dispatcher, _ = make_dispatcher()
+    seen = []
+
+    def sink(payload):
+        seen.append(payload)
+        payload["model"] = "other"
+
+    dispatcher.register("a", sink).register("b", sink)
+    results = dispatcher.dispatch(dict(RECORD))
+
+    assert results == {"a": "error", "b": "error"}
+    assert seen[0] is seen[1]
+    assert seen[0]["model"] == "gemini/gemini-2.0-flash"
+
+
+def test_sinks_run_concurrently():
+    """
+    Test that slow sinks add max latency, not the sum.
+    """
+    dispatcher, metrics = make_dispatcher(max_workers=4)
+    for name in ("spool", "budget", "mlflow"):
+        dispatcher.register(name, lambda payload: time.sleep(0.1))
+
+    began = time.perf_counter()
+    results = dispatcher.dispatch(dict(RECORD))
+    elapsed = time.perf_counter() - began
+
+    assert set(results.values()) == {"ok"}
+    assert elapsed < 0.25
+    assert metrics.callbacks["dispatch.spool"].count == 1
+    assert metrics.callbacks["dispatch.spool"].max >= 0.1
+
+
+def test_failing_and_slow_sinks_are_isolated():
+    """
+    Test that an error or a timeout in one sink does not affect the others.
+    """
+    dispatcher, metrics = make_dispatcher()
+    delivered = []
+    release = threading.Event()
+
+    def broken(payload):
+        raise RuntimeError("sink down")
+
+    dispatcher.register("broken", broken)
+    dispatcher.register("stuck", lambda payload: release.wait(), timeout=0.05)
+    dispatcher.register("spool", delivered.append)
+
+    results = dispatcher.dispatch(dict(RECORD))
+    release.set()
+
+    assert results == {"broken": "error", "stuck": "timeout", "spool": "ok"}
+    assert len(delivered) == 1
+    assert metrics.callback_errors["dispatch.broken"] == 1
+    assert metrics.callback_timeouts["dispatch.stuck"] == 1
+    assert 'obs_callback_timeouts_total{callback="dispatch.stuck"} 1' in metrics.prometheus()
+
+
+@pytest.mark.asyncio
+async def test_async_dispatch_mixes_sync_and_async_sinks():
+    """
+    Test the async path with coroutine and blocking sinks and a timeout.
+    """
+    dispatcher, metrics = make_dispatcher()
+    delivered = []
+
+    async def async_sink(payload):
+        await asyncio.sleep(0.01)
+        delivered.append(("async", payload["trace_id"]))
+
+    async def hanging_sink(payload):
+        await asyncio.sleep(10)
+
+    dispatcher.register("async", async_sink)
+    dispatcher.register("blocking", lambda payload: delivered.append(("blocking", payload["trace_id"])))
+    dispatcher.register("hanging", hanging_sink, timeout=0.05)
+
+    began = time.perf_counter()
+    results = await dispatcher.dispatch_async(dict(RECORD))
+
+    assert time.perf_counter() - began < 1.0
+    assert results == {"async": "ok", "blocking": "ok", "hanging": "timeout"}
+    assert sorted(delivered) == [("async", "abc"), ("blocking", "abc")]
+    assert metrics.callback_timeouts["dispatch.hanging"] == 1
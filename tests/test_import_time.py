@@ -0,0 +1,69 @@
+"""
+Import-time budgets for the test utilities and CLI modules (runs offline)
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tests.utils.importtime import forbidden_imports, measure, parse_importtime
+
+
+HEAVY = ("mlflow", "openai", "litellm", "numpy", "pyarrow", "sqlalchemy", "httpx", "fastapi", "psycopg2")
+
+# Generous for shared CI machines; regressions from heavy top-level
+# imports cost hundreds of milliseconds
+IMPORT_BUDGETS_MS = {
+    "tests.utils": 50,
+    "observability.cost": 100,
+    "observability.spool": 100,
+    "observability.export": 100,
+    "observability.maintenance": 100,
+    "observability.retention": 100,
+    "observability.trace_search": 100,
+    "observability.sweep": 150,
+    "observability.replay": 150,
+}
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGETS_MS))
+def test_import_budget(module):
+    """
+    Test that a module imports within budget and without heavy dependencies.
+    """
+    result = measure(module)
+    print(f"\n✓ {module}: {result['cumulative_ms']} ms, heaviest {result['heaviest'][:3]}")
+
+    assert forbidden_imports(result, HEAVY) == []
+    assert result["cumulative_ms"] <= IMPORT_BUDGETS_MS[module]
+
+
+def test_helpers_resolve_lazily():
+    """
+    Test that helpers load on attribute access without importing clients.
+    """
+    import tests.utils as utils
+
+    assert utils.MODEL_NAME == "gemini/gemini-2.0-flash"
+    assert callable(utils.get_litellm_client)
+    assert callable(utils.get_auth_token)
+    assert "get_litellm_client" in dir(utils)
+    with pytest.raises(AttributeError):
+        utils.not_a_helper
+
+
+def test_parse_importtime():
+    """
+    Test parsing of -X importtime output.
+    """
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   json.decoder\n"
+        "import time:       300 |        420 | json\n"
+    )
+    assert parse_importtime(stderr) == [("json.decoder", 1, 120, 120), ("json", 0, 300, 420)]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
@@ -0,0 +1,194 @@
+"""
+Test the structured, non-blocking log pipeline
+"""
+
+import pytest
+import gzip
+import io
+import json
+import logging
+import queue
+import random
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability import logs
+from observability.logs import (
+    DroppingQueueHandler,
+    JsonFormatter,
+    RateLimitFilter,
+    RotatingCompressedFileHandler,
+    SamplingFilter,
+    bind,
+    pipe,
+    setup_logging,
+    wrap_line,
+)
+
+
+def make_record(msg="hello %s", args=("world",), level=logging.INFO, lineno=10, **extra):
+    record = logging.LogRecord("observability.test", level, __file__, lineno, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_bound_ids_and_extra():
+    """
+    Test that bound ids and ``extra`` fields end up in the JSON line.
+    """
+    handler = DroppingQueueHandler(queue.Queue())
+    with bind(trace_id="abc", request_id="req-1"):
+        record = handler.prepare(make_record(sinks={"mlflow": "ok"}))
+
+    entry = json.loads(JsonFormatter("litellm-proxy").format(record))
+    assert entry["msg"] == "hello world"
+    assert entry["service"] == "litellm-proxy"
+    assert entry["trace_id"] == "abc"
+    assert entry["request_id"] == "req-1"
+    assert entry["sinks"] == {"mlflow": "ok"}
+    assert entry["level"] == "INFO"
+    assert "log_context" not in entry
+
+
+def test_queue_handler_drops_when_full():
+    """
+    Test that a full queue drops records instead of blocking the caller.
+    """
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    logger = logging.getLogger("observability.test.drop")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for i in range(5):
+            logger.warning("record %d", i)
+    finally:
+        logger.removeHandler(handler)
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_sampling_filter_only_samples_debug():
+    """
+    Test that DEBUG records are sampled and higher levels always pass.
+    """
+    sampler = SamplingFilter(0.1, rng=random.Random(7))
+    kept = sum(sampler.filter(make_record(level=logging.DEBUG)) for _ in range(1000))
+    assert 50 < kept < 150
+    assert all(sampler.filter(make_record(level=logging.INFO)) for _ in range(100))
+
+
+def test_rate_limit_per_call_site():
+    """
+    Test the token bucket, per-site isolation and the suppressed count.
+    """
+    now = [0.0]
+    limiter = RateLimitFilter(rate=1, burst=3, clock=lambda: now[0])
+
+    results = [limiter.filter(make_record(lineno=10)) for _ in range(5)]
+    assert results == [True, True, True, False, False]
+    assert limiter.filter(make_record(lineno=20))
+    assert limiter.filter(make_record(level=logging.CRITICAL, lineno=10))
+
+    now[0] = 1.0
+    record = make_record(lineno=10)
+    assert limiter.filter(record)
+    assert record.suppressed == 2
+
+
+def test_rotation_compresses_backups(tmp_path):
+    """
+    Test that rotated files are gzip-compressed and readable.
+    """
+    path = str(tmp_path / "svc" / "app.log")
+    handler = RotatingCompressedFileHandler(path, max_bytes=200, backups=2)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    for i in range(20):
+        handler.emit(make_record(msg=f"line {i:02d} " + "x" * 40, args=None))
+    handler.close()
+
+    files = sorted(os.listdir(tmp_path / "svc"))
+    assert files == ["app.log", "app.log.1.gz", "app.log.2.gz"]
+    with gzip.open(tmp_path / "svc" / "app.log.1.gz", "rt") as f:
+        assert f.read().startswith("line ")
+
+
+def test_compression_does_not_block_writes(tmp_path, monkeypatch):
+    """
+    Test that writes continue while a rotated file is being compressed.
+    """
+    compress = logs._gzip_rotator
+
+    def slow_compress(source, dest):
+        time.sleep(0.5)
+        compress(source, dest)
+
+    monkeypatch.setattr(logs, "_gzip_rotator", slow_compress)
+    handler = RotatingCompressedFileHandler(str(tmp_path / "app.log"), max_bytes=200, backups=2)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    start = time.perf_counter()
+    for i in range(6):
+        handler.emit(make_record(msg=f"line {i:02d} " + "x" * 40, args=None))
+    assert time.perf_counter() - start < 0.25
+    handler.close()
+
+    assert sorted(os.listdir(tmp_path)) == ["app.log", "app.log.1.gz"]
+
+
+def test_wrap_line():
+    """
+    Test that JSON lines pass through and plain text is wrapped.
+    """
+    line = '{"ts": "t", "msg": "hi", "service": "spool-shipper"}'
+    assert wrap_line(line + "\n", "litellm") == line
+    assert json.loads(wrap_line('{"msg": "hi"}', "litellm"))["service"] == "litellm"
+
+    entry = json.loads(wrap_line("2026/01/01 12:00:00 WARNING mlflow.store: slow query\n", "mlflow"))
+    assert entry["level"] == "WARNING"
+    assert entry["service"] == "mlflow"
+    assert entry["msg"].endswith("slow query")
+    assert json.loads(wrap_line("{not json", "mlflow"))["msg"] == "{not json"
+
+
+def test_pipe_writes_json_lines(tmp_path):
+    """
+    Test the stdin pipe used by start.sh.
+    """
+    path = str(tmp_path / "litellm.log")
+    source = io.StringIO("INFO: Started server process\n\n{\"msg\": \"ok\"}\nTraceback (most recent call last):\n")
+    assert pipe("litellm", path, source) == 3
+
+    with open(path) as f:
+        entries = [json.loads(line) for line in f]
+    assert [e["service"] for e in entries] == ["litellm"] * 3
+    assert entries[1]["msg"] == "ok"
+
+
+def test_setup_logging_flushes_on_stop(tmp_path):
+    """
+    Test the full pipeline: named logger, queue, listener and file sink.
+    """
+    path = str(tmp_path / "proxy.log")
+    pipeline = setup_logging("litellm-proxy", path=path, level="INFO", debug_sample=1.0,
+                             logger="observability.test.pipeline")
+    logger = logging.getLogger("observability.test.pipeline.callbacks")
+    with bind(trace_id="t-1"):
+        logger.warning("Sink %s failed", "mlflow")
+    logger.debug("not logged at INFO")
+    pipeline.stop()
+    pipeline.stop()
+
+    with open(path) as f:
+        entries = [json.loads(line) for line in f]
+    assert len(entries) == 1
+    assert entries[0]["msg"] == "Sink mlflow failed"
+    assert entries[0]["trace_id"] == "t-1"
+    assert entries[0]["logger"] == "observability.test.pipeline.callbacks"
+    assert pipeline.dropped == 0
+    assert not pipeline.logger.propagate
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
@@ -0,0 +1,100 @@
+"""
+Test spend-log maintenance helpers (no database required)
+"""
+
+import pytest
+import datetime
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.maintenance import (
+    CREATE_TABLES_SQL,
+    DETAIL_COLUMNS,
+    partition_ddl,
+    partition_name,
+    expired_partitions,
+    write_cold_batch,
+    read_cold_bodies,
+)
+
+
+def test_daily_partition_ddl():
+    """
+    Test the daily partition name and range bounds.
+    """
+    day = datetime.date(2026, 10, 19)
+    ddl = partition_ddl(day)
+
+    assert partition_name(day) == "obs_spend_logs_20261019"
+    assert "PARTITION OF obs_spend_logs" in ddl
+    assert "FROM ('2026-10-19') TO ('2026-10-20')" in ddl
+
+
+def test_expired_partitions():
+    """
+    Test that only partitions before the cutoff are selected for dropping.
+    """
+    names = {"obs_spend_logs_20260701", "obs_spend_logs_20261018", "obs_spend_logs_default"}
+    assert expired_partitions(names, datetime.date(2026, 7, 21)) == ["obs_spend_logs_20260701"]
+
+
+def test_cold_storage_roundtrip(tmp_path):
+    """
+    Test that archived prompt bodies can be read back and are deduplicated.
+    """
+    start = datetime.datetime(2026, 10, 1, 12, 0, 0)
+    rows = [
+        {
+            "request_id": f"req-{i}",
+            "startTime": start + datetime.timedelta(hours=i * 8),
+            "messages": [{"role": "user", "content": "What is MLflow?" * 50}],
+            "response": {"choices": [{"message": {"content": "A platform."}}]},
+            "proxy_server_request": None,
+        }
+        for i in range(4)
+    ]
+    write_cold_batch(rows, str(tmp_path))
+    # Simulate a batch that was archived but whose move did not commit
+    write_cold_batch(rows[:1], str(tmp_path))
+
+    first_day = list(read_cold_bodies(datetime.date(2026, 10, 1), str(tmp_path)))
+    second_day = list(read_cold_bodies(datetime.date(2026, 10, 2), str(tmp_path)))
+
+    assert [r["request_id"] for r in first_day] == ["req-0", "req-1"]
+    assert [r["request_id"] for r in second_day] == ["req-2", "req-3"]
+    assert first_day[0]["messages"] == rows[0]["messages"]
+
+
+def test_moved_row_keeps_every_source_column(tmp_path):
+    """
+    Test that obs_spend_logs plus the cold record hold every LiteLLM_SpendLogs column.
+    """
+    start = datetime.datetime(2026, 10, 1, 12, 0, 0)
+    row = {
+        "request_id": "req-0", "call_type": "acompletion", "api_key": "hashed-key", "spend": 0.002,
+        "total_tokens": 30, "prompt_tokens": 20, "completion_tokens": 10, "startTime": start,
+        "endTime": start, "completionStartTime": start, "model": "gemini-2.0-flash",
+        "model_id": "deployment-1", "model_group": "gemini-2.0-flash", "custom_llm_provider": "gemini",
+        "api_base": "https://generativelanguage.googleapis.com", "user": "user_001",
+        "metadata": {"user_api_key_alias": "ci"}, "cache_hit": "False", "cache_key": "ck-1",
+        "request_tags": ["eval"], "team_id": "team-1", "end_user": "end-1",
+        "requester_ip_address": "10.0.0.1", "messages": [{"role": "user", "content": "Hi"}],
+        "response": {"choices": []}, "session_id": "session-1", "status": "success",
+        "proxy_server_request": {"model": "gemini-2.0-flash"},
+        # A column added by a newer LiteLLM release
+        "mcp_namespaced_tool_name": "search/web",
+    }
+    write_cold_batch([row], str(tmp_path))
+    (record,) = read_cold_bodies(start.date(), str(tmp_path))
+
+    spend_logs_ddl = CREATE_TABLES_SQL.split("CREATE TABLE IF NOT EXISTS obs_spend_daily")[0]
+    assert all(f"{column} " in spend_logs_ddl or f'"{column}" ' in spend_logs_ddl for column in DETAIL_COLUMNS)
+    detail = {column: row[column] for column in DETAIL_COLUMNS}
+    restored = dict(record, **detail)
+    assert set(restored) == set(row)
+    assert restored == row
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
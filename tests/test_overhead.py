@@ -0,0 +1,123 @@
+"""
+Test the tracing-overhead regression gate
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.overhead import (
+    MockOpenAIServer,
+    compare,
+    gate,
+    load_baseline,
+    measure,
+    run_scenario,
+    summarize,
+)
+
+
+def scenario(name, mean_ms, bytes_per_request, export_throughput=None, exported=None, requests=300):
+    result = {"scenario": name, "requests": requests, "mean_ms": mean_ms, "bytes_per_request": bytes_per_request}
+    if export_throughput is not None:
+        result["export_throughput"] = export_throughput
+        result["exported"] = requests if exported is None else exported
+    return result
+
+
+def make_result(added_ms=2.0, traced_bytes=9216, export_throughput=400.0, exported=None, litellm="1.50.0"):
+    scenarios = {
+        "litellm": scenario("litellm", 3.0, 1024),
+        "litellm+mlflow": scenario("litellm+mlflow", 3.0 + added_ms, traced_bytes, export_throughput, exported),
+        "openai": scenario("openai", 1.0, 512),
+        "openai+autolog": scenario("openai+autolog", 1.5, 4608, 900.0),
+    }
+    return {
+        "versions": {"python": "3.11.7", "litellm": litellm, "mlflow": "2.20.0", "openai": "1.60.0"},
+        "workload": {"requests": 300, "warmup": 30, "memory_requests": 100, "latency_ms": 0.0},
+        "scenarios": scenarios,
+        "summary": summarize(scenarios),
+    }
+
+
+def test_summary_per_pair():
+    """
+    Test that each pair's tracing cost is the traced minus the plain run.
+    """
+    summary = make_result()["summary"]
+    assert summary["litellm"] == {"added_ms": 2.0, "memory_per_trace_kb": 8.0, "export_throughput": 400.0}
+    assert summary["openai"]["added_ms"] == 0.5
+    assert summary["openai"]["memory_per_trace_kb"] == 4.0
+
+
+def test_gate_passes_within_noise():
+    """
+    Test that small differences stay within the thresholds.
+    """
+    ok, report = gate(make_result(added_ms=2.3, export_throughput=380.0), make_result())
+    assert ok, report
+    assert "No tracing-overhead regression" in report
+
+
+def test_gate_reports_regressions():
+    """
+    Test that slower, heavier or slower-exporting tracing fails with a clear report.
+    """
+    current = make_result(added_ms=4.0, traced_bytes=20480, export_throughput=200.0, litellm="1.52.0")
+    ok, report = gate(current, make_result())
+    assert not ok
+    assert "litellm 1.50.0 -> 1.52.0" in report
+    assert "REGRESSION: litellm added_ms, litellm memory_per_trace_kb, litellm export_throughput" in report
+    failed = [(row["pair"], row["metric"]) for row in compare(current["summary"], make_result()["summary"])
+              if not row["ok"]]
+    assert ("openai", "added_ms") not in failed
+
+
+def test_lost_traces_and_workload_mismatch():
+    """
+    Test that missing exports fail and mismatched workloads are not compared.
+    """
+    ok, report = gate(make_result(exported=290), make_result())
+    assert not ok
+    assert "litellm lost_traces" in report
+
+    other = make_result()
+    other["workload"]["requests"] = 50
+    ok, report = gate(other, make_result())
+    assert not ok
+    assert "differs from the baseline" in report
+
+
+def test_mock_server_scenario():
+    """
+    Test the untraced OpenAI scenario against the mock server (no MLflow needed).
+    """
+    pytest.importorskip("openai")
+    with MockOpenAIServer() as server:
+        result = run_scenario("openai", server.base_url, requests=20, warmup=5, memory_requests=10)
+        assert server.requests == 35
+    assert result["requests"] == 20
+    assert 0 < result["p50_ms"] <= result["p99_ms"]
+    assert "export_throughput" not in result
+
+
+def test_tracing_overhead_gate():
+    """
+    Gate against the recorded baseline (needs litellm, mlflow and a baseline).
+    """
+    pytest.importorskip("litellm")
+    pytest.importorskip("mlflow.openai")
+    baseline = load_baseline()
+    if baseline is None:
+        pytest.skip("No baseline; run python -m observability.overhead run --update-baseline")
+    workload = baseline["workload"]
+    result = measure(workload["requests"], workload["warmup"], workload["memory_requests"],
+                     latency_ms=workload["latency_ms"])
+    ok, report = gate(result, baseline)
+    print(f"\n{report}")
+    assert ok, report
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
@@ -136,6 +136,30 @@ def test_presence_and_frequency_penalty(litellm_client, model_name):
     print(f"\n✓ Response with penalties: {response.choices[0].message.content[:100]}...")
 
 
+@pytest.mark.asyncio
+async def test_parameter_sweep(model_name):
+    """
+    Test a small concurrent sweep over the same grid as the tests above.
+    """
+    from observability.sweep import SweepRunner
+    from tests.utils import get_async_litellm_client
+
+    runner = SweepRunner(get_async_litellm_client(), model_name, concurrency=4)
+    results = await runner.run({
+        "temperature": [0.0, 0.7],
+        "top_p": [0.5, 1.0],
+        "max_tokens": [10, 50],
+        "prompt": ["Describe a sunset."],
+    })
+
+    assert len(results) == 8
+    for result in results:
+        assert not result.get("error"), result.get("error")
+        assert result["completion_tokens"] <= result["cell"]["max_tokens"]
+    print(f"\n✓ Sweep of {len(results)} cells, mean latency "
+          f"{sum(r['latency_ms'] for r in results) / len(results):.0f} ms")
+
+
 if __name__ == "__main__":
     from tests.utils import setup_mlflow, enable_mlflow_tracing, get_litellm_client, MODEL_NAME
     
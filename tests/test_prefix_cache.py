@@ -0,0 +1,179 @@
+"""
+Test prompt-prefix caching with the local context-cache stand-in
+"""
+
+import json
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.prefix_cache import (
+    PrefixCacheManager,
+    LocalContextCacheBackend,
+    GeminiContextCacheBackend,
+    GEMINI_MIN_CACHE_TOKENS,
+    split_stable_prefix,
+)
+
+
+SYSTEM_PROMPT = {"role": "system", "content": "You are a concise assistant. Answer in one sentence."}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_split_stable_prefix():
+    """
+    Test that the prefix ends before the last user message.
+    """
+    messages = [
+        SYSTEM_PROMPT,
+        {"role": "user", "content": "What is MLflow?"},
+        {"role": "assistant", "content": "A platform."},
+        {"role": "user", "content": "What are its main components?"},
+    ]
+    prefix, suffix = split_stable_prefix(messages)
+    assert prefix == messages[:3]
+    assert suffix == messages[3:]
+
+
+def test_repeated_system_prompt_hits_cache():
+    """
+    Test that a repeated system prompt is reported as cached on the second call.
+    """
+    manager = PrefixCacheManager(LocalContextCacheBackend())
+    first = manager.prepare("gemini-2.0-flash", [SYSTEM_PROMPT, {"role": "user", "content": "What is MLflow?"}])
+    manager.record(first, None, latency_s=0.8)
+    second = manager.prepare("gemini-2.0-flash", [SYSTEM_PROMPT, {"role": "user", "content": "What is LiteLLM?"}])
+    metrics = manager.record(second, None, latency_s=0.5)
+
+    assert not first["hit"] and second["hit"]
+    assert metrics["prefix_cache.cached_tokens"] == second["handle"].tokens > 0
+    assert metrics["prefix_cache.latency_saving_ms"] == pytest.approx(300.0)
+    print(f"\n✓ Cache metrics: {metrics}")
+
+
+def test_ttl_and_lru_eviction():
+    """
+    Test that handles expire after their TTL and the least recently used is evicted.
+    """
+    clock = FakeClock()
+    manager = PrefixCacheManager(LocalContextCacheBackend(), ttl_seconds=60, max_entries=2, clock=clock)
+    prompts = [[{"role": "system", "content": f"Prompt {i}"}, {"role": "user", "content": "Hi"}] for i in range(3)]
+
+    manager.prepare("m", prompts[0])
+    manager.prepare("m", prompts[1])
+    assert manager.prepare("m", prompts[0])["hit"]
+    manager.prepare("m", prompts[2])  # evicts prompts[1], the least recently used
+    assert manager.evictions == 1
+    assert not manager.prepare("m", prompts[1])["hit"]
+
+    clock.now += 61
+    assert not manager.prepare("m", prompts[0])["hit"]
+
+
+class FakeGeminiCaches:
+    """
+    Records cachedContents calls made through the proxy's Gemini pass-through.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.created = 0
+
+    def __call__(self, request):
+        import httpx
+
+        path = request.url.path.split("/gemini/v1beta/", 1)[1]
+        self.calls.append((request.method, path))
+        if request.method == "POST":
+            self.created += 1
+            body = json.loads(request.content)
+            return httpx.Response(200, json={"name": f"cachedContents/c{self.created}", "ttl": body["ttl"]})
+        return httpx.Response(200, json={})
+
+
+def test_gemini_backend_caches_repeated_prefix_and_releases_on_eviction():
+    """
+    Test that a prefix above Gemini's minimum is cached once it repeats, sent
+    as cached_content on hits and deleted when its handle is evicted.
+    """
+    httpx = pytest.importorskip("httpx")
+    caches = FakeGeminiCaches()
+    backend = GeminiContextCacheBackend("http://proxy", "sk-test", http=httpx.Client(transport=httpx.MockTransport(caches)))
+    clock = FakeClock()
+    manager = PrefixCacheManager(backend, ttl_seconds=60, max_entries=1, clock=clock)
+    question = {"role": "user", "content": "What is MLflow?"}
+
+    assert manager.prepare("gemini-2.0-flash", [SYSTEM_PROMPT, question])["handle"] is None
+
+    long_prompt = {"role": "system", "content": "Reference material. " * 1000}
+    first = manager.prepare("gemini-2.0-flash", [long_prompt, question])
+    assert first["handle"].tokens >= GEMINI_MIN_CACHE_TOKENS
+    assert first["messages"] == [long_prompt, question] and "extra_body" not in first
+    assert caches.calls == []
+
+    second = manager.prepare("gemini-2.0-flash", [long_prompt, question])
+    assert second["hit"]
+    assert second["messages"] == [question]
+    assert second["extra_body"] == {"cached_content": "cachedContents/c1"}
+    assert caches.calls == [("POST", "cachedContents")]
+
+    # Hits reuse the cache and extend it once half its TTL has passed
+    manager.prepare("gemini-2.0-flash", [long_prompt, question])
+    clock.now += 40
+    manager.prepare("gemini-2.0-flash", [long_prompt, question])
+    assert caches.calls[1:] == [("PATCH", "cachedContents/c1")]
+
+    other = {"role": "system", "content": "Other material. " * 1000}
+    manager.prepare("gemini-2.0-flash", [other, question])
+    assert manager.evictions == 1
+    assert caches.calls[-1] == ("DELETE", "cachedContents/c1")
+
+
+def test_gemini_caches_for_different_prefixes_are_created_concurrently():
+    """
+    Test that creating the cache for one prefix does not block another prefix.
+    """
+    httpx = pytest.importorskip("httpx")
+    import threading
+
+    both_posted = threading.Barrier(2, timeout=5)
+    caches = FakeGeminiCaches()
+
+    def transport(request):
+        if request.method == "POST":
+            both_posted.wait()
+        return caches(request)
+
+    backend = GeminiContextCacheBackend("http://proxy", "sk-test", http=httpx.Client(transport=httpx.MockTransport(transport)))
+    manager = PrefixCacheManager(backend, ttl_seconds=60)
+    question = {"role": "user", "content": "What is MLflow?"}
+    prompts = [{"role": "system", "content": f"Reference material {i}. " * 1000} for i in range(2)]
+    for prompt in prompts:
+        manager.prepare("gemini-2.0-flash", [prompt, question])
+
+    results = [None, None]
+
+    def prepare(index):
+        results[index] = manager.prepare("gemini-2.0-flash", [prompts[index], question])
+
+    threads = [threading.Thread(target=prepare, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # With a backend-wide lock the second POST never arrives and the barrier breaks
+    assert all("extra_body" in result for result in results)
+    assert caches.calls == [("POST", "cachedContents")] * 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
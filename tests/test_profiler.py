@@ -0,0 +1,118 @@
+"""
+Test the proxy profiler (loop lag, callback timing, stack sampling)
+"""
+
+import pytest
+import asyncio
+import concurrent.futures
+import threading
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.profiler import (
+    Histogram,
+    LoopLagSampler,
+    ProfilerMetrics,
+    StackSampler,
+    instrument_callback,
+)
+
+
+class MlflowLogger:
+    """Stands in for a LiteLLM CustomLogger callback."""
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        time.sleep(0.002)
+
+    async def async_log_success_event(self, kwargs, response_obj, start_time, end_time):
+        await asyncio.sleep(0.001)
+
+    async def async_log_failure_event(self, kwargs, response_obj, start_time, end_time):
+        raise RuntimeError("sink down")
+
+
+def test_histogram_percentiles():
+    """
+    Test bucketed percentile estimates and Prometheus output.
+    """
+    histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+    for _ in range(98):
+        histogram.observe(0.005)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+
+    assert histogram.percentile(50) == 0.01
+    assert histogram.percentile(99) == 0.1
+    assert histogram.percentile(100) == 0.5
+    lines = histogram.prometheus("lag", 'pool="x"')
+    assert 'lag_bucket{pool="x",le="0.01"} 98' in lines
+    assert 'lag_bucket{pool="x",le="+Inf"} 100' in lines
+
+
+@pytest.mark.asyncio
+async def test_callback_timing_and_errors():
+    """
+    Test that sync and async callback methods are timed and errors counted.
+    """
+    metrics = ProfilerMetrics()
+    callback = MlflowLogger()
+    assert instrument_callback(callback, metrics)
+    assert not instrument_callback(callback, metrics)  # already wrapped
+
+    callback.log_success_event({}, None, None, None)
+    await callback.async_log_success_event({}, None, None, None)
+    with pytest.raises(RuntimeError):
+        await callback.async_log_failure_event({}, None, None, None)
+
+    assert metrics.callbacks["mlflow"].count == 3
+    assert metrics.callbacks["mlflow"].max >= 0.002
+    assert metrics.callback_errors["mlflow"] == 1
+    assert 'obs_callback_seconds_count{callback="mlflow"} 3' in metrics.prometheus()
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_detects_blocking_and_pool_depth():
+    """
+    Test that a blocking call shows up as loop lag and queued work as pool depth.
+    """
+    metrics = ProfilerMetrics()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    futures = [executor.submit(release.wait) for _ in range(4)]
+
+    sampler = LoopLagSampler(metrics, interval=0.01, executors={"callbacks": executor}).start()
+    await asyncio.sleep(0.05)
+    time.sleep(0.1)  # blocks the loop
+    await asyncio.sleep(0.05)
+    sampler.stop()
+    release.set()
+    concurrent.futures.wait(futures)
+    executor.shutdown()
+
+    assert metrics.loop_lag.max >= 0.05
+    assert metrics.pool_queue_depth["callbacks"] == 3
+    assert metrics.pool_max_workers["callbacks"] == 1
+
+
+def test_stack_sampler_finds_busy_thread():
+    """
+    Test that the sampling profiler attributes samples to a busy function.
+    """
+    stop = threading.Event()
+
+    def busy_callback_work():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_callback_work)
+    thread.start()
+    try:
+        stacks = StackSampler(hz=200).run(0.2)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert "busy_callback_work" in stacks
+    assert "run (profiler.py" not in stacks  # the sampling thread itself is skipped
@@ -0,0 +1,151 @@
+"""
+Test the streaming fan-out relay
+"""
+
+import pytest
+import asyncio
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.async_tracing import AsyncTrace, AsyncSpan, _current_span
+from observability.relay import RelayHub, SlowConsumerError, StreamRelay
+
+
+async def upstream(count, delay=0.0):
+    for i in range(count):
+        if delay:
+            await asyncio.sleep(delay)
+        yield {"choices": [{"delta": {"content": f"tok{i} "}}]}
+
+
+async def drain(subscriber, delay=0.0):
+    chunks = []
+    async for chunk in subscriber:
+        chunks.append(chunk)
+        if delay:
+            await asyncio.sleep(delay)
+    return chunks
+
+
+@pytest.mark.asyncio
+async def test_subscribers_share_chunks():
+    """
+    Test that every subscriber gets the same chunk objects in order.
+    """
+    relay = StreamRelay(upstream(50))
+    subscribers = [relay.subscribe(critical=True)] + [relay.subscribe(capacity=64) for _ in range(3)]
+    relay.start()
+    results = await asyncio.gather(*(drain(s) for s in subscribers))
+
+    assert [c.seq for c in results[0]] == list(range(50))
+    for chunks in results[1:]:
+        assert all(a is b for a, b in zip(chunks, results[0]))
+        assert len(chunks) == 50
+    assert results[1][0].sse is results[2][0].sse
+    assert results[0][0].sse.startswith(b"data: {")
+    assert relay.trace_attributes()["relay.subscribers"] == 4
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_dropped():
+    """
+    Test that a slow subscriber is dropped without slowing the others.
+    """
+    relay = StreamRelay(upstream(200))
+    fast = relay.subscribe(critical=True)
+    slow = relay.subscribe(capacity=8, name="dashboard")
+    relay.start()
+
+    fast_task = asyncio.ensure_future(drain(fast))
+    with pytest.raises(SlowConsumerError):
+        await drain(slow, delay=0.01)
+    assert len(await fast_task) == 200
+
+    attributes = relay.trace_attributes()
+    assert attributes["relay.dropped_subscribers"] == 1
+    assert slow.high_water == 8
+    assert attributes["relay.buffer_high_water"] >= 8
+    assert attributes["relay.chunks"] == 200
+
+
+@pytest.mark.asyncio
+async def test_critical_subscriber_backpressure():
+    """
+    Test that the relay waits for a slow critical subscriber instead of dropping it.
+    """
+    relay = StreamRelay(upstream(40))
+    primary = relay.subscribe(capacity=4, critical=True)
+    relay.start()
+
+    chunks = await drain(primary, delay=0.001)
+    assert len(chunks) == 40
+    assert relay.trace_attributes()["relay.buffer_high_water"] <= 4
+
+
+@pytest.mark.asyncio
+async def test_late_subscriber_replays_history():
+    """
+    Test that a subscriber joining mid-stream gets the earlier chunks first.
+    """
+    relay = StreamRelay(upstream(20, delay=0.002))
+    primary = relay.subscribe(critical=True)
+    relay.start()
+    primary_task = asyncio.ensure_future(drain(primary))
+    await asyncio.sleep(0.015)
+
+    late = relay.subscribe(capacity=4)
+    chunks = await drain(late)
+    assert [c.seq for c in chunks] == list(range(20))
+    assert len(await primary_task) == 20
+
+
+@pytest.mark.asyncio
+async def test_hub_and_span_attributes():
+    """
+    Test hub registration, SSE output and attributes on the active span.
+    """
+    span = AsyncSpan("stream", AsyncTrace())
+    token = _current_span.set(span)
+    closed = []
+    try:
+        hub = RelayHub(linger=0.01)
+        relay = hub.open("call-1", upstream(3), on_close=closed.append)
+    finally:
+        _current_span.reset(token)
+    primary = relay.subscribe(critical=True)
+    relay.start()
+
+    tail = hub.get("call-1").subscribe()
+    body = b"".join([part async for part in tail.sse()])
+    await drain(primary)
+    await relay.wait()
+
+    assert body.count(b"data: ") == 4
+    assert body.endswith(b"data: [DONE]\n\n")
+    assert closed == [relay]
+    assert span.attributes["relay.subscribers"] == 2
+    assert hub.stats()[0]["done"]
+    await asyncio.sleep(0.05)
+    assert hub.get("call-1") is None
+
+
+@pytest.mark.asyncio
+async def test_upstream_error_reaches_subscribers():
+    """
+    Test that an upstream failure is raised to every subscriber.
+    """
+    async def failing():
+        yield {"choices": []}
+        raise RuntimeError("provider disconnected")
+
+    relay = StreamRelay(failing())
+    subscribers = [relay.subscribe(critical=True), relay.subscribe()]
+    relay.start()
+    for subscriber in subscribers:
+        with pytest.raises(RuntimeError):
+            await drain(subscriber)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
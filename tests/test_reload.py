@@ -0,0 +1,201 @@
+"""
+Test zero-downtime config reload
+"""
+
+import pytest
+import asyncio
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.reload import (
+    ConfigReloader,
+    LiteLLMState,
+    _split_settings,
+    changes_requiring_restart,
+    close_litellm_state,
+)
+
+
+CONFIG = """
+model_list:
+  - model_name: {model}
+    litellm_params:
+      model: gemini/{model}
+general_settings:
+  master_key: {key}
+"""
+
+
+def write_config(path, model="gemini-2.0-flash", key="sk-1234"):
+    path.write_text(CONFIG.format(model=model, key=key))
+    # Distinct mtime even on coarse filesystem clocks
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class FakeProxy:
+    """
+    Stands in for the proxy: one active router, swapped by apply().
+    """
+
+    def __init__(self):
+        self.router = None
+        self.applied = []
+        self.closed = []
+
+    def build(self, config):
+        models = [m["model_name"] for m in config["model_list"]]
+        if "broken" in models:
+            raise ValueError("unknown provider")
+        return {"models": models}
+
+    def apply(self, state, previous):
+        self.router = state
+        self.applied.append(state)
+
+    def close(self, previous, state):
+        self.closed.append(previous)
+
+
+def make_reloader(path, **kwargs):
+    proxy = FakeProxy()
+    reloader = ConfigReloader(str(path), proxy.build, proxy.apply, proxy.close, **kwargs)
+    reloader.adopt({"models": ["gemini-2.0-flash"]})
+    proxy.router = reloader.current.state
+    return reloader, proxy
+
+
+@pytest.mark.asyncio
+async def test_reload_swaps_and_drains(tmp_path):
+    """
+    Test that in-flight requests finish on the old generation before it is closed.
+    """
+    path = tmp_path / "config.yaml"
+    write_config(path)
+    reloader, proxy = make_reloader(path)
+    old = reloader.acquire("req-1")
+    assert old.number == 1
+
+    write_config(path, model="gemini-2.5-flash")
+    reload_task = asyncio.ensure_future(reloader.reload())
+    await asyncio.sleep(0.01)
+
+    # Swapped already; new requests land on generation 2 while req-1 drains
+    assert proxy.router == {"models": ["gemini-2.5-flash"]}
+    assert reloader.acquire("req-2").number == 2
+    assert reloader.stats()["draining"] == {1: 1}
+    assert not reload_task.done()
+    assert proxy.closed == []
+
+    reloader.release("req-1", 1)
+    report = await reload_task
+    assert report.ok and report.generation == 2
+    assert report.drained_requests == 1
+    assert report.drain_ms > 0
+    assert proxy.closed == [{"models": ["gemini-2.0-flash"]}]
+    assert reloader.current.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_unchanged_and_rejected_configs(tmp_path):
+    """
+    Test that identical content is a no-op and a bad config keeps the old one.
+    """
+    path = tmp_path / "config.yaml"
+    write_config(path)
+    reloader, proxy = make_reloader(path)
+
+    write_config(path)
+    assert reloader.changed()
+    assert await reloader.reload() is None
+
+    write_config(path, model="broken")
+    report = await reloader.reload()
+    assert not report.ok
+    assert "unknown provider" in report.error
+    assert reloader.current.number == 1
+    assert proxy.applied == []
+
+    path.write_text("model_list: [unclosed\n")
+    report = await reloader.reload()
+    assert not report.ok and report.error.startswith("read:")
+    assert reloader.current.number == 1
+
+
+@pytest.mark.asyncio
+async def test_drain_timeout_and_restart_required(tmp_path):
+    """
+    Test that a stuck request does not block the reload forever.
+    """
+    path = tmp_path / "config.yaml"
+    write_config(path)
+    reloader, proxy = make_reloader(path, drain_timeout=0.05)
+    reloader.acquire("stuck")
+
+    write_config(path, model="gemini-2.5-flash", key="sk-5678")
+    report = await reloader.reload()
+    assert report.ok
+    assert report.abandoned_requests == 1
+    assert report.drained_requests == 0
+    assert report.restart_required == ["general_settings"]
+    assert len(proxy.closed) == 1
+
+
+@pytest.mark.asyncio
+async def test_watch_picks_up_edits(tmp_path):
+    """
+    Test the polling watcher.
+    """
+    path = tmp_path / "config.yaml"
+    write_config(path)
+    reloader, proxy = make_reloader(path, interval=0.01)
+    reloader.start()
+    try:
+        write_config(path, model="gemini-2.5-flash")
+        for _ in range(100):
+            if reloader.current.number == 2:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        reloader.stop()
+    assert proxy.router == {"models": ["gemini-2.5-flash"]}
+    assert reloader.stats()["reports"][0]["swap_ms"] < 50
+
+
+@pytest.mark.asyncio
+async def test_close_router_clients_and_removed_callbacks():
+    """
+    Test that the old router's clients and only the removed callbacks are closed.
+    """
+    kept = types.SimpleNamespace(close=lambda: pytest.fail("kept callback closed"))
+    closed = []
+    removed = types.SimpleNamespace(close=lambda: closed.append("callback"))
+
+    async def aclose():
+        closed.append("client")
+
+    clients = {"model-1_async_client": types.SimpleNamespace(aclose=aclose), "model-1_max_parallel": 10}
+    router = types.SimpleNamespace(cache=types.SimpleNamespace(in_memory_cache=types.SimpleNamespace(
+        cache_dict=clients)), discard=lambda: closed.append("router"))
+    previous = LiteLLMState(router, [], {"callbacks": [kept, removed], "success_callback": ["lite_debugger"]}, {})
+    state = LiteLLMState(object(), [], {"callbacks": [kept], "success_callback": []}, {})
+    await close_litellm_state(previous, state)
+    assert closed == ["client", "router", "callback"]
+
+
+def test_only_plain_settings_applied_live():
+    """
+    Test that settings the proxy translates are reported instead of set.
+    """
+    previous = {"litellm_settings": {"drop_params": False, "callbacks": ["a.b"]}}
+    config = {"litellm_settings": {"drop_params": True, "cache": True, "callbacks": ["a.c"]},
+              "general_settings": {"master_key": "sk-1"}}
+    assert changes_requiring_restart(previous, config) == ["general_settings", "litellm_settings.cache"]
+    assert _split_settings({"litellm_settings": {"drop_params": True, "cache": True}}) == (
+        {"callbacks": [], "success_callback": [], "failure_callback": []}, {"drop_params": True})
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
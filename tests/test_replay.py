@@ -0,0 +1,155 @@
+"""
+Test the trace replay evaluation harness
+"""
+
+import pytest
+import asyncio
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.replay import (
+    MockBackend,
+    ReplayRunner,
+    case_from_trace,
+    diff_report,
+    iter_trace_cases,
+    summarize,
+)
+
+
+class FakeInfo:
+    def __init__(self, trace_id, tags):
+        self.trace_id = trace_id
+        self.tags = tags
+        self.execution_time_ms = 800
+        self.status = "OK"
+
+
+class FakeData:
+    def __init__(self, request, response):
+        self.request = request
+        self.response = response
+
+
+class FakeTrace:
+    def __init__(self, i, with_messages=True):
+        request = {"messages": [{"role": "user", "content": f"What is {i} + {i}?"}],
+                   "model": "gemini/gemini-2.0-flash", "temperature": 0.7, "max_tokens": 50}
+        if not with_messages:
+            request = {"query": "not a chat request"}
+        response = {"choices": [{"message": {"role": "assistant", "content": f"{i} + {i} = {2 * i}"}}]}
+        self.info = FakeInfo(f"tr-{i}", {"obs.completion_tokens": "6", "obs.response_cost": "0.0001"})
+        self.data = FakeData(json.dumps(request), json.dumps(response))
+
+
+class FakePage(list):
+    token = None
+
+
+class FakeMlflowClient:
+    def __init__(self, traces, page_size):
+        self.pages = [traces[i:i + page_size] for i in range(0, len(traces), page_size)]
+        self.requests = []
+
+    def search_traces(self, experiment_ids, filter_string=None, max_results=100, order_by=None, page_token=None):
+        index = int(page_token or 0)
+        self.requests.append(index)
+        page = FakePage(self.pages[index])
+        page.token = str(index + 1) if index + 1 < len(self.pages) else None
+        return page
+
+
+def test_case_from_trace():
+    """
+    Test extraction of messages, params and baseline metrics from a trace.
+    """
+    case = case_from_trace(FakeTrace(3))
+    assert case.trace_id == "tr-3"
+    assert case.messages[0]["content"] == "What is 3 + 3?"
+    assert case.params == {"temperature": 0.7, "max_tokens": 50}
+    assert case.baseline["model"] == "gemini/gemini-2.0-flash"
+    assert case.baseline["content"] == "3 + 3 = 6"
+    assert case.baseline["completion_tokens"] == 6.0
+    assert case_from_trace(FakeTrace(4, with_messages=False)) is None
+
+
+def test_spooled_trace_replays_its_parameters():
+    """
+    Test that a proxy trace shipped from the spool keeps the request's
+    sampling parameters for replay.
+    """
+    from observability.spool import MlflowTraceSink
+
+    class Span:
+        trace_id = "tr-spooled"
+
+    class RecordingClient:
+        def start_trace(self, **kwargs):
+            self.inputs = kwargs["inputs"]
+            return Span()
+
+        def end_trace(self, request_id, outputs=None, **kwargs):
+            self.outputs = outputs
+
+    sink = MlflowTraceSink.__new__(MlflowTraceSink)
+    sink.client, sink.experiment_id = RecordingClient(), "1"
+    sink._log_trace({
+        "trace_id": "spool-1", "model": "gemini/gemini-2.0-flash",
+        "messages": [{"role": "user", "content": "Describe a sunset."}],
+        "model_parameters": {"temperature": 0.2, "max_tokens": 30, "stream": False},
+        "response": {"choices": [{"message": {"content": "Orange."}}]},
+        "start_time": 0.0, "end_time": 1.0, "status": "success",
+    })
+
+    trace = FakeTrace(0)
+    trace.data = FakeData(json.dumps(sink.client.inputs), json.dumps(sink.client.outputs))
+    case = case_from_trace(trace)
+    assert case.messages == [{"role": "user", "content": "Describe a sunset."}]
+    assert case.params == {"temperature": 0.2, "max_tokens": 30}
+
+
+def test_iter_trace_cases_pages_lazily():
+    """
+    Test that pages are fetched only as cases are consumed.
+    """
+    traces = [FakeTrace(i, with_messages=i % 5 != 0) for i in range(25)]
+    client = FakeMlflowClient(traces, page_size=10)
+
+    cases = iter_trace_cases(client, ["1"], page_size=10, max_traces=12)
+    first = next(cases)
+    assert first.trace_id == "tr-1"
+    assert client.requests == [0]
+    assert len([first] + list(cases)) == 12
+    assert client.requests == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_replay_against_mock_backend():
+    """
+    Test concurrent replay and the side-by-side report.
+    """
+    traces = [FakeTrace(i) for i in range(1, 41)]
+    cases = iter_trace_cases(FakeMlflowClient(traces, page_size=10), ["1"], page_size=10)
+    runner = ReplayRunner(MockBackend(latency_ms=20), "gemini/gemini-2.0-flash", concurrency=16)
+
+    loop = asyncio.get_running_loop()
+    began = loop.time()
+    rows = await runner.run(cases)
+    elapsed = loop.time() - began
+
+    assert len(rows) == 40
+    assert elapsed < 40 * 0.02
+    assert all(row["candidate_latency_ms"] > 0 for row in rows)
+    assert all(0.0 <= row["similarity"] <= 1.0 for row in rows)
+
+    summary = summarize(rows)
+    assert summary["cases"] == 40 and summary["errors"] == 0
+    assert summary["baseline_p50_latency_ms"] == 800
+    assert summary["candidate_cost"] > 0
+    assert "exact_match_rate" in summary
+
+    report = diff_report(rows, limit=3)
+    assert report.count("```diff") == 3
+    assert "+Mock answer to:" in report
@@ -0,0 +1,199 @@
+"""
+Test trace retention against a SQLite copy of the trace tables
+"""
+
+import pytest
+import datetime
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sqlalchemy = pytest.importorskip("sqlalchemy")
+from observability.retention import RetentionEngine, RetentionRule, aggregate, read_archive
+
+
+NOW = datetime.datetime(2026, 10, 19, tzinfo=datetime.timezone.utc).timestamp()
+DAY_MS = 86400 * 1000
+
+
+def add_trace(conn, artifacts, rid, experiment_id, age_days, status="OK", tags=None):
+    location = os.path.join(str(artifacts), str(experiment_id), "traces", rid, "artifacts")
+    os.makedirs(location)
+    with open(os.path.join(location, "traces.json"), "w") as f:
+        json.dump({"spans": [{"name": "chat.completions.create", "trace_id": rid}]}, f)
+
+    conn.exec_driver_sql("INSERT INTO trace_info VALUES (?, ?, ?, 250, ?)",
+                         (rid, experiment_id, int(NOW * 1000) - int(age_days * DAY_MS), status))
+    tags = dict({"mlflow.artifactLocation": location, "obs.model": "gemini/gemini-2.0-flash",
+                 "obs.prompt_tokens": "12", "obs.completion_tokens": "30", "obs.response_cost": "0.5"}, **(tags or {}))
+    for key, value in tags.items():
+        conn.exec_driver_sql("INSERT INTO trace_tags VALUES (?, ?, ?)", (key, value, rid))
+    conn.exec_driver_sql("INSERT INTO trace_request_metadata VALUES ('mlflow.trace.user', 'user_1', ?)", (rid,))
+    conn.exec_driver_sql("INSERT INTO spans VALUES (?, 'span-1', 'chat.completions.create')", (rid,))
+    return location
+
+
+@pytest.fixture
+def store(tmp_path):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'mlflow.db'}")
+    artifacts = tmp_path / "artifacts"
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE experiments (experiment_id INTEGER PRIMARY KEY, name TEXT)")
+        conn.exec_driver_sql("CREATE TABLE trace_info (request_id TEXT PRIMARY KEY, experiment_id INTEGER,"
+                             " timestamp_ms INTEGER, execution_time_ms INTEGER, status TEXT)")
+        conn.exec_driver_sql("CREATE TABLE trace_tags (key TEXT, value TEXT, request_id TEXT)")
+        conn.exec_driver_sql("CREATE TABLE trace_request_metadata (key TEXT, value TEXT, request_id TEXT)")
+        conn.exec_driver_sql("CREATE TABLE spans (trace_id TEXT, span_id TEXT, name TEXT)")
+        conn.exec_driver_sql("INSERT INTO experiments VALUES (1, 'LiteLLM-Proxy-Traces'), (2, 'Replay-Evaluations')")
+
+        locations = {
+            "tr-old-ok": add_trace(conn, artifacts, "tr-old-ok", 1, 10),
+            "tr-new-ok": add_trace(conn, artifacts, "tr-new-ok", 1, 2),
+            "tr-old-error": add_trace(conn, artifacts, "tr-old-error", 1, 30, status="ERROR"),
+            "tr-ancient-error": add_trace(conn, artifacts, "tr-ancient-error", 1, 120, status="ERROR"),
+            "tr-old-eval": add_trace(conn, artifacts, "tr-old-eval", 2, 400),
+            "tr-old-cached": add_trace(conn, artifacts, "tr-old-cached", 1, 3, tags={"sweep.cached": "true"}),
+        }
+    return engine, locations, tmp_path / "archive"
+
+
+RULES = [
+    RetentionRule("evals", experiments=["Replay-Evaluations"]),
+    RetentionRule("errors", status=["ERROR"], keep_days=90),
+    RetentionRule("sweeps", tags={"sweep.cached": "true"}, keep_days=1, archive=False),
+    RetentionRule("default", keep_days=7),
+]
+
+
+def remaining(engine, table="trace_info", column="request_id"):
+    with engine.connect() as conn:
+        return sorted(row[0] for row in conn.exec_driver_sql(f"SELECT DISTINCT {column} FROM {table}"))
+
+
+def test_dry_run_changes_nothing(store):
+    """
+    Test that a dry run reports expirations without deleting.
+    """
+    engine, _, archive = store
+    result = RetentionEngine(engine, RULES, str(archive), now=NOW).run(dry_run=True)
+
+    assert result["deleted"] == 3
+    assert result["by_rule"] == {"errors": 1, "sweeps": 1, "default": 1}
+    assert len(remaining(engine)) == 6
+    assert not archive.exists()
+
+
+def test_retention_archives_aggregates_and_deletes(store):
+    """
+    Test the full pass: archive, aggregates, row and payload deletion.
+    """
+    engine, locations, archive = store
+    result = RetentionEngine(engine, RULES, str(archive), now=NOW).run()
+
+    assert result["deleted"] == 3
+    assert result["archived"] == 2
+    assert remaining(engine) == ["tr-new-ok", "tr-old-error", "tr-old-eval"]
+    for table, column in (("trace_tags", "request_id"), ("trace_request_metadata", "request_id"),
+                          ("spans", "trace_id")):
+        assert remaining(engine, table, column) == ["tr-new-ok", "tr-old-error", "tr-old-eval"]
+
+    assert not os.path.exists(locations["tr-old-ok"])
+    assert not os.path.exists(os.path.dirname(locations["tr-old-ok"]))
+    assert os.path.exists(locations["tr-new-ok"])
+
+    day = datetime.date(2026, 10, 9)
+    records = list(read_archive(day, str(archive)))
+    assert [r["request_id"] for r in records] == ["tr-old-ok"]
+    assert records[0]["payload"]["spans"][0]["trace_id"] == "tr-old-ok"
+    assert records[0]["spans"][0]["span_id"] == "span-1"
+    assert records[0]["kv"]["mlflow.trace.user"] == "user_1"
+
+    with engine.connect() as conn:
+        daily = conn.exec_driver_sql("SELECT SUM(traces), SUM(prompt_tokens), SUM(cost) FROM obs_trace_daily").one()
+    assert tuple(daily) == (3, 36, 1.5)
+
+
+def test_bounded_batches_resume(store):
+    """
+    Test that a capped pass leaves the rest for the next one.
+    """
+    engine, _, archive = store
+    retention = RetentionEngine(engine, RULES, str(archive), batch_size=2, now=NOW)
+
+    first = retention.run(max_batches=1)
+    assert first["batches"] == 1 and first["scanned"] == 2
+    second = retention.run()
+    assert first["deleted"] + second["deleted"] == 3
+    assert remaining(engine) == ["tr-new-ok", "tr-old-error", "tr-old-eval"]
+
+
+def test_experiments_created_after_start_match_their_rules(store):
+    """
+    Test that a long-running engine applies name-based rules to new experiments.
+    """
+    engine, _, archive = store
+    rules = [RetentionRule("staging", experiments=["Staging"])] + RULES
+    retention = RetentionEngine(engine, rules, str(archive), now=NOW)
+    retention.run()
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO experiments VALUES (3, 'Staging')")
+        add_trace(conn, archive.parent / "artifacts", "tr-old-staging", 3, 10)
+    retention.run()
+    assert "tr-old-staging" in remaining(engine)
+
+
+def test_scan_position_persists_between_runs(store):
+    """
+    Test that capped runs make progress and later passes skip kept traces.
+    """
+    engine, _, archive = store
+    retention = RetentionEngine(engine, RULES, str(archive), batch_size=1, now=NOW)
+
+    runs = [retention.run(max_batches=1) for _ in range(7)]
+    assert [run["scanned"] for run in runs] == [1] * 6 + [0]
+    assert sum(run["deleted"] for run in runs) == 3
+
+    # Only traces inside the longest retention window are scanned again
+    assert retention.run()["scanned"] == 2
+
+    stricter = RULES[:1] + [RetentionRule("errors", status=["ERROR"], keep_days=20)] + RULES[2:]
+    result = RetentionEngine(engine, stricter, str(archive), now=NOW).run()
+    assert result["scanned"] == 3
+    assert result["by_rule"] == {"errors": 1}
+
+
+def test_sampled_archive_is_stable():
+    """
+    Test that sampling keeps roughly the configured share, deterministically.
+    """
+    rule = RetentionRule("default", keep_days=7, sample_rate=0.1)
+    sampled = [i for i in range(5000) if rule.archives(f"tr-{i}")]
+
+    assert 350 < len(sampled) < 650
+    assert sampled == [i for i in range(5000) if rule.archives(f"tr-{i}")]
+    assert not RetentionRule("x", keep_days=1, archive=False).archives("tr-1")
+
+
+def test_aggregate_groups_by_day_model_status():
+    """
+    Test daily aggregate rows.
+    """
+    traces = [
+        {"timestamp_ms": 0, "experiment_id": 1, "status": "OK", "execution_time_ms": 100,
+         "kv": {"obs.model": "m", "obs.prompt_tokens": "10", "obs.response_cost": "0.25"}},
+        {"timestamp_ms": 1000, "experiment_id": 1, "status": "OK", "execution_time_ms": None,
+         "kv": {"obs.model": "m", "obs.prompt_tokens": "bad"}},
+        {"timestamp_ms": 0, "experiment_id": 1, "status": "ERROR", "execution_time_ms": 50, "kv": {}},
+    ]
+    rows = {(r["model"], r["status"]): r for r in aggregate(traces)}
+
+    assert rows[("m", "OK")]["traces"] == 2
+    assert rows[("m", "OK")]["latency_ms"] == 100
+    assert rows[("m", "OK")]["prompt_tokens"] == 10
+    assert rows[("", "ERROR")]["day"] == "1970-01-01"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
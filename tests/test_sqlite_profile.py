@@ -0,0 +1,47 @@
+"""
+Test the tuned SQLite backend profile
+"""
+
+import pytest
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.sqlite_profile import prepare_database, install_pragmas, sqlite_uri
+
+
+def test_prepare_database_enables_wal(tmp_path):
+    """
+    Test that a new database gets WAL mode and the tuned page size.
+    """
+    path = str(tmp_path / "mlflow.db")
+    prepare_database(path)
+    prepare_database(path)  # idempotent on an existing file
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA page_size").fetchone()[0] == 8192
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # incremental
+    conn.close()
+
+
+def test_connection_pragmas_applied(tmp_path):
+    """
+    Test that SQLAlchemy connections get the per-connection pragmas.
+    """
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    path = str(tmp_path / "mlflow.db")
+    prepare_database(path)
+    install_pragmas()
+    install_pragmas()  # installing twice must not register twice
+
+    engine = sqlalchemy.create_engine(sqlite_uri(path))
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 10000
+        assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2  # MEMORY
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
@@ -0,0 +1,106 @@
+"""
+Test the synthetic trace generator of the ingest stress harness
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.stress import TraceGenerator, log_trace, database_size
+
+
+class RecordingClient:
+    """Stands in for MlflowClient and records the spans it is given."""
+
+    class Span:
+        def __init__(self, span_id):
+            self.span_id = span_id
+            self.trace_id = "tr-1"
+
+    def __init__(self):
+        self.started = []
+        self.ended = []
+        self.trace_end = None
+
+    def start_trace(self, name, **kwargs):
+        self.started.append((name, None, kwargs))
+        return self.Span("root")
+
+    def start_span(self, name, trace_id, parent_id, **kwargs):
+        span_id = f"s{len(self.started)}"
+        self.started.append((name, parent_id, kwargs))
+        return self.Span(span_id)
+
+    def end_span(self, trace_id, span_id, **kwargs):
+        self.ended.append((span_id, kwargs))
+
+    def end_trace(self, trace_id, **kwargs):
+        self.trace_end = kwargs
+
+
+def count_spans(span):
+    return 1 + sum(count_spans(child) for child in span["children"])
+
+
+def test_generator_is_reproducible():
+    """
+    Test that the same seed produces the same traces.
+    """
+    first = [TraceGenerator(seed=7).generate() for _ in range(3)]
+    second = [TraceGenerator(seed=7).generate() for _ in range(3)]
+    assert first == second
+
+
+def test_generated_trace_shape():
+    """
+    Test that traces look like conversation traces with growing history.
+    """
+    generator = TraceGenerator(seed=1, error_rate=0.0, max_turns=4)
+    for _ in range(50):
+        trace = generator.generate()
+        assert trace["name"] == "conversation"
+        assert trace["status"] == "OK"
+        assert 1 <= len(trace["children"]) <= 4
+        history = [len(turn["inputs"]["messages"]) for turn in trace["children"]]
+        assert history == sorted(history)
+        assert trace["duration_ms"] >= sum(turn["duration_ms"] for turn in trace["children"])
+        assert trace["tags"]["mlflow.trace.user"].startswith("user_")
+
+
+def test_error_rate_marks_traces_failed():
+    """
+    Test that a failed LLM span ends the conversation and fails the trace.
+    """
+    trace = TraceGenerator(seed=3, error_rate=1.0).generate()
+    assert trace["status"] == "ERROR"
+    assert len(trace["children"]) == 1
+    assert trace["children"][0]["outputs"] is None
+
+
+def test_log_trace_preserves_tree():
+    """
+    Test that every generated span is logged under its parent with ordered timings.
+    """
+    generator = TraceGenerator(seed=11, error_rate=0.0)
+    trace = max((generator.generate() for _ in range(20)), key=count_spans)
+    client = RecordingClient()
+
+    trace_id = log_trace(client, "0", trace, start_ns=1_000_000_000)
+
+    assert trace_id == "tr-1"
+    assert len(client.started) == count_spans(trace)
+    assert len(client.ended) == count_spans(trace) - 1
+    assert client.started[0][2]["tags"] == trace["tags"]
+    assert all(parent is not None for _, parent, _ in client.started[1:])
+    assert client.trace_end["end_time_ns"] > 1_000_000_000
+
+
+def test_database_size_sqlite(tmp_path):
+    """
+    Test that SQLite store size is read from the database file.
+    """
+    path = tmp_path / "mlflow.db"
+    path.write_bytes(b"x" * 4096)
+    assert database_size(f"sqlite:///{path}") == 4096
+    assert database_size(None) is None
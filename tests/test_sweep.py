@@ -0,0 +1,179 @@
+"""
+Test the concurrent parameter-sweep runner
+"""
+
+import pytest
+import asyncio
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.sweep import SweepCache, SweepRunner, cell_key, cell_request, expand_grid
+
+
+class FakeUsage:
+    def __init__(self, max_tokens):
+        self.prompt_tokens = 10
+        self.completion_tokens = max_tokens // 2
+        self.total_tokens = self.prompt_tokens + self.completion_tokens
+
+
+class FakeMessage:
+    content = "A sentence about clouds."
+
+
+class FakeChoice:
+    message = FakeMessage()
+    finish_reason = "stop"
+
+
+class FakeResponse:
+    def __init__(self, max_tokens):
+        self.choices = [FakeChoice()]
+        self.usage = FakeUsage(max_tokens)
+
+
+class FakeCompletions:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if kwargs.get("temperature", 0) > 1.0:
+                raise ValueError("temperature out of range")
+            return FakeResponse(kwargs.get("max_tokens", 50))
+        finally:
+            self.in_flight -= 1
+
+
+class FakeAsyncOpenAI:
+    def __init__(self, delay=0.05):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FakeCompletions(delay)
+
+
+def test_expand_grid_and_requests():
+    """
+    Test grid expansion order and request construction.
+    """
+    cells = expand_grid({"temperature": [0.0, 0.7], "max_tokens": [10, 50, 100], "prompt": ["Hi"]})
+    assert len(cells) == 6
+    assert cells[0] == {"max_tokens": 10, "prompt": "Hi", "temperature": 0.0}
+
+    request = cell_request("gemini/gemini-2.0-flash", cells[0])
+    assert request["messages"] == [{"role": "user", "content": "Hi"}]
+    assert "prompt" not in request
+    assert cell_key("m", {"a": 1, "b": 2}) == cell_key("m", {"b": 2, "a": 1})
+
+
+@pytest.mark.asyncio
+async def test_sweep_runs_concurrently_under_cap():
+    """
+    Test that cells run in parallel, never above the concurrency cap.
+    """
+    client = FakeAsyncOpenAI(delay=0.05)
+    runner = SweepRunner(client, "gemini/gemini-2.0-flash", concurrency=8)
+    grid = {"temperature": [0.0, 0.5, 1.0, 1.5], "top_p": [0.5, 1.0], "max_tokens": [50, 100],
+            "prompt": ["Describe a sunset."]}
+
+    loop = asyncio.get_running_loop()
+    began = loop.time()
+    results = await runner.run(grid)
+    elapsed = loop.time() - began
+
+    assert len(results) == 16
+    assert client.chat.completions.max_in_flight == 8
+    assert elapsed < 16 * 0.05 / 2
+    errors = [r for r in results if r.get("error")]
+    assert len(errors) == 4 and all("temperature" in r["error"] for r in errors)
+    ok = [r for r in results if not r.get("error")]
+    assert all(r["cost"] > 0 and r["latency_ms"] > 0 for r in ok)
+    assert [r["index"] for r in results] == list(range(16))
+
+
+@pytest.mark.asyncio
+async def test_identical_and_cached_cells_run_once(tmp_path):
+    """
+    Test in-sweep deduplication and the on-disk cell cache.
+    """
+    cache_path = str(tmp_path / "cache.jsonl")
+    grid = {"temperature": [0.0, 0.0, 0.7], "prompt": ["Hi"]}
+
+    client = FakeAsyncOpenAI(delay=0.01)
+    results = await SweepRunner(client, "m", cache=SweepCache(cache_path)).run(grid)
+    assert len(results) == 3
+    assert len(client.chat.completions.calls) == 2
+
+    client = FakeAsyncOpenAI(delay=0.01)
+    runner = SweepRunner(client, "m", cache=SweepCache(cache_path))
+    results = await runner.run(grid)
+    assert client.chat.completions.calls == []
+    assert all(r["cached"] for r in results)
+
+    await runner.run(grid, refresh=True)
+    assert len(client.chat.completions.calls) == 2
+
+
+class FakeRunInfo:
+    def __init__(self, run_id):
+        self.run_id = run_id
+
+
+class FakeRun:
+    def __init__(self, run_id):
+        self.info = FakeRunInfo(run_id)
+
+
+class FakeMlflowClient:
+    def __init__(self):
+        self.runs = {}
+        self.batches = []
+        self.terminated = {}
+
+    def get_experiment_by_name(self, name):
+        return None
+
+    def create_experiment(self, name):
+        return "1"
+
+    def create_run(self, experiment_id, run_name=None, tags=None):
+        run_id = f"run{len(self.runs)}"
+        self.runs[run_id] = dict(tags or {}, name=run_name)
+        return FakeRun(run_id)
+
+    def log_batch(self, run_id, metrics=(), params=(), tags=()):
+        self.batches.append((run_id, list(metrics), list(params), list(tags)))
+
+    def set_terminated(self, run_id, status):
+        self.terminated[run_id] = status
+
+
+@pytest.mark.asyncio
+async def test_cells_logged_as_child_runs_with_one_batch_each():
+    """
+    Test that each cell becomes a child run logged with a single log_batch call.
+    """
+    pytest.importorskip("mlflow.entities")
+    from observability.sweep import MlflowSweepLogger
+
+    mlflow_client = FakeMlflowClient()
+    logger = MlflowSweepLogger(client=mlflow_client, batch_size=2)
+    runner = SweepRunner(FakeAsyncOpenAI(delay=0.001), "m", logger=logger)
+    await runner.run({"temperature": [0.0, 0.7, 2.0], "prompt": ["Hi"]}, name="sweep-test")
+
+    parent = "run0"
+    children = [run_id for run_id, tags in mlflow_client.runs.items() if tags.get("mlflow.parentRunId") == parent]
+    assert len(children) == 3
+    child_batches = [b for b in mlflow_client.batches if b[0] in children]
+    assert len(child_batches) == 3
+    assert sorted(mlflow_client.terminated[c] for c in children) == ["FAILED", "FINISHED", "FINISHED"]
+    assert mlflow_client.terminated[parent] == "FINISHED"
+    summary = {m.key: m.value for m in mlflow_client.batches[-1][1]}
+    assert summary["cells"] == 3 and summary["errors"] == 1
@@ -0,0 +1,122 @@
+"""
+Test the accelerated trace search index against a SQLite copy of the trace tables
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sqlalchemy = pytest.importorskip("sqlalchemy")
+from observability.trace_search import SearchCache, TraceSearch, backfill, decode_cursor, encode_cursor, install
+
+
+BASE_MS = 1760832000000
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def add_trace(conn, i, user, status="OK", session=None):
+    rid = f"tr-{i:04d}"
+    conn.exec_driver_sql("INSERT INTO trace_info VALUES (?, 1, ?, ?, ?)", (rid, BASE_MS + i * 1000, 100 + i, status))
+    conn.exec_driver_sql("INSERT INTO trace_tags VALUES ('obs.model', 'gemini/gemini-2.0-flash', ?)", (rid,))
+    conn.exec_driver_sql("INSERT INTO trace_request_metadata VALUES ('mlflow.trace.user', ?, ?)", (user, rid))
+    if session:
+        conn.exec_driver_sql("INSERT INTO trace_tags VALUES ('mlflow.trace.session', ?, ?)", (session, rid))
+    return rid
+
+
+def index_trace(engine, i, user, status="OK"):
+    """Stands in for the Postgres triggers on SQLite"""
+    with engine.begin() as conn:
+        add_trace(conn, i, user, status)
+        conn.exec_driver_sql(
+            "INSERT INTO obs_trace_index (request_id, experiment_id, timestamp_ms, execution_time_ms, status,"
+            " user_id, model) VALUES (?, 1, ?, ?, ?, ?, 'gemini/gemini-2.0-flash')",
+            (f"tr-{i:04d}", BASE_MS + i * 1000, 100 + i, status, user)
+        )
+
+
+@pytest.fixture
+def engine():
+    engine = sqlalchemy.create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE trace_info (request_id TEXT PRIMARY KEY, experiment_id INTEGER,"
+                             " timestamp_ms INTEGER, execution_time_ms INTEGER, status TEXT)")
+        conn.exec_driver_sql("CREATE TABLE trace_tags (key TEXT, value TEXT, request_id TEXT)")
+        conn.exec_driver_sql("CREATE TABLE trace_request_metadata (key TEXT, value TEXT, request_id TEXT)")
+        for i in range(50):
+            add_trace(conn, i, f"user_{i % 3}", status="ERROR" if i % 10 == 0 else "OK",
+                      session=f"session_{i // 10}")
+    install(engine)
+    assert backfill(engine, page_size=7) == 50
+    return engine
+
+
+def test_backfill_materializes_keys(engine):
+    """
+    Test that user, session and model are copied into indexed columns.
+    """
+    rows, _ = TraceSearch(engine).search(session_id="session_2", limit=100)
+    assert [row["request_id"] for row in rows] == [f"tr-{i:04d}" for i in range(29, 19, -1)]
+    assert rows[0]["user_id"] == "user_2"
+    assert rows[0]["model"] == "gemini/gemini-2.0-flash"
+    assert backfill(engine) == 50  # re-running is harmless
+
+
+def test_keyset_pagination(engine):
+    """
+    Test that cursors page through all matches newest first without overlap.
+    """
+    search = TraceSearch(engine)
+    seen, cursor = [], None
+    while True:
+        rows, cursor = search.search(experiment_id=1, user_id="user_0", limit=4, cursor=cursor)
+        seen.extend(row["request_id"] for row in rows)
+        if cursor is None:
+            break
+
+    expected = [f"tr-{i:04d}" for i in range(48, -1, -3)]
+    assert seen == expected
+    assert decode_cursor(encode_cursor(BASE_MS, "tr-0001")) == (BASE_MS, "tr-0001")
+
+
+def test_status_and_time_range_filters(engine):
+    """
+    Test status and time range filters.
+    """
+    rows, _ = TraceSearch(engine).search(status="ERROR", start_ms=BASE_MS + 10000, end_ms=BASE_MS + 40000)
+    assert [row["request_id"] for row in rows] == ["tr-0030", "tr-0020", "tr-0010"]
+
+
+def test_cache_hit_and_incremental_refresh(engine):
+    """
+    Test that repeated searches are cached and refreshed with only new traces.
+    """
+    clock = FakeClock()
+    cache = SearchCache(ttl_seconds=5, clock=clock)
+    search = TraceSearch(engine, cache)
+
+    first, _ = search.search(user_id="user_1", limit=5)
+    index_trace(engine, 60, "user_1", status="IN_PROGRESS")
+    again, _ = search.search(user_id="user_1", limit=5)
+    assert again == first
+    assert cache.hits == 1
+
+    clock.now = 10
+    refreshed, _ = search.search(user_id="user_1", limit=5)
+    assert cache.refreshes == 1
+    assert refreshed[0]["request_id"] == "tr-0060"
+    assert refreshed[1:] == first[:4]
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE obs_trace_index SET status = 'OK' WHERE request_id = 'tr-0060'")
+    clock.now = 20
+    refreshed, _ = search.search(user_id="user_1", limit=5)
+    assert refreshed[0]["status"] == "OK"
@@ -0,0 +1,148 @@
+"""
+Test shared-memory state for multi-process proxy workers
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.budget import BudgetExceededError, KeyBudgetCache, KeyState, RateLimitExceededError, hash_key
+from observability.workers import SharedBuckets, SharedCounters, WorkerState, _fork, reuseport_socket
+
+
+VIRTUAL_KEY = "sk-test-workers"
+
+
+def run_workers(target, count, *args):
+    processes = [_fork.Process(target=target, args=(worker, *args)) for worker in range(count)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+    assert [p.exitcode for p in processes] == [0] * count
+
+
+def count_requests(worker, counters):
+    counters.worker = worker
+    for _ in range(1000):
+        counters.add("requests")
+    counters.add("spend:abc", 0.25)
+
+
+def add_keys(worker, counters):
+    counters.worker = worker
+    for i in range(200):
+        counters.add(f"key-{i}")
+
+
+def take_tokens(worker, buckets, allowed):
+    for _ in range(30):
+        if buckets.allow("rpm:abc", rate=0.0001, burst=50):
+            with allowed.get_lock():
+                allowed.value += 1
+
+
+def test_counters_sum_across_processes():
+    """
+    Test that every forked worker's increments are visible to all, without overcounting.
+    """
+    counters = SharedCounters(workers=4, slots=64)
+    run_workers(count_requests, 4, counters)
+
+    assert counters.per_worker("requests") == [1000.0] * 4
+    assert counters.total("requests") == 4000
+    assert counters.total("spend:abc") == 1.0
+    assert counters.total("unknown") == 0
+
+
+def test_concurrent_inserts_create_one_row_per_key():
+    """
+    Test that workers creating the same keys at once never split a key
+    across two rows.
+    """
+    counters = SharedCounters(workers=4, slots=256)
+    run_workers(add_keys, 4, counters)
+
+    assert [counters.total(f"key-{i}") for i in range(200)] == [4.0] * 200
+    digests = [bytes(counters._buf[slot * counters.row_size:slot * counters.row_size + 16])
+               for slot in range(counters.slots)]
+    assert sum(digest != bytes(16) for digest in digests) == 200
+
+
+def test_buckets_shared_across_processes():
+    """
+    Test that a rate limit holds across workers instead of per worker.
+    """
+    buckets = SharedBuckets(slots=64)
+    allowed = _fork.Value("i", 0)
+    run_workers(take_tokens, 4, buckets, allowed)
+
+    assert allowed.value == 50
+
+
+def test_full_table_falls_back_to_local():
+    """
+    Test that keys beyond the table size are still counted by their worker.
+    """
+    counters = SharedCounters(workers=2, slots=2)
+    for key in ("a", "b", "c"):
+        counters.add(key, 2.0)
+
+    assert counters.overflows >= 1
+    assert [counters.total(key) for key in ("a", "b", "c")] == [2.0, 2.0, 2.0]
+
+    # Overflows in other workers are visible to every worker
+    before = counters.overflows
+    run_workers(add_keys, 2, counters)
+    assert counters.overflows >= before + 2 * 198
+
+
+def test_budget_cache_shares_spend_and_rpm():
+    """
+    Test that two workers' caches see each other's spend and share rpm buckets.
+    """
+    state = WorkerState(workers=2, slots=64)
+    rows = {hash_key(VIRTUAL_KEY): dict(spend=0.5, max_budget=1.0, rpm_limit=3)}
+
+    def load(token):
+        return KeyState(token, **rows[token])
+
+    first = KeyBudgetCache(load, counters=state.counters, limiter=state.buckets)
+    second = KeyBudgetCache(load, counters=state.counters, limiter=state.buckets)
+    first.check(VIRTUAL_KEY)
+    second.check(VIRTUAL_KEY)
+
+    first.record_spend(VIRTUAL_KEY, 0.3)
+    state.counters.worker = 1
+    second.record_spend(VIRTUAL_KEY, 0.3)
+    assert first.spend(first.get(VIRTUAL_KEY)) == pytest.approx(1.1)
+    with pytest.raises(BudgetExceededError):
+        second.check(VIRTUAL_KEY)
+
+    rows[hash_key(VIRTUAL_KEY)]["max_budget"] = None
+    first.invalidate()
+    second.invalidate()
+    assert second.spend(second.get(VIRTUAL_KEY)) == pytest.approx(0.5)
+    # Two of the three requests per minute were taken by the first checks
+    first.check(VIRTUAL_KEY)
+    with pytest.raises(RateLimitExceededError):
+        second.check(VIRTUAL_KEY)
+    assert state.counters.total("key_cache.loads") == 4
+    assert state.counters.total("key_cache.hits") >= 3
+
+
+def test_reuseport_sockets_share_a_port():
+    """
+    Test that several workers can listen on the same port.
+    """
+    first = reuseport_socket("127.0.0.1", 0)
+    port = first.getsockname()[1]
+    second = reuseport_socket("127.0.0.1", port)
+    assert second.getsockname()[1] == port
+    first.close()
+    second.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
@@ -0,0 +1,63 @@
+"""
+Test utilities for MLflow tracing tests.
+
+Importing this package is cheap: configuration constants are plain
+values and helpers are loaded from their submodules on first access.
+MLflow and OpenAI are only imported when a client or trace helper is
+used, and ``mlflow.openai.autolog()`` runs on first client creation
+(see tests.utils.tracing).
+
+- ``tests.utils.clients``: OpenAI clients for the proxy
+- ``tests.utils.tracing``: MLflow setup, deferred autolog, trace lookups
+- ``tests.utils.auth``: test users, cached login tokens
+- ``tests.utils.importtime``: ``-X importtime`` measurements
+"""
+
+import importlib
+
+from tests.utils.config import (
+    LITELLM_PROXY_URL,
+    MLFLOW_TRACKING_URI,
+    MODEL_NAME,
+    TEST_EXPERIMENT_NAME,
+    USER_MANAGEMENT_URL,
+    VIRTUAL_KEY,
+)
+
+
+_LAZY = {
+    "get_litellm_client": "clients",
+    "get_async_litellm_client": "clients",
+    "setup_mlflow": "tracing",
+    "enable_mlflow_tracing": "tracing",
+    "ensure_tracing": "tracing",
+    "set_user_context": "tracing",
+    "get_latest_trace": "tracing",
+    "verify_trace_exists": "tracing",
+    "cleanup_test_experiments": "tracing",
+    "TOKEN_REFRESH_MARGIN_SECONDS": "auth",
+    "create_test_user": "auth",
+    "create_test_users": "auth",
+    "get_auth_token": "auth",
+    "clear_auth_cache": "auth",
+    "get_authenticated_client": "auth",
+    "cleanup_test_users": "auth",
+}
+
+__all__ = [
+    "LITELLM_PROXY_URL", "MLFLOW_TRACKING_URI", "MODEL_NAME", "TEST_EXPERIMENT_NAME",
+    "USER_MANAGEMENT_URL", "VIRTUAL_KEY",
+] + list(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
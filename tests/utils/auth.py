@@ -0,0 +1,336 @@
+"""
+User management helpers: test users, cached login tokens and
+authenticated clients.
+"""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+
+from tests.utils.config import LITELLM_PROXY_URL, USER_MANAGEMENT_URL, VIRTUAL_KEY
+from tests.utils.tracing import ensure_tracing
+
+
+# Refresh cached tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+
+TEST_USER_MARKER_TABLE = "test_user_markers"
+
+_role_id_cache = {}
+_test_user_markers = None
+_token_cache = {}
+_token_lock = threading.Lock()
+_http_session = None
+
+
+def _user_tables():
+    """
+    Core tables behind the user_management models.
+
+    Returns:
+        tuple: (users, roles, role_links) sqlalchemy Tables
+    """
+    from user_management.models import User
+
+    roles = User.roles.property
+    return User.__table__, roles.mapper.local_table, roles.secondary
+
+
+def _link_columns(role_links, users):
+    """
+    The (user id, role id) columns of the role association table.
+    """
+    user_column = next(
+        column for column in role_links.c
+        if any(fk.column.table is users for fk in column.foreign_keys)
+    )
+    role_column = next(column for column in role_links.c if column is not user_column and column.foreign_keys)
+    return user_column, role_column
+
+
+def _get_role_id(db, roles, role: str):
+    """
+    Look up a role id by name, caching the result for the process.
+    """
+    from sqlalchemy import select
+
+    if role not in _role_id_cache:
+        row = db.execute(select(roles.c.id).where(roles.c.name == role)).first()
+        if row is None:
+            return None
+        _role_id_cache[role] = row[0]
+    return _role_id_cache[role]
+
+
+def _register_test_users(db, users, role_links, user_ids, role_id):
+    """
+    Assign the role and record the users in the marker table.
+
+    Role links are inserted from the cached role id, so no Role row is
+    loaded. Runs in the caller's transaction.
+    """
+    if role_id is not None:
+        user_column, role_column = _link_columns(role_links, users)
+        db.execute(
+            role_links.insert(),
+            [{user_column.name: user_id, role_column.name: role_id} for user_id in user_ids]
+        )
+    # Register the users for set-based cleanup_test_users
+    db.execute(
+        _get_test_user_markers(db, users).insert(),
+        [{"user_id": user_id} for user_id in user_ids]
+    )
+
+
+def create_test_user(username: str, email: str, password: str, role: str = "viewer"):
+    """
+    Create a test user with specified role.
+    
+    Args:
+        username: Username for the test user
+        email: Email for the test user
+        password: Password for the test user
+        role: Role to assign (admin, developer, viewer)
+        
+    Returns:
+        User ID
+    """
+    return create_test_users([(username, email, password)], role=role)[0]
+
+
+def create_test_users(users, role: str = "viewer"):
+    """
+    Create many test users with the same role in a single transaction.
+    
+    Args:
+        users: Iterable of (username, email, password) tuples
+        role: Role to assign (admin, developer, viewer)
+        
+    Returns:
+        list: User IDs in input order
+    """
+    from user_management.models import User
+    from user_management.database import get_db_context
+    
+    users_table, roles, role_links = _user_tables()
+    with get_db_context() as db:
+        role_id = _get_role_id(db, roles, role)
+        
+        created = []
+        for username, email, password in users:
+            user = User(username=username, email=email)
+            user.set_password(password)
+            created.append(user)
+        
+        db.add_all(created)
+        db.flush()
+        user_ids = [user.id for user in created]
+        _register_test_users(db, users_table, role_links, user_ids, role_id)
+        db.commit()
+        
+        return user_ids
+
+
+def _get_http_session():
+    """
+    Shared requests session so logins reuse pooled keep-alive connections.
+    """
+    global _http_session
+    import requests
+    from requests.adapters import HTTPAdapter
+    
+    if _http_session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=64)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _http_session = session
+    return _http_session
+
+
+def _jwt_expiry(token: str):
+    """
+    Read the exp claim of a JWT without verifying it.
+    
+    Returns:
+        float: Expiry as a Unix timestamp, or None if absent/unreadable
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def get_auth_token(username: str, password: str, force_refresh: bool = False) -> str:
+    """
+    Get authentication token for a user.
+    
+    Tokens are cached per user until shortly before their JWT expiry, so
+    repeated calls do not log in (and verify the password hash) again.
+    
+    Args:
+        username: Username
+        password: Password
+        force_refresh: Ignore any cached token
+        
+    Returns:
+        JWT access token
+    """
+    cache_key = (username, hashlib.sha256(password.encode("utf-8")).hexdigest())
+    
+    with _token_lock:
+        cached = _token_cache.get(cache_key)
+    if cached and not force_refresh:
+        token, expires_at = cached
+        if expires_at is None or time.time() < expires_at - TOKEN_REFRESH_MARGIN_SECONDS:
+            return token
+    
+    response = _get_http_session().post(
+        f"{USER_MANAGEMENT_URL}/api/v1/auth/login",
+        json={"username": username, "password": password}
+    )
+    
+    if response.status_code == 200:
+        token = response.json()["access_token"]
+        with _token_lock:
+            _token_cache[cache_key] = (token, _jwt_expiry(token))
+        return token
+    else:
+        raise Exception(f"Authentication failed: {response.text}")
+
+
+def clear_auth_cache():
+    """
+    Drop cached tokens and role ids (e.g. after cleanup_test_users).
+    """
+    with _token_lock:
+        _token_cache.clear()
+    _role_id_cache.clear()
+
+
+def get_authenticated_client(token: str):
+    """
+    Get LiteLLM client with authentication headers.
+    
+    Args:
+        token: JWT access token
+        
+    Returns:
+        OpenAI client with auth headers
+    """
+    from openai import OpenAI
+    
+    ensure_tracing()
+    return OpenAI(
+        api_key=VIRTUAL_KEY,
+        base_url=LITELLM_PROXY_URL,
+        default_headers={"Authorization": f"Bearer {token}"}
+    )
+
+
+def _get_test_user_markers(db, users):
+    """
+    Marker table recording which users were created by the test helpers.
+    
+    The primary key doubles as the index cleanup scans, so finding test
+    users never depends on pattern matching usernames or emails.
+    """
+    global _test_user_markers
+    from sqlalchemy import Column, MetaData, Table
+    
+    if _test_user_markers is None:
+        table = Table(
+            TEST_USER_MARKER_TABLE,
+            MetaData(),
+            Column("user_id", users.c.id.type, primary_key=True)
+        )
+        table.create(bind=db.connection(), checkfirst=True)
+        _test_user_markers = table
+    return _test_user_markers
+
+
+def _dependent_tables(users):
+    """
+    Tables of the user model's metadata with a column referencing users.
+
+    Returns:
+        list: (table, column) pairs, most dependent tables first
+    """
+    return [
+        (table, column)
+        for table in reversed(users.metadata.sorted_tables) if table is not users
+        for column in table.c if any(fk.column.table is users for fk in column.foreign_keys)
+    ]
+
+
+def _delete_test_users(db, users, role_links, chunk_size: int = 1000, include_legacy: bool = True):
+    """
+    Delete marked users and the rows referencing them, one chunk per transaction.
+    
+    Returns:
+        dict: Deleted row counts (see cleanup_test_users)
+    """
+    from sqlalchemy import delete, insert, or_, select
+    
+    markers = _get_test_user_markers(db, users)
+    dependents = _dependent_tables(users)
+    deleted = {"users": 0, "role_links": 0}
+    deleted.update({table.name: 0 for table, _ in dependents if table is not role_links})
+    
+    if include_legacy:
+        legacy = select(users.c.id).where(
+            or_(users.c.username.like('%test%'), users.c.email.like('%test%'))
+        ).where(users.c.id.not_in(select(markers.c.user_id)))
+        db.execute(insert(markers).from_select(["user_id"], legacy))
+        db.commit()
+    
+    while True:
+        chunk = select(markers.c.user_id).order_by(markers.c.user_id).limit(chunk_size)
+        user_ids = [row[0] for row in db.execute(chunk)]
+        if not user_ids:
+            break
+        
+        for table, column in dependents:
+            result = db.execute(delete(table).where(column.in_(user_ids)))
+            deleted["role_links" if table is role_links else table.name] += result.rowcount
+        result = db.execute(delete(users).where(users.c.id.in_(user_ids)))
+        deleted["users"] += result.rowcount
+        db.execute(delete(markers).where(markers.c.user_id.in_(user_ids)))
+        db.commit()
+    return deleted
+
+
+def cleanup_test_users(chunk_size: int = 1000, include_legacy: bool = True):
+    """
+    Clean up test users from database.
+    Use with caution - only for test cleanup.
+    
+    Deletes users registered in the test-user marker table with set-based
+    DELETE statements, one chunk per transaction, so memory stays constant
+    and locks stay short however many users there are. Rows in any
+    user_management table that reference a deleted user (role links and
+    other per-user rows) are deleted first. ORM-level cascades are not
+    run; tables that reference those rows in turn are not covered.
+    
+    Args:
+        chunk_size: Users deleted per transaction
+        include_legacy: Also clean up users matching '%test%' in username
+            or email that have no marker (created before markers existed)
+        
+    Returns:
+        dict: Deleted row counts: "users", "role_links" and one entry per
+            other table referencing users
+    """
+    from user_management.database import get_db_context
+    
+    users, _, role_links = _user_tables()
+    with get_db_context() as db:
+        deleted = _delete_test_users(db, users, role_links, chunk_size, include_legacy)
+    
+    clear_auth_cache()
+    print(f"Cleaned up {deleted['users']} test users ({deleted['role_links']} role assignments)")
+    return deleted
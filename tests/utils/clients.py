@@ -0,0 +1,38 @@
+"""
+OpenAI clients pointed at the LiteLLM proxy
+"""
+
+from tests.utils.config import LITELLM_PROXY_URL, VIRTUAL_KEY
+from tests.utils.tracing import ensure_tracing
+
+
+def get_litellm_client():
+    """
+    Create and return a configured OpenAI client pointing to LiteLLM proxy.
+
+    Returns:
+        OpenAI: Configured client instance
+    """
+    from openai import OpenAI
+
+    ensure_tracing()
+    return OpenAI(
+        api_key=VIRTUAL_KEY,
+        base_url=LITELLM_PROXY_URL
+    )
+
+
+def get_async_litellm_client():
+    """
+    Create and return a configured AsyncOpenAI client pointing to LiteLLM proxy.
+
+    Returns:
+        AsyncOpenAI: Configured client instance
+    """
+    from openai import AsyncOpenAI
+
+    ensure_tracing()
+    return AsyncOpenAI(
+        api_key=VIRTUAL_KEY,
+        base_url=LITELLM_PROXY_URL
+    )
@@ -0,0 +1,11 @@
+"""
+Test configuration shared by the helpers and test modules
+"""
+
+# Test configuration
+LITELLM_PROXY_URL = "http://localhost:4000"
+VIRTUAL_KEY = "sk-1234"
+MODEL_NAME = "gemini/gemini-2.0-flash"  # Include provider prefix
+MLFLOW_TRACKING_URI = "http://localhost:5001"
+TEST_EXPERIMENT_NAME = "MLflow-Tracing-Tests"
+USER_MANAGEMENT_URL = "http://localhost:8000"
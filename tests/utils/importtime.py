@@ -0,0 +1,117 @@
+"""
+Import-time measurements with ``python -X importtime``.
+
+Each measurement runs a fresh interpreter, subtracts the modules the
+interpreter imports at startup and reports the cumulative import time of
+what is left, plus the heaviest imports.
+
+Usage:
+    python -m tests.utils.importtime tests.utils observability.cost
+    python -m tests.utils.importtime tests.utils --budget-ms 50 --forbid mlflow,openai
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_importtime(stderr: str) -> list:
+    """
+    Parse ``-X importtime`` output.
+
+    Returns:
+        list: (name, depth, self_us, cumulative_us) in import order
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # Header line
+            continue
+        raw_name = fields[2].rstrip()
+        name = raw_name.lstrip()
+        depth = (len(raw_name) - len(name) - 1) // 2
+        entries.append((name, depth, int(fields[0]), int(fields[1])))
+    return entries
+
+
+def _run(code: str, python: str) -> list:
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    result = subprocess.run([python, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                            cwd=REPO_DIR, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"{code!r} failed: {result.stderr.strip().splitlines()[-1:]}")
+    return parse_importtime(result.stderr)
+
+
+def measure(module: str, python: str = sys.executable, repeats: int = 3) -> dict:
+    """
+    Measure the import cost of a module in a fresh interpreter.
+
+    Args:
+        module: Dotted module name
+        python: Interpreter to run
+        repeats: Runs; the fastest is reported
+
+    Returns:
+        dict: cumulative_ms, modules (set of names imported) and the ten
+            heaviest top-level imports as (name, cumulative_ms)
+    """
+    startup = {name for name, _, _, _ in _run("pass", python)}
+    best = None
+    for _ in range(repeats):
+        entries = [e for e in _run(f"import {module}", python) if e[0] not in startup]
+        total = sum(cumulative for _, depth, _, cumulative in entries if depth == 0)
+        if best is None or total < best[0]:
+            best = (total, entries)
+
+    total, entries = best
+    heaviest = sorted(((name, cumulative) for name, depth, _, cumulative in entries if depth <= 1),
+                      key=lambda item: -item[1])[:10]
+    return {
+        "module": module,
+        "cumulative_ms": round(total / 1000, 1),
+        "modules": {name for name, _, _, _ in entries},
+        "heaviest": [(name, round(cumulative / 1000, 1)) for name, cumulative in heaviest],
+    }
+
+
+def forbidden_imports(result: dict, forbidden) -> list:
+    """
+    Top-level packages from ``forbidden`` that a measurement imported.
+    """
+    roots = {name.split(".", 1)[0] for name in result["modules"]}
+    return sorted(set(forbidden) & roots)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure module import time")
+    parser.add_argument("modules", nargs="+")
+    parser.add_argument("--budget-ms", type=float, help="Fail if a module takes longer to import")
+    parser.add_argument("--forbid", default="", help="Comma-separated packages that must not be imported")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    forbid = [name for name in args.forbid.split(",") if name]
+    failed = False
+    for module in args.modules:
+        result = measure(module, repeats=args.repeats)
+        heavy = forbidden_imports(result, forbid)
+        over = args.budget_ms is not None and result["cumulative_ms"] > args.budget_ms
+        failed = failed or over or bool(heavy)
+        print(f"{'✗' if over or heavy else '✓'} {module}: {result['cumulative_ms']} ms"
+              + (f" (imports {', '.join(heavy)})" if heavy else ""))
+        for name, cumulative_ms in result["heaviest"][:5]:
+            print(f"    {cumulative_ms:8.1f} ms  {name}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()